@@ -1,33 +1,39 @@
 # Spotter Backend Application
 from dotenv import load_dotenv 
 load_dotenv()
-from data_manager import (load_challenges, get_public_challenges, get_challenge_by_id, load_workouts, get_workout_by_id, get_all_activities, get_user_activities, get_friends_activities)  # Add get_user_activities
+from data_manager import (load_challenges, get_public_challenges, get_challenge_by_id, load_workouts, get_workout_by_id, get_all_activities, get_user_activities, get_friends_activities, get_timeline_activities, FEED_PAGE_SIZE, MAX_FEED_PAGE_SIZE)  # Add get_user_activities
 from db import (
     get_user_profile, update_user_profile, get_user_stats,
     get_user_recent_activities, check_friendship,
-    add_like, remove_like, get_like_count, has_user_liked,
+    add_like, remove_like, get_like_count, get_post_interactions,
     add_comment, get_comments_for_post, get_comment_count, delete_comment,
-    get_friends_and_self_emails,
-    get_challenge_invitations, accept_challenge_invitation, decline_challenge_invitation
+    get_friends_and_self_emails, FEED_TIMELINE,
+    get_challenge_invitations, accept_challenge_invitation, decline_challenge_invitation,
+    get_leaderboard, LEADERBOARD_SIZE, MAX_LEADERBOARD_SIZE
 )
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
+import io
 import os
+from datetime import datetime
 from functools import wraps
 
 # Auth imports
-from auth import register_user, login_user, validate_token, logout_user
+from auth import register_user, login_user, validate_token, logout_user, start_session_sweeper
+from jobs import JobRunner, JobQueueFull
 
 # Other imports
 from recipeSuggestions.suggest import generate_day_plan
 from create_Challenge import create_challenge
 from logWorkout import log_workout
+from importWorkouts import import_workouts, read_records, IMPORT_FORMATS
 from data_manager import (load_challenges, get_public_challenges, get_challenge_by_id, load_workouts, get_workout_by_id, get_all_activities)
 from getExercises import (generate_exercises, list_muscles_for_body_parts, NoBodyPartsSelected, NoMusclesSelected, InvalidMuscleSelection)
 from findClasses import find_classes
 from db import (
     search_users, send_friend_request, get_friend_requests,
-    accept_friend_request, reject_friend_request, get_friends, remove_friend
+    accept_friend_request, reject_friend_request, get_friends, remove_friend,
+    ensure_indexes
 )
 
 # Get the path to the frontend directory
@@ -39,6 +45,40 @@ IMG_DIR = os.path.join(PROJECT_ROOT, 'img')  # project_root/img
 app = Flask(__name__, static_folder=FRONTEND_DIR, static_url_path='')
 CORS(app)
 
+# Expired sessions are removed by the sessions TTL index. Deployments without
+# TTL support can set SESSION_SWEEP_INTERVAL (seconds) to sweep them instead.
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "0"))
+if SESSION_SWEEP_INTERVAL > 0:
+    start_session_sweeper(SESSION_SWEEP_INTERVAL)
+
+# MongoDB indexes are created at deploy time with `python manage.py ensure-indexes`.
+# ENSURE_INDEXES_ON_START=1 creates them when each worker starts instead.
+def ensure_indexes_on_start():
+    """Create the MongoDB indexes, logging (not raising) failures"""
+    try:
+        ensure_indexes()
+        print("MongoDB indexes created successfully")
+    except Exception as e:
+        print(f"Note: Could not create MongoDB indexes - {e}")
+
+if os.getenv("ENSURE_INDEXES_ON_START", "0") == "1":
+    ensure_indexes_on_start()
+
+# OpenAI-backed endpoints can run as background jobs (POST with ?async=1, then poll
+# /api/jobs/<job_id>) so slow completions don't hold request threads. Each endpoint
+# gets its own pool of LLM_JOB_CONCURRENCY threads unless overridden below.
+LLM_JOB_CONCURRENCY = int(os.getenv("LLM_JOB_CONCURRENCY", "4"))
+MAX_JOB_WAIT = 30
+llm_jobs = JobRunner(
+    {
+        "recipe_plan": int(os.getenv("RECIPE_JOB_CONCURRENCY", LLM_JOB_CONCURRENCY)),
+        "generate_exercises": int(os.getenv("EXERCISE_JOB_CONCURRENCY", LLM_JOB_CONCURRENCY)),
+        "find_classes": int(os.getenv("CLASSES_JOB_CONCURRENCY", LLM_JOB_CONCURRENCY))
+    },
+    max_pending=int(os.getenv("LLM_JOB_MAX_PENDING", "50")),
+    result_ttl=int(os.getenv("LLM_JOB_RESULT_TTL", "600"))
+)
+
 
 # Authentication Middleware
 def require_auth(f):
@@ -63,6 +103,29 @@ def require_auth(f):
     return decorated_function
 
 
+def wants_job():
+    """Whether the client asked for the request to run as a background job (?async=1)"""
+    return request.args.get("async", "").lower() in ["1", "true"]
+
+
+def submit_job(kind, fn, *args):
+    """Queue fn(*args), which returns (response body, status code), and respond with the job id"""
+    try:
+        job_id = llm_jobs.submit(kind, request.user_email, fn, *args)
+    except JobQueueFull as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 503
+    
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "pending",
+        "poll_url": f"/api/jobs/{job_id}"
+    }), 202
+
+
 # Static File Routes
 @app.route('/')
 def index():
@@ -205,6 +268,49 @@ def api_get_challenge(challenge_id):
         }), 500
 
 
+@app.route("/api/challenges/<challenge_id>/leaderboard", methods=["GET"])
+@require_auth
+def api_get_challenge_leaderboard(challenge_id):
+    """Get the top participants of a challenge by progress (?limit=N, default 10, max 100)"""
+    try:
+        limit = int(request.args.get('limit', LEADERBOARD_SIZE))
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "errors": ["limit must be a number"]
+        }), 400
+    
+    try:
+        challenge = get_challenge_by_id(challenge_id)
+        
+        if not challenge:
+            return jsonify({
+                "success": False,
+                "errors": ["Challenge not found"]
+            }), 404
+        
+        leaderboard = get_leaderboard(challenge_id, max(1, min(limit, MAX_LEADERBOARD_SIZE)))
+        
+        target_value = challenge.get("target_value")
+        if target_value:
+            for entry in leaderboard:
+                entry["completed"] = entry["progress"] >= target_value
+        
+        return jsonify({
+            "success": True,
+            "challenge_id": challenge_id,
+            "metric": challenge.get("metric") or "workouts",
+            "target_value": target_value,
+            "leaderboard": leaderboard
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "errors": [f"Server error: {str(e)}"]
+        }), 500
+
+
 # Workout Routes (Protected)
 @app.route("/api/log_workout", methods=["POST"])
 @require_auth
@@ -216,6 +322,46 @@ def api_log_workout():
     return jsonify(result), status_code
 
 
+@app.route("/api/workouts/bulk", methods=["POST"])
+@require_auth
+def api_import_workouts():
+    """
+    Import many workouts from an NDJSON or CSV request body (?format=ndjson|csv,
+    or from the Content-Type). The body is streamed and saved in batches.
+    """
+    file_format = request.args.get("format")
+    if not file_format:
+        file_format = "csv" if request.mimetype == "text/csv" else "ndjson"
+    
+    if file_format not in IMPORT_FORMATS:
+        return jsonify({
+            "success": False,
+            "errors": [f"Format must be one of: {', '.join(IMPORT_FORMATS)}"]
+        }), 400
+    
+    try:
+        lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+        summary = import_workouts(read_records(lines, file_format), request.user_email)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "errors": [f"Server error: {str(e)}"]
+        }), 500
+    
+    # Rows before an undecodable line are already saved; report them with the error
+    if "stopped_at_line" in summary:
+        return jsonify({
+            "success": False,
+            "error": (
+                f"Request body must be UTF-8 text. Reading stopped at line {summary['stopped_at_line']}; "
+                "the rows before it were imported as reported, so resend only the rest"
+            ),
+            **summary
+        }), 400
+    
+    return jsonify({"success": True, **summary}), 200
+
+
 @app.route("/api/workouts", methods=["GET"])
 @require_auth
 def api_get_workouts():
@@ -264,36 +410,85 @@ def api_get_workout(workout_id):
 @app.route("/api/activities", methods=["GET"])
 @require_auth
 def api_get_activities():
-    """Get all activities for the feed"""
+    """
+    Get all activities for the feed.
+    Optional cursor pagination: ?limit=N returns one page, and the previous page's
+    next_before cursor, sent as ?before=<ISO created_at>&before_id=<post id>, continues
+    from there. Posts created at the same time are ordered by id, so none are skipped.
+    """
     try:
         # Get filter parameter - 'all' for public feed, 'mine' for user's own posts, 'friends' for friends feed
         feed_type = request.args.get('type', 'friends')  # Default to friends feed
         
+        # Pagination parameters (without them the whole feed is returned)
+        before = request.args.get('before')
+        before_id = request.args.get('before_id') or None
+        limit = request.args.get('limit')
+        page = {}
+        
+        if before or limit:
+            try:
+                limit = int(limit) if limit else FEED_PAGE_SIZE
+            except ValueError:
+                return jsonify({
+                    "success": False,
+                    "errors": ["limit must be a number"]
+                }), 400
+            
+            try:
+                before = datetime.fromisoformat(before) if before else None
+            except ValueError:
+                return jsonify({
+                    "success": False,
+                    "errors": ["before must be an ISO timestamp"]
+                }), 400
+            
+            page = {
+                "before": before,
+                "before_id": before_id if before else None,
+                "limit": max(1, min(limit, MAX_FEED_PAGE_SIZE))
+            }
+        
         if feed_type == 'mine':
             # Get only the current user's activities (both public and private)
-            activities = get_user_activities(request.user_email)
+            activities = get_user_activities(request.user_email, **page)
         elif feed_type == 'friends':
             # Get activities from user and their friends
             friends_emails = get_friends_and_self_emails(request.user_email)
-            activities = get_friends_activities(friends_emails)
+            if FEED_TIMELINE and page:
+                activities = get_timeline_activities(request.user_email, friends_emails, **page)
+            else:
+                activities = get_friends_activities(friends_emails, **page)
         else:
             # Get all public activities
-            activities = get_all_activities()
+            activities = get_all_activities(**page)
         
-        # Add like and comment counts to each activity
-        for activity in activities:
-            activity_id = activity.get('id')
-            activity_type = activity.get('type', 'workout' if 'workout_name' in activity else 'challenge')
-            
-            # Add interaction data
-            activity['like_count'] = get_like_count(activity_id, activity_type)
-            activity['comment_count'] = get_comment_count(activity_id, activity_type)
-            activity['user_has_liked'] = has_user_liked(request.user_email, activity_id, activity_type)
+        # Add like and comment counts to each activity (batched for the whole feed)
+        post_refs = [
+            (activity.get('id'), activity.get('type', 'workout' if 'workout_name' in activity else 'challenge'))
+            for activity in activities
+        ]
+        interactions = get_post_interactions(post_refs, request.user_email)
         
-        return jsonify({
+        for activity, post_ref in zip(activities, post_refs):
+            activity.update(interactions[post_ref])
+        
+        response = {
             "success": True,
             "activities": activities
-        }), 200
+        }
+        
+        # Cursor (created_at, id) for the next page, or None when this was the last one
+        if page:
+            next_before = None
+            if len(activities) == page["limit"]:
+                last_created_at = activities[-1].get("created_at")
+                if isinstance(last_created_at, datetime):
+                    last_created_at = last_created_at.isoformat()
+                next_before = {"before": last_created_at, "before_id": activities[-1].get("id")}
+            response["next_before"] = next_before
+        
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({
@@ -465,12 +660,8 @@ def api_delete_comment(comment_id):
 
 
 # Recipe Generation Route (Protected)
-@app.route("/api/recipe-plan", methods=["POST"])
-@require_auth
-def recipe_plan():
-    data = request.get_json() or {}
-    print("Incoming recipe request:", data)
-
+def _recipe_plan_response(data):
+    """Run a recipe request. Returns (response body, status code)."""
     try:
         plan = generate_day_plan(
             goal=data.get("goal"),
@@ -482,57 +673,80 @@ def recipe_plan():
             avoid_ingredients=data.get("allergies"),
         )
         print("Generated plan:", plan)
-        return jsonify(plan), 200
+        return plan, 200
     except Exception as e:
         import traceback
         print("ERROR in /api/recipe-plan:", e)
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 
-# Exercise Generation Routes (Protected)
-@app.route("/api/generate_exercises", methods=["POST"])
+@app.route("/api/recipe-plan", methods=["POST"])
 @require_auth
-def api_generate_exercises():
-    """Generate exercises based on selected body parts and muscles"""
+def recipe_plan():
     data = request.get_json() or {}
+    print("Incoming recipe request:", data)
+
+    if wants_job():
+        return submit_job("recipe_plan", _recipe_plan_response, data)
+
+    body, status = _recipe_plan_response(data)
+    return jsonify(body), status
+
+
+# Exercise Generation Routes (Protected)
+def _generate_exercises_response(data):
+    """Run an exercise generation request. Returns (response body, status code)."""
     body_parts = data.get("bodyParts", [])
     muscles = data.get("muscles", [])
 
     try:
         results = generate_exercises(body_parts, muscles)
-        return jsonify({
+        return {
             "success": True,
             "exercises": results
-        }), 200
+        }, 200
 
     except NoBodyPartsSelected as e:
-        return jsonify({
+        return {
             "success": False,
             "errorType": "NoBodyPartsSelected",
             "message": str(e)
-        }), 400
+        }, 400
 
     except NoMusclesSelected as e:
-        return jsonify({
+        return {
             "success": False,
             "errorType": "NoMusclesSelected",
             "message": str(e)
-        }), 400
+        }, 400
 
     except InvalidMuscleSelection as e:
-        return jsonify({
+        return {
             "success": False,
             "errorType": "InvalidMuscleSelection",
             "message": str(e)
-        }), 400
+        }, 400
 
     except Exception as e:
-        return jsonify({
+        return {
             "success": False,
             "errorType": "ServerError",
             "message": f"Unexpected error: {str(e)}"
-        }), 500
+        }, 500
+
+
+@app.route("/api/generate_exercises", methods=["POST"])
+@require_auth
+def api_generate_exercises():
+    """Generate exercises based on selected body parts and muscles"""
+    data = request.get_json() or {}
+
+    if wants_job():
+        return submit_job("generate_exercises", _generate_exercises_response, data)
+
+    body, status = _generate_exercises_response(data)
+    return jsonify(body), status
 
 
 @app.route("/api/get_muscles_for_parts", methods=["POST"])
@@ -554,18 +768,68 @@ def api_get_muscles_for_parts():
 @require_auth
 def find_classes_route():
     data = request.get_json()
+
+    if wants_job():
+        return submit_job("find_classes", _find_classes_response, data)
+
+    body, status = _find_classes_response(data)
+    return jsonify(body), status
+
+
+def _find_classes_response(data):
+    """Run a class search. Returns (response body, status code)."""
     campus = data.get("campus")
     categories = data.get("categories")
+    starting_within = data.get("startingWithin")
 
     try:
-        results = find_classes(campus, categories)
-        return jsonify({"success": True, "classes": results}), 200
+        results = find_classes(campus, categories, starting_within=starting_within)
+        return {"success": True, "classes": results}, 200
 
     except ValueError as e:
-        return jsonify({"success": False, "error": str(e)}), 400
+        return {"success": False, "error": str(e)}, 400
 
     except Exception as e:
-        return jsonify({"success": False, "error": "Internal server error", "details": str(e)}), 500
+        return {"success": False, "error": "Internal server error", "details": str(e)}, 500
+
+
+# Background Job Route (Protected)
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@require_auth
+def api_get_job(job_id):
+    """
+    Get the status of a background job started with ?async=1.
+    ?wait=N long-polls for up to N seconds (at most MAX_JOB_WAIT) until the job finishes.
+    """
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "wait must be a number of seconds"
+        }), 400
+    
+    job = llm_jobs.get(job_id, request.user_email, wait=max(0, min(wait, MAX_JOB_WAIT)))
+    
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+    
+    response = {
+        "success": True,
+        "job_id": job_id,
+        "status": job["status"]
+    }
+    
+    if job["status"] == "done":
+        # Same body and status code the endpoint would have returned directly
+        response["result"], response["result_status"] = job["result"]
+    elif job["status"] == "failed":
+        response["error"] = job["error"]
+    
+    return jsonify(response), 200
 
 
 # Friend Search Route
@@ -996,4 +1260,5 @@ if __name__ == "__main__":
     print(f"🌐 Open your browser to: http://localhost:{PORT}")
     print(f"🌐 Or try: http://127.0.0.1:{PORT}")
     print("="*60 + "\n")
+    ensure_indexes_on_start()
     app.run(debug=True, host='0.0.0.0', port=PORT)
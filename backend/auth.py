@@ -1,33 +1,136 @@
 # backend/auth.py
 
 from typing import Tuple, Dict, Any, Optional
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
 from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import threading
+import time
 import uuid
-from db import users, sessions
+from db import users, sessions, user_search_keys
+
+# In-process cache of validated session tokens (token -> (email, cached_until)).
+# Entries live at most SESSION_CACHE_TTL seconds, so logouts made by other
+# worker processes are picked up within that window.
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = timedelta(seconds=int(os.getenv("SESSION_CACHE_TTL", "60")))
+
+_session_cache: "OrderedDict[str, Tuple[str, datetime]]" = OrderedDict()
+_session_cache_lock = threading.Lock()
+_session_cache_stats = {"hits": 0, "misses": 0}
 
 
 def _is_bu_email(email: str) -> bool:
     return email.lower().endswith("@bu.edu")
 
 
+def _get_cached_session(token: str) -> Optional[str]:
+    """Return the email for a cached, unexpired token, or None"""
+    with _session_cache_lock:
+        entry = _session_cache.get(token)
+        
+        if entry is None or datetime.utcnow() >= entry[1]:
+            _session_cache.pop(token, None)
+            _session_cache_stats["misses"] += 1
+            return None
+        
+        _session_cache.move_to_end(token)
+        _session_cache_stats["hits"] += 1
+        return entry[0]
+
+
+def _cache_session(token: str, email: str, expires_at: datetime) -> None:
+    """Cache a validated token until its TTL or the session expiry, whichever is first"""
+    cached_until = min(datetime.utcnow() + SESSION_CACHE_TTL, expires_at)
+    
+    with _session_cache_lock:
+        _session_cache[token] = (email, cached_until)
+        _session_cache.move_to_end(token)
+        
+        # Evict least recently used tokens
+        while len(_session_cache) > SESSION_CACHE_SIZE:
+            _session_cache.popitem(last=False)
+
+
+def invalidate_cached_session(token: str) -> None:
+    """Drop a token from the session cache"""
+    with _session_cache_lock:
+        _session_cache.pop(token, None)
+
+
+def clear_session_cache() -> None:
+    """Drop all cached tokens and reset the hit/miss counters"""
+    with _session_cache_lock:
+        _session_cache.clear()
+        _session_cache_stats["hits"] = 0
+        _session_cache_stats["misses"] = 0
+
+
+def get_session_cache_stats() -> Dict[str, int]:
+    """Return session cache hit/miss counters and current size"""
+    with _session_cache_lock:
+        return {**_session_cache_stats, "size": len(_session_cache)}
+
+
 def _create_session(email: str) -> str:
     """Create a new session token for the user"""
     token = str(uuid.uuid4())
     
-    # Session expires in 7 days
-    expiry = datetime.now() + timedelta(days=7)
+    # Session expires in 7 days (UTC, as the sessions TTL index expects)
+    expiry = datetime.utcnow() + timedelta(days=7)
     
     sessions.insert_one({
         "token": token,
         "email": email,
-        "created_at": datetime.now(),
-        "expires_at": expiry
+        "created_at": datetime.utcnow(),
+        "expires_at": expiry,
+        "utc": True
     })
     
     return token
 
 
+def _local_to_utc(value: datetime) -> datetime:
+    """Convert a naive server-local datetime to naive UTC"""
+    return value.astimezone().astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _session_expiry(session: Dict[str, Any]) -> datetime:
+    """
+    A session's expires_at in UTC. Sessions without the utc flag were created
+    before expiry was stored in UTC, in server-local time (see migrate_session_times).
+    """
+    if session.get("utc"):
+        return session["expires_at"]
+    return _local_to_utc(session["expires_at"])
+
+
+def migrate_session_times(batch_size: int = 1000) -> int:
+    """
+    Convert created_at and expires_at of sessions stored in server-local time to UTC,
+    so the TTL index removes them on time. Returns the number of sessions converted.
+    """
+    converted = 0
+    batch = []
+    
+    for session in sessions.find({"utc": {"$ne": True}}, {"created_at": 1, "expires_at": 1}):
+        fields = {"utc": True}
+        for name in ("created_at", "expires_at"):
+            if isinstance(session.get(name), datetime):
+                fields[name] = _local_to_utc(session[name])
+        batch.append(UpdateOne({"_id": session["_id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            converted += sessions.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    
+    if batch:
+        converted += sessions.bulk_write(batch, ordered=False).modified_count
+    
+    return converted
+
+
 def validate_token(token: str) -> Tuple[bool, Optional[str]]:
     """
     Validate a session token.
@@ -36,25 +139,59 @@ def validate_token(token: str) -> Tuple[bool, Optional[str]]:
     if not token:
         return False, None
     
+    cached_email = _get_cached_session(token)
+    if cached_email:
+        return True, cached_email
+    
     session = sessions.find_one({"token": token})
     
     if not session:
         return False, None
     
-    # Check if expired
-    if datetime.now() > session["expires_at"]:
+    # Check if expired (the TTL index removes sessions up to a minute late)
+    expires_at = _session_expiry(session)
+    if datetime.utcnow() > expires_at:
         # Remove expired session
         sessions.delete_one({"token": token})
         return False, None
     
+    _cache_session(token, session["email"], expires_at)
+    
     return True, session["email"]
 
 
+def sweep_expired_sessions() -> int:
+    """
+    Delete all expired sessions. Returns the number removed.
+    Only needed where the sessions TTL index is unavailable.
+    """
+    result = sessions.delete_many({"expires_at": {"$lt": datetime.utcnow()}})
+    return result.deleted_count
+
+
+def start_session_sweeper(interval_seconds: int) -> threading.Thread:
+    """Run sweep_expired_sessions every interval_seconds in a daemon thread"""
+    def sweep_forever():
+        while True:
+            try:
+                removed = sweep_expired_sessions()
+                if removed:
+                    print(f"Removed {removed} expired sessions")
+            except Exception as e:
+                print(f"Error sweeping expired sessions: {e}")
+            time.sleep(interval_seconds)
+    
+    sweeper = threading.Thread(target=sweep_forever, name="session-sweeper", daemon=True)
+    sweeper.start()
+    return sweeper
+
+
 def logout_user(token: str) -> Tuple[bool, Dict[str, Any], int]:
     """Remove the session token"""
     if not token:
         return False, {"success": False, "error": "No token provided"}, 400
     
+    invalidate_cached_session(token)
     sessions.delete_one({"token": token})
     
     return True, {"success": True, "message": "Logged out successfully"}, 200
@@ -94,6 +231,7 @@ def register_user(email: str, password: str) -> Tuple[bool, Dict[str, Any], int]
     users.insert_one({
         "email": email,
         "password_hash": password_hash,
+        "search_keys": user_search_keys(email),
         "created_at": datetime.now()
     })
 
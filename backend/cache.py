@@ -0,0 +1,335 @@
+# backend/cache.py
+# TTL caches for slow lookups (e.g. OpenAI responses), with an in-process LRU
+# backend and a MongoDB backend shared by every worker process, and
+# single-flight coalescing of identical concurrent lookups.
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import random
+import threading
+
+
+class MemoryCacheBackend:
+    """In-process LRU of key -> (value, stored_at), holding at most max_size entries"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def get_many(self, keys):
+        """{key: (value, stored_at)} for the keys that have entries"""
+        with self._lock:
+            entries = {}
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entries[key] = entry
+            return entries
+
+    def set(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+
+            # Evict least recently used entries
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def append(self, key, value, stored_at, max_items, expired_before):
+        """
+        Atomically add value to the list stored at key, keeping its first max_items.
+        A missing entry, or one stored before expired_before, starts a new list at stored_at.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < expired_before:
+                self._entries[key] = ([value], stored_at)
+            else:
+                self._entries[key] = ((entry[0] + [value])[:max_items], entry[1])
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class MongoCacheBackend:
+    """
+    Cache entries stored in a MongoDB collection as {_id: key, value, stored_at}.
+    Expired entries are removed by the TTL index on stored_at that ensure_indexes creates.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, key):
+        doc = self.collection.find_one({"_id": key})
+        return (doc["value"], doc["stored_at"]) if doc else None
+
+    def get_many(self, keys):
+        """{key: (value, stored_at)} for the keys that have entries, with one query"""
+        return {
+            doc["_id"]: (doc["value"], doc["stored_at"])
+            for doc in self.collection.find({"_id": {"$in": list(keys)}})
+        }
+
+    def set(self, key, value, stored_at):
+        self.collection.replace_one({"_id": key}, {"value": value, "stored_at": stored_at}, upsert=True)
+
+    def append(self, key, value, stored_at, max_items, expired_before):
+        """
+        Atomically add value to the list stored at key, keeping its first max_items.
+        A missing entry, or one stored before expired_before, starts a new list at stored_at.
+        """
+        # Restart an expired list (the TTL index removes it up to a minute late). Only
+        # one concurrent writer matches; the others then push onto the new list.
+        restarted = self.collection.update_one(
+            {"_id": key, "stored_at": {"$lt": expired_before}},
+            {"$set": {"value": [value], "stored_at": stored_at}}
+        )
+        if restarted.matched_count:
+            return
+
+        self.collection.update_one(
+            {"_id": key},
+            {
+                "$push": {"value": {"$each": [value], "$slice": max_items}},
+                "$setOnInsert": {"stored_at": stored_at}
+            },
+            upsert=True
+        )
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def __len__(self):
+        return self.collection.count_documents({})
+
+
+class ResponseCache:
+    """
+    Cache in front of a slow function, on any backend with get/set/delete/clear.
+    Entries are fresh for ttl seconds. For stale_ttl seconds after that they are still
+    served while one background thread recomputes them (stale-while-revalidate).
+    Empty results are not stored. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, backend, ttl, stale_ttl=0):
+        self.backend = backend
+        self.ttl = timedelta(seconds=ttl)
+        self.stale_ttl = timedelta(seconds=stale_ttl)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _lookup(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading cache: {e}")
+            return None
+
+    def _store(self, key, value):
+        if not value:
+            return
+        try:
+            self.backend.set(key, value, datetime.utcnow())
+        except Exception as e:
+            print(f"Error writing cache: {e}")
+
+    def _refresh(self, key, compute):
+        """Recompute a stale entry; failures keep the stale value until it expires"""
+        try:
+            self._store(key, compute())
+            self._count("refreshes")
+        except Exception as e:
+            print(f"Error refreshing cache: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() on a miss"""
+        entry = self._lookup(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = datetime.utcnow() - stored_at
+
+            if age < self.ttl:
+                self._count("hits")
+                return value
+
+            if age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                with self._lock:
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start:
+                    threading.Thread(target=self._refresh, args=(key, compute), daemon=True).start()
+                return value
+
+        self._count("misses")
+        value = compute()
+        self._store(key, value)
+        return value
+
+    def invalidate(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        self.backend.clear()
+        with self._lock:
+            for stat in self._stats:
+                self._stats[stat] = 0
+
+    def get_stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            return dict(self._stats)
+
+
+class PoolCache:
+    """
+    Cache of up to pool_size different results per key, for generated content where
+    variety matters (e.g. recipes). Until a key's pool is full each request computes a
+    new result and adds it; after that requests get a random result from the pool.
+    Pools expire ttl seconds after their first result. Empty results are not stored.
+    Results are added with the backend's atomic append, so concurrent misses all land in the pool.
+    """
+
+    def __init__(self, backend, ttl, pool_size=3):
+        self.backend = backend
+        self.ttl = timedelta(seconds=ttl)
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get_or_add(self, key, compute):
+        """Return a pooled result for key, or compute (and pool) a new one"""
+        now = datetime.utcnow()
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading cache: {e}")
+            entry = None
+
+        pool = []
+        if entry is not None and now - entry[1] < self.ttl:
+            pool = entry[0]
+
+        if len(pool) >= self.pool_size:
+            self._count("hits")
+            return random.choice(pool)
+
+        self._count("misses")
+        value = compute()
+
+        if value:
+            try:
+                self.backend.append(key, value, now, self.pool_size, now - self.ttl)
+            except Exception as e:
+                print(f"Error writing cache: {e}")
+
+        return value
+
+    def clear(self):
+        """Drop all pools and reset the counters"""
+        self.backend.clear()
+        with self._lock:
+            for stat in self._stats:
+                self._stats[stat] = 0
+
+    def get_stats(self):
+        """Return hit/miss counters and the hit rate"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "hit_rate": self._stats["hits"] / lookups if lookups else 0.0}
+
+
+class _InFlightCall:
+    """A call in progress; waiters block on done and then read result or error"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function
+    and every caller that arrives before it finishes gets the same result (or exception).
+    Calls made after it finishes run again, so put a cache in front for reuse.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        """Return fn(), sharing one in-flight call among concurrent callers with the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+                self._stats["calls"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def get_stats(self):
+        """Return the number of calls made and of callers that shared another's call"""
+        with self._lock:
+            return dict(self._stats)
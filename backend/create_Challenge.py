@@ -3,148 +3,160 @@
 from datetime import datetime
 import uuid
 from data_manager import add_challenge
-from db import send_challenge_invitation
+from db import send_challenge_invitations
+from validation import Field, compile_schema, parse_date, one_of, longer_than, shorter_than
 
 
-def validate_challenge_data(data):
-    """
-    Validate challenge data with challenge type, category, and sanity checks
-    """
-    errors = []
+CHALLENGE_TYPES = ["Time-Based", "Achievement-Based"]
+CATEGORIES = ["Weightlifting", "Cardio", "Classes"]
+
+# Metrics with sanity limits on the target value
+WEIGHT_METRICS = frozenset(["pounds", "lbs", "kg", "kilograms"])
+REP_METRICS = frozenset(["reps", "repetitions"])
+DISTANCE_METRICS = frozenset(["miles", "mi", "kilometers", "km"])
+TIME_METRICS = frozenset(["minutes", "hours"])
+CLASS_METRICS = frozenset(["classes", "sessions"])
+
+
+def check_challenge_dates(data, values, errors):
+    """Date logic and sanity checks; stores the challenge length in days for check_target"""
+    values["duration_days"] = None
+    start_date = values["start_date"]
+    end_date = values["end_date"]
+    
+    if not (start_date and end_date):
+        return
     
-    # Extract and validate challenge type (convert to title case for comparison)
-    challenge_type = data.get("challenge_type", "").strip().title()
-    if not challenge_type:
-        errors.append("Challenge type is required")
-    elif challenge_type not in ["Time-Based", "Achievement-Based"]:
-        errors.append("Challenge type must be 'Time-Based' or 'Achievement-Based'")
+    try:
+        start = parse_date(start_date)
+        end = parse_date(end_date)
+    except ValueError:
+        errors.append("Invalid date format. Use YYYY-MM-DD")
+        return
     
-    # Extract and validate category (convert to title case for comparison)
-    category = data.get("category", "").strip().title()
-    if not category:
-        errors.append("Category is required")
-    elif category not in ["Weightlifting", "Cardio", "Classes"]:
-        errors.append("Category must be 'Weightlifting', 'Cardio', or 'Classes'")
+    if end <= start:
+        errors.append("End date must be after start date")
     
-    # Extract and validate title
-    title = data.get("title", "").strip()
-    if not title:
-        errors.append("Challenge title is required")
-    elif len(title) > 100:
-        errors.append("Challenge title must be less than 100 characters")
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if start < today:
+        errors.append("Start date cannot be in the past")
     
-    # Extract and validate goal
-    goal = data.get("goal", "").strip()
-    if not goal:
-        errors.append("Goal is required")
-    elif len(goal) > 200:
-        errors.append("Goal must be less than 200 characters")
+    # Sanity check: Challenge duration
+    duration = (end - start).days
+    if duration < 1:
+        errors.append("Challenge must be at least 1 day long")
+    elif duration > 365:
+        errors.append("Challenge duration cannot exceed 1 year (365 days)")
     
-    # Extract and validate dates
-    start_date = data.get("start_date", "").strip()
-    end_date = data.get("end_date", "").strip()
+    values["duration_days"] = duration
+
+
+def check_target(data, values, errors):
+    """Target value and metric for achievement-based challenges, with sanity checks"""
+    if values["challenge_type"] != "Achievement-Based":
+        return
     
-    if not start_date:
-        errors.append("Start date is required")
-    if not end_date:
-        errors.append("End date is required")
+    target_value = data.get("target_value")
+    metric = data.get("metric", "").strip().lower()
+    values["target_value"] = None
+    values["metric"] = metric
+    category = values["category"]
     
-    # Validate date logic and sanity checks
-    if start_date and end_date:
+    if target_value is None or target_value == "":
+        errors.append("Target value is required for achievement-based challenges")
+    else:
         try:
-            start = datetime.strptime(start_date, "%Y-%m-%d")
-            end = datetime.strptime(end_date, "%Y-%m-%d")
-            
-            if end <= start:
-                errors.append("End date must be after start date")
+            target = float(target_value)
+        except (ValueError, TypeError):
+            errors.append("Target value must be a valid number")
+        else:
+            values["target_value"] = target
+            if target <= 0:
+                errors.append("Target value must be greater than 0")
             
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            if start < today:
-                errors.append("Start date cannot be in the past")
+            # Sanity checks based on category and target value
+            if category == "Weightlifting":
+                if metric in WEIGHT_METRICS:
+                    if target > 1000:
+                        errors.append("Weightlifting target seems unrealistic (max: 1000 lbs/kg). Please verify your goal.")
+                    elif target < 5:
+                        errors.append("Weightlifting target seems too low (min: 5 lbs/kg). Please verify your goal.")
+                elif metric in REP_METRICS:
+                    if target > 10000:
+                        errors.append("Repetition target seems unrealistic (max: 10,000 reps). Please verify your goal.")
             
-            # Sanity check: Challenge duration
-            duration = (end - start).days
-            if duration < 1:
-                errors.append("Challenge must be at least 1 day long")
-            elif duration > 365:
-                errors.append("Challenge duration cannot exceed 1 year (365 days)")
+            elif category == "Cardio":
+                if metric in DISTANCE_METRICS:
+                    if target > 5000:
+                        errors.append("Distance target seems unrealistic (max: 5,000 miles/km). Please verify your goal.")
+                    elif target < 0.1:
+                        errors.append("Distance target seems too low (min: 0.1 miles/km). Please verify your goal.")
+                elif metric in TIME_METRICS:
+                    max_minutes = 100000 if metric == "minutes" else 1500
+                    if target > max_minutes:
+                        errors.append(f"Time target seems unrealistic (max: {max_minutes} {metric}). Please verify your goal.")
             
-        except ValueError:
-            errors.append("Invalid date format. Use YYYY-MM-DD")
-    
-    # Extract and validate description
-    description = data.get("description", "").strip()
-    if not description:
-        errors.append("Challenge description is required")
-    elif len(description) < 10:
-        errors.append("Description must be at least 10 characters")
-    elif len(description) > 1000:
-        errors.append("Description must be less than 1000 characters")
+            elif category == "Classes":
+                if metric in CLASS_METRICS:
+                    # Calculate max reasonable classes based on duration (skipped if the dates are invalid)
+                    if values["start_date"] and values["end_date"]:
+                        duration = values["duration_days"]
+                        if duration:
+                            max_classes = duration * 2  # Max 2 classes per day
+                            if target > max_classes:
+                                errors.append(f"Class target seems unrealistic ({target} classes in {duration} days = {target/duration:.1f} classes/day). Maximum recommended: {max_classes} classes.")
+                    elif target > 1000:
+                        errors.append("Class target seems unrealistic (max: 1000 classes). Please verify your goal.")
     
-    # Extract and validate privacy
-    privacy = data.get("privacy", "").strip().lower()
-    if not privacy or privacy not in ["private", "public"]:
-        errors.append("Privacy setting is required (private or public)")
-    
-    # Validate type-specific fields with sanity checks
-    if challenge_type == "Achievement-Based":
-        target_value = data.get("target_value")
-        metric = data.get("metric", "").strip().lower()
+    # Validate metric for achievement-based challenges
+    if not metric:
+        errors.append("Metric is required for achievement-based challenges (e.g., 'miles', 'pounds', 'classes')")
+    elif len(metric) > 50:
+        errors.append("Metric must be less than 50 characters")
 
-        if target_value is None or target_value == "":
-            errors.append("Target value is required for achievement-based challenges")
-        else:
-            try:
-                target = float(target_value)
-                if target <= 0:
-                    errors.append("Target value must be greater than 0")
-                
-                # Sanity checks based on category and target value
-                if category == "Weightlifting":
-                    if metric in ["pounds", "lbs", "kg", "kilograms"]:
-                        if target > 1000:
-                            errors.append("Weightlifting target seems unrealistic (max: 1000 lbs/kg). Please verify your goal.")
-                        elif target < 5:
-                            errors.append("Weightlifting target seems too low (min: 5 lbs/kg). Please verify your goal.")
-                    elif metric in ["reps", "repetitions"]:
-                        if target > 10000:
-                            errors.append("Repetition target seems unrealistic (max: 10,000 reps). Please verify your goal.")
-                
-                elif category == "Cardio":
-                    if metric in ["miles", "mi", "kilometers", "km"]:
-                        if target > 5000:
-                            errors.append("Distance target seems unrealistic (max: 5,000 miles/km). Please verify your goal.")
-                        elif target < 0.1:
-                            errors.append("Distance target seems too low (min: 0.1 miles/km). Please verify your goal.")
-                    elif metric in ["minutes", "hours"]:
-                        max_minutes = 100000 if metric == "minutes" else 1500
-                        if target > max_minutes:
-                            errors.append(f"Time target seems unrealistic (max: {max_minutes} {metric}). Please verify your goal.")
-                
-                elif category == "Classes":
-                    if metric in ["classes", "sessions"]:
-                        # Calculate max reasonable classes based on duration
-                        if start_date and end_date:
-                            try:
-                                duration = (datetime.strptime(end_date, "%Y-%m-%d") - 
-                                          datetime.strptime(start_date, "%Y-%m-%d")).days
-                                max_classes = duration * 2  # Max 2 classes per day
-                                if target > max_classes:
-                                    errors.append(f"Class target seems unrealistic ({target} classes in {duration} days = {target/duration:.1f} classes/day). Maximum recommended: {max_classes} classes.")
-                            except:
-                                pass
-                        elif target > 1000:
-                            errors.append("Class target seems unrealistic (max: 1000 classes). Please verify your goal.")
-                
-            except (ValueError, TypeError):
-                errors.append("Target value must be a valid number")
-        
-        # Validate metric for achievement-based challenges
-        if not metric:
-            errors.append("Metric is required for achievement-based challenges (e.g., 'miles', 'pounds', 'classes')")
-        elif len(metric) > 50:
-            errors.append("Metric must be less than 50 characters")
-    
+
+# Challenge payload schema, checked in this order
+CHALLENGE_SCHEMA = [
+    Field("challenge_type", required="Challenge type is required", normalize=str.title, checks=[
+        one_of(CHALLENGE_TYPES, "Challenge type must be 'Time-Based' or 'Achievement-Based'")
+    ]),
+    Field("category", required="Category is required", normalize=str.title, checks=[
+        one_of(CATEGORIES, "Category must be 'Weightlifting', 'Cardio', or 'Classes'")
+    ]),
+    Field("title", required="Challenge title is required", checks=[
+        longer_than(100, "Challenge title must be less than 100 characters")
+    ]),
+    Field("goal", required="Goal is required", checks=[
+        longer_than(200, "Goal must be less than 200 characters")
+    ]),
+    Field("start_date", required="Start date is required"),
+    Field("end_date", required="End date is required"),
+    check_challenge_dates,
+    Field("description", required="Challenge description is required", checks=[
+        shorter_than(10, "Description must be at least 10 characters"),
+        longer_than(1000, "Description must be less than 1000 characters")
+    ]),
+    Field("privacy", required="Privacy setting is required (private or public)", normalize=str.lower, checks=[
+        one_of(["private", "public"], "Privacy setting is required (private or public)")
+    ]),
+    check_target
+]
+
+_challenge_validator = compile_schema(CHALLENGE_SCHEMA)
+
+
+def parse_challenge_data(data):
+    """
+    Validate challenge data in one pass. Returns (normalized values, errors).
+    """
+    return _challenge_validator(data)
+
+
+def validate_challenge_data(data):
+    """
+    Validate challenge data with challenge type, category, and sanity checks
+    """
+    _, errors = parse_challenge_data(data)
     return len(errors) == 0, errors
 
 
@@ -162,65 +174,61 @@ def create_challenge(data, creator_email=None):
     """
     try:
         # Validate data
-        is_valid, errors = validate_challenge_data(data)
+        values, errors = parse_challenge_data(data)
         
-        if not is_valid:
+        if errors:
             return False, {
                 "success": False,
                 "errors": errors
             }, 400
         
-        # Extract validated data (normalize to title case for challenge_type and category)
-        challenge_type = data.get("challenge_type", "").strip().title()
-        category = data.get("category", "").strip().title()
-        title = data.get("title", "").strip()
-        goal = data.get("goal", "").strip()
-        start_date = data.get("start_date", "").strip()
-        end_date = data.get("end_date", "").strip()
-        description = data.get("description", "").strip()
-        privacy = data.get("privacy", "").strip().lower()
         invited_friends = data.get("invited_friends", [])
         
         # Create base challenge object
         challenge = {
             "id": str(uuid.uuid4()),
-            "challenge_type": challenge_type,
-            "category": category,
-            "title": title,
-            "goal": goal,
-            "start_date": start_date,
-            "end_date": end_date,
-            "description": description,
-            "privacy": privacy,
+            "challenge_type": values["challenge_type"],
+            "category": values["category"],
+            "title": values["title"],
+            "goal": values["goal"],
+            "start_date": values["start_date"],
+            "end_date": values["end_date"],
+            "description": values["description"],
+            "privacy": values["privacy"],
             "invited_friends": invited_friends,
             "creator": creator_email or "Anonymous",
-            "created_at": datetime.now().isoformat(),
+            "created_at": datetime.utcnow(),
             "participants": 1,
             "type": "challenge"
         }
         
+        # Achievement goals are kept for leaderboards
+        if values["challenge_type"] == "Achievement-Based":
+            challenge["target_value"] = values["target_value"]
+            challenge["metric"] = values["metric"]
+        
         # Save challenge 
         success = add_challenge(challenge)
         
         if success:
             challenge_response = {k: v for k, v in challenge.items() if k != "_id"}
             
-            # Send invitations to invited friends (if any)
+            # Send invitations to invited friends (if any), all in one write
             invitation_results = []
             if invited_friends and isinstance(invited_friends, list):
-                for friend_email in invited_friends:
-                    if friend_email and friend_email.strip():
-                        inv_success, inv_message = send_challenge_invitation(
-                            challenge["id"],
-                            challenge["title"],
-                            creator_email,
-                            friend_email.strip()
-                        )
-                        invitation_results.append({
-                            "friend": friend_email,
-                            "success": inv_success,
-                            "message": inv_message
-                        })
+                friends = [friend_email for friend_email in invited_friends if friend_email and friend_email.strip()]
+                results = send_challenge_invitations(
+                    challenge["id"],
+                    challenge["title"],
+                    creator_email,
+                    [friend_email.strip() for friend_email in friends]
+                )
+                for friend_email, (_, inv_success, inv_message) in zip(friends, results):
+                    invitation_results.append({
+                        "friend": friend_email,
+                        "success": inv_success,
+                        "message": inv_message
+                    })
             
             return True, {
                 "success": True,
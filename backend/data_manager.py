@@ -1,8 +1,19 @@
 # backend/data_manager.py
 # Handles all data storage using MongoDB
 
-from db import challenges, workouts
+from db import (
+    challenges, workouts, timelines, increment_user_stats, update_workout_streak,
+    recompute_workout_streak, fan_out_post, fan_out_posts, get_high_fanout_users,
+    add_to_leaderboard, record_workout_progress, created_at_key
+)
+from pymongo.errors import BulkWriteError
 from datetime import datetime
+from itertools import islice
+import heapq
+
+# Activity feed page sizes
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 100
 
 
 def load_challenges():
@@ -40,6 +51,9 @@ def add_challenge(challenge):
     """Add a new challenge to MongoDB"""
     try:
         challenges.insert_one(challenge)
+        increment_user_stats([challenge.get("creator")], challenges_created=1)
+        add_to_leaderboard(challenge, [challenge.get("creator")])
+        fan_out_post(challenge)
         return True
     except Exception as e:
         print(f"Error adding challenge: {e}")
@@ -76,23 +90,120 @@ def add_workout(workout):
     """Add a new workout to MongoDB"""
     try:
         workouts.insert_one(workout)
+        increment_user_stats(
+            [workout.get("creator")],
+            workouts_logged=1,
+            total_workout_minutes=workout.get("duration") or 0,
+            total_calories_burned=workout.get("calories") or 0
+        )
+        update_workout_streak(workout.get("creator"), workout.get("date"))
+        record_workout_progress([workout])
+        fan_out_post(workout)
         return True
     except Exception as e:
         print(f"Error adding workout: {e}")
         return False
 
 
+def add_workouts(workout_list):
+    """
+    Add a batch of workouts with one insert_many, then update each creator's stats,
+    streak and friends timelines once for the whole batch.
+    Returns {index in workout_list: error message} for workouts that were not saved.
+    """
+    if not workout_list:
+        return {}
+    
+    failed = {}
+    try:
+        workouts.insert_many(workout_list, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed[error["index"]] = error.get("errmsg", "Failed to save workout")
+    except Exception as e:
+        print(f"Error adding workouts: {e}")
+        return {index: "Failed to save workout" for index in range(len(workout_list))}
+    
+    saved = [workout for index, workout in enumerate(workout_list) if index not in failed]
+    
+    by_creator = {}
+    for workout in saved:
+        by_creator.setdefault(workout.get("creator"), []).append(workout)
+    
+    for creator, creator_workouts in by_creator.items():
+        increment_user_stats(
+            [creator],
+            workouts_logged=len(creator_workouts),
+            total_workout_minutes=sum(workout.get("duration") or 0 for workout in creator_workouts),
+            total_calories_burned=sum(workout.get("calories") or 0 for workout in creator_workouts)
+        )
+        try:
+            recompute_workout_streak(creator)
+        except Exception as e:
+            print(f"Error updating workout streak: {e}")
+    
+    record_workout_progress(saved)
+    fan_out_posts(saved)
+    return failed
+
+
 # Combined Activity Feed
-def get_all_activities():
-    """Get all PUBLIC activities (challenges and workouts) sorted by creation time"""
+def activity_sort_key(activity):
+    """
+    Feed order: created_at, then id, so posts created at the same time keep one order.
+    created_at values not yet migrated from ISO strings are compared as datetimes.
+    """
+    return created_at_key(activity.get('created_at')), activity.get('id', '')
+
+
+def before_cursor_query(before, before_id=None, id_field="id"):
+    """
+    Query for posts older than the (before, before_id) cursor in feed order.
+    Without before_id, only posts created strictly before `before` match.
+    """
+    if before_id is None:
+        return {"created_at": {"$lt": before}}
+    return {"$or": [
+        {"created_at": {"$lt": before}},
+        {"created_at": before, id_field: {"$lt": before_id}}
+    ]}
+
+
+def get_activity_page(query, before=None, limit=FEED_PAGE_SIZE, before_id=None):
+    """
+    Get one page of activities matching query, newest first.
+    Merges sorted cursors over challenges and workouts and stops after limit items,
+    so only activities after the (before, before_id) cursor (created_at, id) are read.
+    """
+    if before:
+        query = {**query, **before_cursor_query(before, before_id)}
+    
+    # Each collection can contribute at most `limit` items to the page
+    cursors = [
+        collection.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).limit(limit)
+        for collection in (challenges, workouts)
+    ]
+    merged = heapq.merge(*cursors, key=activity_sort_key, reverse=True)
+    
+    return list(islice(merged, limit))
+
+
+def get_all_activities(before=None, limit=None, before_id=None):
+    """
+    Get all PUBLIC activities (challenges and workouts) sorted by creation time.
+    If limit is given, only one page of activities after the (before, before_id) cursor is returned.
+    """
     try:
+        if limit is not None:
+            return get_activity_page({"privacy": "public"}, before, limit, before_id)
+        
         # Get only public challenges and workouts
         all_challenges = list(challenges.find({"privacy": "public"}, {"_id": 0}))
         all_workouts = list(workouts.find({"privacy": "public"}, {"_id": 0}))
         
         # Combine and sort by created_at timestamp, newest first
         all_activities = all_challenges + all_workouts
-        all_activities.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        all_activities.sort(key=activity_sort_key, reverse=True)
         
         return all_activities
     except Exception as e:
@@ -100,14 +211,20 @@ def get_all_activities():
         return []
 
 
-def get_user_activities(email):
-    """Get all activities (public and private) for a specific user"""
+def get_user_activities(email, before=None, limit=None, before_id=None):
+    """
+    Get all activities (public and private) for a specific user.
+    If limit is given, only one page of activities after the (before, before_id) cursor is returned.
+    """
     try:
+        if limit is not None:
+            return get_activity_page({"creator": email}, before, limit, before_id)
+        
         user_challenges = list(challenges.find({"creator": email}, {"_id": 0}))
         user_workouts = list(workouts.find({"creator": email}, {"_id": 0}))
         
         all_activities = user_challenges + user_workouts
-        all_activities.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        all_activities.sort(key=activity_sort_key, reverse=True)
         
         return all_activities
     except Exception as e:
@@ -115,25 +232,77 @@ def get_user_activities(email):
         return []
 
 
-def get_friends_activities(email_list):
-    """Get all PUBLIC activities from a list of users (self + friends)"""
+def get_friends_activities(email_list, before=None, limit=None, before_id=None):
+    """
+    Get all PUBLIC activities from a list of users (self + friends).
+    If limit is given, only one page of activities after the (before, before_id) cursor is returned.
+    """
     try:
-        # Get public challenges and workouts from the specified users
-        friend_challenges = list(challenges.find({
+        query = {
             "creator": {"$in": email_list},
             "privacy": "public"
-        }, {"_id": 0}))
+        }
         
-        friend_workouts = list(workouts.find({
-            "creator": {"$in": email_list},
-            "privacy": "public"
-        }, {"_id": 0}))
+        if limit is not None:
+            return get_activity_page(query, before, limit, before_id)
+        
+        # Get public challenges and workouts from the specified users
+        friend_challenges = list(challenges.find(query, {"_id": 0}))
+        friend_workouts = list(workouts.find(query, {"_id": 0}))
         
         # Combine and sort by created_at timestamp, newest first
         all_activities = friend_challenges + friend_workouts
-        all_activities.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        all_activities.sort(key=activity_sort_key, reverse=True)
         
         return all_activities
     except Exception as e:
         print(f"Error loading friends activities: {e}")
         return []
+
+
+def get_timeline_activities(email, friend_emails, before=None, limit=FEED_PAGE_SIZE, before_id=None):
+    """
+    Get one page of the friends feed from the user's fan-out timeline.
+    Posts by high-fanout friends (not fanned out) are read from their creators, and once
+    the timeline runs out (older or expired posts) the page is filled by get_activity_page.
+    """
+    try:
+        query = {"owner": email}
+        if before:
+            query.update(before_cursor_query(before, before_id, id_field="post_id"))
+        
+        refs = list(
+            timelines.find(query, {"_id": 0}).sort([("created_at", -1), ("post_id", -1)]).limit(limit)
+        )
+        
+        # Load the referenced posts, one query per collection
+        activities = []
+        for post_type, collection in (("challenge", challenges), ("workout", workouts)):
+            ids = [ref["post_id"] for ref in refs if ref["post_type"] == post_type]
+            if ids:
+                activities += collection.find({"id": {"$in": ids}}, {"_id": 0})
+        
+        friends = [friend for friend in friend_emails if friend != email]
+        high_fanout = get_high_fanout_users(friends) if friends else set()
+        if high_fanout:
+            activities += get_activity_page(
+                {"creator": {"$in": list(high_fanout)}, "privacy": "public"}, before, limit, before_id
+            )
+        
+        if len(refs) < limit:
+            if refs:
+                oldest, oldest_id = refs[-1]["created_at"], refs[-1]["post_id"]
+            else:
+                oldest, oldest_id = before, before_id
+            activities += get_activity_page(
+                {"creator": {"$in": friend_emails}, "privacy": "public"}, oldest, limit, oldest_id
+            )
+        
+        # Drop duplicates (a post can come from more than one source) and keep the newest
+        unique = {(activity.get("type"), activity.get("id")): activity for activity in activities}
+        page = sorted(unique.values(), key=activity_sort_key, reverse=True)
+        
+        return page[:limit]
+    except Exception as e:
+        print(f"Error loading timeline activities: {e}")
+        return []
@@ -1,13 +1,38 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from dotenv import load_dotenv
 import os
-from datetime import datetime
+import re
+import time
+from datetime import datetime, timedelta, timezone
 
 load_dotenv()
 
 # Database URL
 MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
+
+# Connection pool and timeout settings from env (unset ones keep the URI's or pymongo's defaults)
+MONGO_CLIENT_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": "maxPoolSize",
+    "MONGO_MIN_POOL_SIZE": "minPoolSize",
+    "MONGO_MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+    "MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "MONGO_SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS"
+}
+
+def mongo_client_options(env=None):
+    """MongoClient keyword options for the MONGO_* pool and timeout settings that are set"""
+    env = os.environ if env is None else env
+    return {
+        option: int(env[name])
+        for name, option in MONGO_CLIENT_SETTINGS.items()
+        if env.get(name)
+    }
+
+# connect=False: the client connects on the first operation, not at import
+client = MongoClient(MONGO_URI, connect=False, **mongo_client_options())
 
 db = client["spotter-db"] 
 
@@ -23,60 +48,289 @@ feed_posts = db.feed_posts
 likes = db.likes
 comments = db.comments
 challenge_invitations = db.challenge_invitations
+user_stats = db.user_stats
+timelines = db.timelines
+challenge_progress = db.challenge_progress
+
+# Fan-out-on-write friends timeline (optional). With FEED_TIMELINE=1 public posts are
+# pushed to each friend's timeline, kept for TIMELINE_DAYS. Users with more than
+# TIMELINE_FANOUT_LIMIT friends are not fanned out; their friends read their posts instead.
+FEED_TIMELINE = os.getenv("FEED_TIMELINE", "0") == "1"
+TIMELINE_DAYS = int(os.getenv("TIMELINE_DAYS", "30"))
+TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "1000"))
+# A failed fan-out is retried, waiting TIMELINE_FANOUT_RETRY_DELAY seconds more each time
+TIMELINE_FANOUT_ATTEMPTS = int(os.getenv("TIMELINE_FANOUT_ATTEMPTS", "3"))
+TIMELINE_FANOUT_RETRY_DELAY = 0.1
+
+def ensure_ttl_index(collection, field, expire_after):
+    """
+    Make collection.field a TTL index removing documents expire_after seconds after it.
+    An existing plain index, or a TTL index with another lifetime, is updated in place with collMod.
+    """
+    existing = collection.index_information().get(f"{field}_1")
+    
+    if existing is None:
+        collection.create_index(field, expireAfterSeconds=expire_after)
+    elif existing.get("expireAfterSeconds") != expire_after:
+        db.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": expire_after}
+        )
+
+
+def ensure_session_ttl_index():
+    """
+    Make sessions.expires_at a TTL index so MongoDB removes expired sessions itself.
+    An existing plain expires_at index is converted in place with collMod.
+    """
+    ensure_ttl_index(sessions, "expires_at", 0)
+
+
+def ensure_timeline_indexes():
+    """
+    Index timelines for the per-owner page read and expire entries after TIMELINE_DAYS.
+    An existing TTL index with a different lifetime is updated in place with collMod.
+    """
+    timelines.create_index([("owner", 1), ("created_at", -1), ("post_id", -1)])
+    timelines.create_index([("owner", 1), ("post_type", 1), ("post_id", 1)], unique=True)
+    
+    ensure_ttl_index(timelines, "created_at", TIMELINE_DAYS * 24 * 60 * 60)
+
+
+def ensure_cache_indexes():
+    """
+    TTL indexes on stored_at for the collections of the mongo response caches, with the
+    lifetimes configured next to each cache. Created whichever backend is configured, so
+    a cache can be switched to mongo without another migration.
+    """
+    # Imported here: these modules build their caches on import, and the mongo ones import db
+    from getExercises import EXERCISE_CACHE_TTL, EXERCISE_CACHE_STALE_TTL
+    from recipeSuggestions.suggest import RECIPE_CACHE_TTL
+    from findClasses import CLASS_CACHE_TTL
+    
+    # Stale exercises are still served (and regenerated) for EXERCISE_CACHE_STALE_TTL
+    ensure_ttl_index(db.exercise_cache, "stored_at", EXERCISE_CACHE_TTL + EXERCISE_CACHE_STALE_TTL)
+    ensure_ttl_index(db.recipe_cache, "stored_at", RECIPE_CACHE_TTL)
+    ensure_ttl_index(db.class_cache, "stored_at", CLASS_CACHE_TTL)
+
+
+# Indexes on challenges and workouts matching the feed queries: each filter
+# (none, privacy, creator, creator + privacy) followed by the created_at, id sort
+FEED_INDEXES = [
+    [("created_at", -1), ("id", -1)],
+    [("privacy", 1), ("created_at", -1), ("id", -1)],
+    [("creator", 1), ("created_at", -1), ("id", -1)],
+    [("creator", 1), ("privacy", 1), ("created_at", -1), ("id", -1)]
+]
+
 
-# Create indexes for better performance and uniqueness
-try:
+def ensure_participant_index():
+    """
+    Make a user's join of a challenge unique. The index can't be built while repeated
+    joins exist, so before it is first created they are removed and the participant
+    counts fixed (see reconcile_challenge_participants).
+    """
+    if "challenge_id_1_participant_email_1" not in challenge_participants.index_information():
+        removed, fixed = reconcile_challenge_participants()
+        if removed:
+            print(
+                f"Removed {removed} duplicate participants and fixed counts on {fixed} challenges; "
+                "run rebuild-user-stats to fix challenges_joined"
+            )
+    challenge_participants.create_index([("challenge_id", 1), ("participant_email", 1)], unique=True)
+
+
+def ensure_indexes():
+    """
+    Create the indexes every query and uniqueness check relies on, and store any
+    string created_at values as datetimes. Safe to run repeatedly: existing indexes
+    are left alone and changed TTLs are updated in place.
+    Run once per deploy (python manage.py ensure-indexes) rather than on every import.
+    """
     users.create_index("email", unique=True)
+    users.create_index("search_keys")
     sessions.create_index("token", unique=True)
-    sessions.create_index("expires_at")
-    challenges.create_index("creator")
-    challenges.create_index("created_at")
-    workouts.create_index("creator")
-    workouts.create_index("created_at")
+    ensure_session_ttl_index()
+    for collection in (challenges, workouts):
+        collection.create_index("id")
+        for keys in FEED_INDEXES:
+            collection.create_index(keys)
     friend_requests.create_index([("from_user", 1), ("to_user", 1)], unique=True)
     friendships.create_index([("user1", 1), ("user2", 1)], unique=True)
     likes.create_index([("user_email", 1), ("post_id", 1), ("post_type", 1)], unique=True)
+    likes.create_index([("post_id", 1), ("post_type", 1)])
     comments.create_index("post_id")
     comments.create_index("created_at")
     challenge_invitations.create_index([("challenge_id", 1), ("invitee_email", 1)], unique=True)
     challenge_invitations.create_index("invitee_email")
-    print("MongoDB indexes created successfully")
-except Exception as e:
-    print(f"Note: Some indexes may already exist - {e}")
+    ensure_participant_index()
+    challenge_progress.create_index([("challenge_id", 1), ("participant_email", 1)], unique=True)
+    challenge_progress.create_index([("challenge_id", 1), ("progress", -1), ("participant_email", 1)])
+    challenge_progress.create_index("participant_email")
+    ensure_timeline_indexes()
+    ensure_cache_indexes()
+    
+    # Feed cursors compare created_at as datetimes, which never match rows stored as strings
+    _, skipped = migrate_created_at_to_datetime()
+    if skipped:
+        print(f"{skipped} documents have a created_at that is not an ISO timestamp; fix them by hand")
+
+
+def parse_created_at(value):
+    """
+    Convert an ISO string created_at to a naive UTC datetime. The strings were written
+    with datetime.now(), so they are read as local time. Raises ValueError.
+    """
+    created_at = datetime.fromisoformat(value)
+    if created_at.tzinfo is None:
+        created_at = created_at.astimezone()
+    return created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def created_at_key(value):
+    """Sort key for created_at values that may still be ISO strings (oldest when missing)"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return parse_created_at(value)
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+def migrate_created_at_to_datetime(batch_size=1000):
+    """
+    Convert ISO string created_at values on challenges and workouts to BSON datetimes.
+    The strings were written with datetime.now(), so they are read as local time and stored as UTC.
+    Strings that are not ISO timestamps are logged and left as they are.
+    Returns (documents converted, documents skipped).
+    """
+    converted = 0
+    skipped = 0
+    
+    for collection in (challenges, workouts):
+        batch = []
+        for doc in collection.find({"created_at": {"$type": "string"}}, {"created_at": 1}):
+            try:
+                created_at = parse_created_at(doc["created_at"])
+            except ValueError:
+                print(f"Skipping {collection.name} {doc['_id']}: invalid created_at {doc['created_at']!r}")
+                skipped += 1
+                continue
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"created_at": created_at}}))
+            if len(batch) >= batch_size:
+                converted += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        
+        if batch:
+            converted += collection.bulk_write(batch, ordered=False).modified_count
+    
+    return converted, skipped
 
 
 # Friend-related functions
+def user_search_keys(email, username=None):
+    """
+    Lowercased keys a user can be found by with a prefix search:
+    the email, the username and each word of the username.
+    """
+    keys = {email.lower()}
+    
+    if username:
+        username = username.lower()
+        keys.add(username)
+        keys.update(re.split(r"[\s._-]+", username))
+    
+    keys.discard("")
+    return sorted(keys)
+
+
+def backfill_user_search_keys(batch_size=1000):
+    """Set search_keys on users that don't have them yet. Returns the number updated."""
+    missing = users.find({"search_keys": {"$exists": False}}, {"email": 1, "username": 1})
+    
+    updated = 0
+    batch = []
+    for user in missing:
+        batch.append(UpdateOne(
+            {"_id": user["_id"]},
+            {"$set": {"search_keys": user_search_keys(user["email"], user.get("username"))}}
+        ))
+        if len(batch) >= batch_size:
+            updated += users.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    
+    if batch:
+        updated += users.bulk_write(batch, ordered=False).modified_count
+    
+    return updated
+
+
 def search_users(query, current_user_email, limit=20):
-    """Search for users by email or username"""
+    """Search for users whose email, username or a username word starts with query"""
     if not query or len(query.strip()) == 0:
         return []
     
-    # Search by email or username (case-insensitive)
-    search_results = users.find({
-        "$or": [
-            {"email": {"$regex": query, "$options": "i"}},
-            {"username": {"$regex": query, "$options": "i"}}
-        ],
+    # Anchored, case-sensitive regex on the lowercased keys can use the search_keys index
+    prefix = "^" + re.escape(query.strip().lower())
+    search_results = list(users.find({
+        "search_keys": {"$regex": prefix},
         "email": {"$ne": current_user_email}  # Exclude current user
-    }).limit(limit)
+    }, {"_id": 0, "email": 1, "username": 1, "bio": 1}).limit(limit))
+    
+    if not search_results:
+        return []
+    
+    found_emails = [user["email"] for user in search_results]
+    
+    # Check friendship status for all results at once
+    friend_emails = set()
+    for friendship in friendships.find({
+        "$or": [
+            {"user1": current_user_email, "user2": {"$in": found_emails}},
+            {"user2": current_user_email, "user1": {"$in": found_emails}}
+        ]
+    }):
+        friend_emails.add(friendship["user2"] if friendship["user1"] == current_user_email else friendship["user1"])
+    
+    # Check pending requests for all results at once
+    pending_emails = {
+        req["to_user"] for req in friend_requests.find({
+            "from_user": current_user_email,
+            "to_user": {"$in": found_emails},
+            "status": "pending"
+        })
+    }
     
     results = []
     for user in search_results:
-        # Check friendship status
-        is_friend = check_friendship(current_user_email, user["email"])
-        has_pending_request = check_pending_request(current_user_email, user["email"])
-        
         results.append({
             "email": user["email"],
             "username": user.get("username", user["email"].split("@")[0]),
             "bio": user.get("bio", ""),
-            "is_friend": is_friend,
-            "has_pending_request": has_pending_request
+            "is_friend": user["email"] in friend_emails,
+            "has_pending_request": user["email"] in pending_emails
         })
     
     return results
 
 
+def get_users_by_email(emails):
+    """
+    Look up many users with a single query.
+    Returns a dict of email -> user with only email, username and bio.
+    """
+    emails = list(set(emails))
+    
+    if not emails:
+        return {}
+    
+    found = users.find(
+        {"email": {"$in": emails}},
+        {"_id": 0, "email": 1, "username": 1, "bio": 1}
+    )
+    return {user["email"]: user for user in found}
+
+
 def check_friendship(user1_email, user2_email):
     """Check if two users are friends"""
     friendship = friendships.find_one({
@@ -132,14 +386,16 @@ def send_friend_request(from_user_email, to_user_email):
 
 def get_friend_requests(user_email):
     """Get all pending friend requests for a user"""
-    requests = friend_requests.find({
+    requests = list(friend_requests.find({
         "to_user": user_email,
         "status": "pending"
-    }).sort("created_at", -1)
+    }).sort("created_at", -1))
+    
+    senders = get_users_by_email(req["from_user"] for req in requests)
     
     result = []
     for req in requests:
-        from_user = users.find_one({"email": req["from_user"]})
+        from_user = senders.get(req["from_user"])
         if from_user:
             result.append({
                 "request_id": str(req["_id"]),
@@ -171,6 +427,9 @@ def accept_friend_request(request_from, request_to):
         "created_at": datetime.utcnow()
     })
     
+    increment_user_stats([user1, user2], friends_count=1)
+    backfill_friend_timelines(user1, user2)
+    
     return True, "Friend request accepted"
 
 
@@ -189,20 +448,25 @@ def reject_friend_request(request_from, request_to):
 
 def get_friends(user_email):
     """Get all friends of a user"""
-    friends_list = friendships.find({
+    friends_list = list(friendships.find({
         "$or": [
             {"user1": user_email},
             {"user2": user_email}
         ]
-    }).sort("created_at", -1)
+    }).sort("created_at", -1))
+    
+    # Get the other user's email for each friendship
+    friend_emails = [
+        friendship["user2"] if friendship["user1"] == user_email else friendship["user1"]
+        for friendship in friends_list
+    ]
+    
+    # Get all friends' details at once
+    friends = get_users_by_email(friend_emails)
     
     result = []
-    for friendship in friends_list:
-        # Get the other user's email
-        friend_email = friendship["user2"] if friendship["user1"] == user_email else friendship["user1"]
-        
-        # Get friend's details
-        friend = users.find_one({"email": friend_email})
+    for friendship, friend_email in zip(friends_list, friend_emails):
+        friend = friends.get(friend_email)
         if friend:
             result.append({
                 "email": friend_email,
@@ -226,6 +490,9 @@ def remove_friend(user_email, friend_email):
     if result.deleted_count == 0:
         return False, "Friendship not found"
     
+    increment_user_stats([user1, user2], friends_count=-1)
+    remove_friend_timelines(user1, user2)
+    
     return True, "Friend removed"
 # Add these functions to your db.py file
 
@@ -263,6 +530,10 @@ def update_user_profile(email, data):
     if not update_data:
         return False, "No valid fields to update"
     
+    # Keep the user searchable by their new username
+    if "username" in update_data:
+        update_data["search_keys"] = user_search_keys(email, update_data["username"])
+    
     update_data["updated_at"] = datetime.utcnow()
     
     result = users.update_one(
@@ -276,99 +547,233 @@ def update_user_profile(email, data):
         return False, "No changes made"
 
 
-def get_user_stats(email):
-    """Calculate user statistics"""
-    # Count challenges created
-    challenges_created = challenges.count_documents({"creator": email})
+# Materialized per-user stats, stored in user_stats with the email as _id
+USER_STAT_FIELDS = [
+    "challenges_created", "challenges_joined", "workouts_logged",
+    "total_workout_minutes", "total_calories_burned", "friends_count"
+]
+
+
+def compute_user_stats(emails=None):
+    """
+    Compute stats from the source collections with one aggregation per collection.
+    emails limits the computation to those users (None for everyone).
+    Returns a dict of email -> stats.
+    """
+    if emails is not None:
+        emails = set(emails)
     
-    # Count challenges participated in
-    challenges_joined = challenge_participants.count_documents({"participant_email": email})
+    def match(field):
+        return [{"$match": {field: {"$in": list(emails)}}}] if emails is not None else []
     
-    # Count workouts logged
-    workouts_logged = workouts.count_documents({"creator": email})
+    stats = {}
     
-    # Count friends
-    friends_count = friendships.count_documents({
-        "$or": [
-            {"user1": email},
-            {"user2": email}
-        ]
-    })
+    def stats_for(email):
+        if email not in stats:
+            stats[email] = {field: 0 for field in USER_STAT_FIELDS}
+            stats[email].update(compute_streak_state([]))
+        return stats[email]
     
-    # Calculate total workout duration
-    workout_pipeline = [
-        {"$match": {"creator": email}},
+    for email in emails or []:
+        stats_for(email)
+    
+    # Challenges created
+    for row in challenges.aggregate(match("creator") + [
+        {"$group": {"_id": "$creator", "count": {"$sum": 1}}}
+    ]):
+        stats_for(row["_id"])["challenges_created"] = row["count"]
+    
+    # Challenges participated in
+    for row in challenge_participants.aggregate(match("participant_email") + [
+        {"$group": {"_id": "$participant_email", "count": {"$sum": 1}}}
+    ]):
+        stats_for(row["_id"])["challenges_joined"] = row["count"]
+    
+    # Workouts logged, total duration and calories, and streaks from the distinct workout days
+    for row in workouts.aggregate(match("creator") + [
         {"$group": {
-            "_id": None,
+            "_id": "$creator",
+            "count": {"$sum": 1},
             "total_duration": {"$sum": "$duration"},
-            "total_calories": {"$sum": "$calories"}
+            "total_calories": {"$sum": "$calories"},
+            "dates": {"$addToSet": "$date"}
         }}
-    ]
+    ]):
+        user = stats_for(row["_id"])
+        user["workouts_logged"] = row["count"]
+        user["total_workout_minutes"] = row["total_duration"]
+        user["total_calories_burned"] = row["total_calories"]
+        user.update(compute_streak_state(row["dates"]))
     
-    workout_stats = list(workouts.aggregate(workout_pipeline))
-    total_duration = workout_stats[0]["total_duration"] if workout_stats else 0
-    total_calories = workout_stats[0]["total_calories"] if workout_stats else 0
+    # Friends (each friendship counts for both users)
+    friend_pipeline = []
+    if emails is not None:
+        friend_pipeline.append({"$match": {"$or": [
+            {"user1": {"$in": list(emails)}},
+            {"user2": {"$in": list(emails)}}
+        ]}})
+    friend_pipeline.append({"$facet": {
+        side: match(side) + [{"$group": {"_id": f"${side}", "count": {"$sum": 1}}}]
+        for side in ("user1", "user2")
+    }})
+    friend_counts = next(friendships.aggregate(friend_pipeline))
+    for side in ("user1", "user2"):
+        for row in friend_counts[side]:
+            stats_for(row["_id"])["friends_count"] += row["count"]
     
-    # Get workout streak (days with at least one workout)
-    recent_workouts = list(workouts.find(
-        {"creator": email}
-    ).sort("date", -1).limit(30))
+    return stats
+
+
+def rebuild_user_stats(emails=None, batch_size=1000):
+    """
+    Recompute materialized stats from scratch (backfill or repair).
+    emails limits the rebuild to those users (None for every user).
+    Returns the number of stats documents written.
+    """
+    if emails is None:
+        emails = [user["email"] for user in users.find({}, {"_id": 0, "email": 1})]
     
-    streak = calculate_streak(recent_workouts)
+    computed = compute_user_stats(emails)
+    now = datetime.utcnow()
     
-    return {
-        "challenges_created": challenges_created,
-        "challenges_joined": challenges_joined,
-        "workouts_logged": workouts_logged,
-        "total_workout_minutes": total_duration,
-        "total_calories_burned": total_calories,
-        "friends_count": friends_count,
-        "current_streak": streak
-    }
+    written = 0
+    batch = []
+    for email, stats in computed.items():
+        batch.append(ReplaceOne({"_id": email}, {**stats, "updated_at": now}, upsert=True))
+        if len(batch) >= batch_size:
+            user_stats.bulk_write(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    
+    if batch:
+        user_stats.bulk_write(batch, ordered=False)
+        written += len(batch)
+    
+    return written
 
 
-def calculate_streak(workouts):
-    """Calculate the current workout streak in days"""
-    if not workouts:
-        return 0
-    
-    from datetime import timedelta
+def increment_user_stats(emails, **deltas):
+    """
+    Apply incremental changes to materialized stats, e.g. workouts_logged=1.
+    Users without a stats document are skipped; theirs is computed in full on the next read.
+    Errors are logged rather than raised, since rebuild_user_stats can repair any drift.
+    """
+    try:
+        user_stats.update_many(
+            {"_id": {"$in": list(emails)}},
+            {"$inc": deltas, "$set": {"updated_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        print(f"Error updating user stats: {e}")
+
+
+def get_user_stats(email):
+    """Get user statistics from the materialized user_stats document"""
+    stats = user_stats.find_one({"_id": email}, {"_id": 0, "updated_at": 0})
     
-    # Get unique workout dates
-    workout_dates = set()
-    for workout in workouts:
-        workout_date = workout.get("date")
-        if isinstance(workout_date, str):
-            workout_date = datetime.strptime(workout_date, "%Y-%m-%d").date()
-        elif isinstance(workout_date, datetime):
-            workout_date = workout_date.date()
-        workout_dates.add(workout_date)
+    if stats is None or "streak_length" not in stats:
+        # First read for this user: compute once and store
+        stats = compute_user_stats([email])[email]
+        user_stats.replace_one({"_id": email}, {**stats, "updated_at": datetime.utcnow()}, upsert=True)
     
-    if not workout_dates:
-        return 0
+    return {
+        **{field: stats.get(field, 0) for field in USER_STAT_FIELDS},
+        "current_streak": get_current_streak(stats),
+        "longest_streak": stats.get("longest_streak", 0)
+    }
+
+
+# Workout streaks, stored in user_stats as the run of consecutive workout days
+# ending at streak_last_day (streak_length days long) plus the longest run
+def _workout_day(value):
+    """Convert a workout date (YYYY-MM-DD string or datetime) to a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    return None
+
+
+def compute_streak_state(workout_dates):
+    """Compute streak state from all of a user's workout dates"""
+    days = sorted({day for day in map(_workout_day, workout_dates) if day})
     
-    # Sort dates in descending order
-    sorted_dates = sorted(workout_dates, reverse=True)
+    run = longest = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
     
-    # Check if the most recent workout was today or yesterday
+    return {
+        "streak_last_day": previous.isoformat() if previous else None,
+        "streak_length": run,
+        "longest_streak": longest
+    }
+
+
+def get_current_streak(stats):
+    """Current workout streak in days: the latest run only counts if it ended today or yesterday"""
+    last_day = _workout_day(stats.get("streak_last_day"))
     today = datetime.utcnow().date()
-    yesterday = today - timedelta(days=1)
     
-    if sorted_dates[0] not in [today, yesterday]:
+    if last_day not in [today, today - timedelta(days=1)]:
         return 0
     
-    # Count consecutive days
-    streak = 1
-    expected_date = sorted_dates[0] - timedelta(days=1)
-    
-    for i in range(1, len(sorted_dates)):
-        if sorted_dates[i] == expected_date:
-            streak += 1
-            expected_date -= timedelta(days=1)
+    return stats.get("streak_length", 0)
+
+
+def update_workout_streak(email, workout_date):
+    """
+    Update a user's streak state for a newly logged workout in O(1).
+    Back-dated workouts outside the current run (which may join two runs) and
+    concurrent updates fall back to recomputing from all of the user's workout days.
+    Errors are logged rather than raised, like increment_user_stats.
+    """
+    try:
+        day = _workout_day(workout_date)
+        state = user_stats.find_one(
+            {"_id": email},
+            {"_id": 0, "streak_last_day": 1, "streak_length": 1, "longest_streak": 1}
+        )
+        
+        # Users without stats get their streak computed in full on the next read
+        if state is None or "streak_length" not in state or day is None:
+            return
+        
+        last_day = _workout_day(state["streak_last_day"])
+        length = state["streak_length"]
+        
+        if last_day is None or day > last_day + timedelta(days=1):
+            new_state = {"streak_last_day": day.isoformat(), "streak_length": 1}
+        elif day == last_day + timedelta(days=1):
+            new_state = {"streak_last_day": day.isoformat(), "streak_length": length + 1}
+        elif day > last_day - timedelta(days=length):
+            return  # Already part of the current run
         else:
-            break
-    
-    return streak
+            new_state = None
+        
+        if new_state is not None:
+            new_state["longest_streak"] = max(state.get("longest_streak", 0), new_state["streak_length"])
+            result = user_stats.update_one(
+                {"_id": email, "streak_last_day": state["streak_last_day"], "streak_length": length},
+                {"$set": new_state}
+            )
+            if result.matched_count:
+                return
+        
+        # Back-dated workout or a concurrent update: recompute from every workout day
+        recompute_workout_streak(email)
+    except Exception as e:
+        print(f"Error updating workout streak: {e}")
+
+
+def recompute_workout_streak(email):
+    """Recompute a user's stored streak state from all of their workout days"""
+    user_stats.update_one(
+        {"_id": email},
+        {"$set": compute_streak_state(workouts.distinct("date", {"creator": email}))}
+    )
 
 
 def get_user_recent_activities(email, limit=10):
@@ -411,7 +816,7 @@ def get_user_recent_activities(email, limit=10):
         })
     
     # Sort by creation date and limit
-    activities.sort(key=lambda x: x["data"]["created_at"], reverse=True)
+    activities.sort(key=lambda x: created_at_key(x["data"]["created_at"]), reverse=True)
     return activities[:limit]
 
 
@@ -466,10 +871,12 @@ def get_likes_for_post(post_id, post_type):
             "post_type": post_type
         }))
         
-        # Get user details for each like
+        # Get user details for all likes at once
+        likers = get_users_by_email(like["user_email"] for like in like_list)
+        
         likes_with_users = []
         for like in like_list:
-            user = users.find_one({"email": like["user_email"]})
+            user = likers.get(like["user_email"])
             if user:
                 likes_with_users.append({
                     "user_email": like["user_email"],
@@ -499,6 +906,49 @@ def has_user_liked(user_email, post_id, post_type):
     }) is not None
 
 
+def get_post_interactions(post_refs, user_email):
+    """
+    Get like counts, comment counts and the user's liked flag for many posts at once.
+    post_refs is a list of (post_id, post_type) pairs.
+    Returns a dict keyed by (post_id, post_type) using a constant number of queries.
+    """
+    interactions = {
+        (post_id, post_type): {"like_count": 0, "comment_count": 0, "user_has_liked": False}
+        for post_id, post_type in post_refs
+    }
+    
+    if not interactions:
+        return interactions
+    
+    post_ids = list({post_id for post_id, _ in interactions})
+    count_pipeline = [
+        {"$match": {"post_id": {"$in": post_ids}}},
+        {"$group": {
+            "_id": {"post_id": "$post_id", "post_type": "$post_type"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    
+    # Like and comment counts, one aggregation each
+    for field, collection in (("like_count", likes), ("comment_count", comments)):
+        for row in collection.aggregate(count_pipeline):
+            key = (row["_id"]["post_id"], row["_id"]["post_type"])
+            if key in interactions:
+                interactions[key][field] = row["count"]
+    
+    # Posts the user has liked
+    user_likes = likes.find(
+        {"user_email": user_email, "post_id": {"$in": post_ids}},
+        {"_id": 0, "post_id": 1, "post_type": 1}
+    )
+    for like in user_likes:
+        key = (like["post_id"], like["post_type"])
+        if key in interactions:
+            interactions[key]["user_has_liked"] = True
+    
+    return interactions
+
+
 def add_comment(user_email, post_id, post_type, comment_text):
     """Add a comment to a post"""
     try:
@@ -582,36 +1032,210 @@ def get_friends_and_self_emails(user_email):
     return emails
 
 
+# Friends timeline (fan-out-on-write), one small reference document per owner and post
+def get_high_fanout_users(emails):
+    """Users among emails with more than TIMELINE_FANOUT_LIMIT friends, whose posts are not fanned out"""
+    return {
+        stats["_id"] for stats in user_stats.find(
+            {"_id": {"$in": list(emails)}, "friends_count": {"$gt": TIMELINE_FANOUT_LIMIT}},
+            {"_id": 1}
+        )
+    }
+
+
+def push_to_timelines(owners, posts):
+    """Add references to posts to each owner's timeline. Posts already there are skipped."""
+    entries = [
+        {
+            "owner": owner,
+            "post_id": post["id"],
+            "post_type": post["type"],
+            "creator": post["creator"],
+            "created_at": post["created_at"]
+        }
+        for owner in owners
+        for post in posts
+    ]
+    
+    if not entries:
+        return
+    
+    try:
+        timelines.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        # Duplicates (code 11000) are expected when a post is pushed twice
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+def fan_out_post(post):
+    """
+    Push a new public post to the timelines of its creator and their friends.
+    High-fanout creators only get it on their own timeline. Failures are retried, then
+    logged rather than raised: the post is saved, and rebuild_timelines repairs the timelines.
+    """
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Fan out several new posts (see fan_out_post), looking up each creator's friends once"""
+    if not FEED_TIMELINE:
+        return
+    
+    by_creator = {}
+    for post in posts:
+        if post.get("privacy") == "public":
+            by_creator.setdefault(post["creator"], []).append(post)
+    
+    if not by_creator:
+        return
+    
+    high_fanout = None
+    for creator, creator_posts in by_creator.items():
+        # Pushing again is safe: entries already on a timeline are skipped
+        for attempt in range(1, TIMELINE_FANOUT_ATTEMPTS + 1):
+            try:
+                if high_fanout is None:
+                    high_fanout = get_high_fanout_users(list(by_creator))
+                if creator in high_fanout:
+                    owners = [creator]
+                else:
+                    owners = get_friends_and_self_emails(creator)
+                push_to_timelines(owners, creator_posts)
+                break
+            except Exception as e:
+                if attempt == TIMELINE_FANOUT_ATTEMPTS:
+                    post_ids = [post["id"] for post in creator_posts]
+                    print(f"Error fanning out posts {post_ids} by {creator}: {e}; "
+                          f"run python manage.py rebuild-timelines to repair")
+                else:
+                    time.sleep(TIMELINE_FANOUT_RETRY_DELAY * attempt)
+
+
+def recent_public_posts(emails):
+    """Public posts by emails created within the timeline window"""
+    cutoff = datetime.utcnow() - timedelta(days=TIMELINE_DAYS)
+    query = {"creator": {"$in": list(emails)}, "privacy": "public", "created_at": {"$gte": cutoff}}
+    fields = {"_id": 0, "id": 1, "type": 1, "creator": 1, "created_at": 1}
+    
+    return list(challenges.find(query, fields)) + list(workouts.find(query, fields))
+
+
+def backfill_friend_timelines(user1, user2):
+    """Copy each new friend's recent public posts into the other's timeline (best-effort)"""
+    if not FEED_TIMELINE:
+        return
+    
+    try:
+        high_fanout = get_high_fanout_users([user1, user2])
+        for owner, friend in ((user1, user2), (user2, user1)):
+            if friend not in high_fanout:
+                push_to_timelines([owner], recent_public_posts([friend]))
+    except Exception as e:
+        print(f"Error backfilling timelines: {e}")
+
+
+def remove_friend_timelines(user1, user2):
+    """
+    Remove each former friend's posts from the other's timeline (best-effort). A user
+    this brings back to TIMELINE_FANOUT_LIMIT friends is fanned out again, so their
+    recent posts, which friends read directly until now, are pushed to their friends.
+    """
+    if not FEED_TIMELINE:
+        return
+    
+    try:
+        timelines.delete_many({"$or": [
+            {"owner": user1, "creator": user2},
+            {"owner": user2, "creator": user1}
+        ]})
+        
+        back_under_limit = user_stats.find(
+            {"_id": {"$in": [user1, user2]}, "friends_count": TIMELINE_FANOUT_LIMIT}, {"_id": 1}
+        )
+        for stats in back_under_limit:
+            push_to_timelines(get_friends_and_self_emails(stats["_id"]), recent_public_posts([stats["_id"]]))
+    except Exception as e:
+        print(f"Error cleaning up timelines: {e}")
+
+
+def rebuild_timelines(emails=None):
+    """
+    Fill timelines from the recent public posts of each user's friends (backfill when
+    enabling FEED_TIMELINE, or repair). emails limits the rebuild to those owners.
+    Returns the number of timelines rebuilt.
+    """
+    if emails is None:
+        emails = [user["email"] for user in users.find({}, {"_id": 0, "email": 1})]
+    
+    rebuilt = 0
+    for email in emails:
+        friends = get_friends_and_self_emails(email)
+        creators = set(friends) - (get_high_fanout_users(friends) - {email})
+        push_to_timelines([email], recent_public_posts(creators))
+        rebuilt += 1
+    
+    return rebuilt
+
+
 # Challenge Invitation Functions
 def send_challenge_invitation(challenge_id, challenge_title, inviter_email, invitee_email):
     """Send a challenge invitation to a user"""
+    _, success, message = send_challenge_invitations(
+        challenge_id, challenge_title, inviter_email, [invitee_email]
+    )[0]
+    return success, message
+
+
+def send_challenge_invitations(challenge_id, challenge_title, inviter_email, invitee_emails):
+    """
+    Invite several users to a challenge with one insert_many. The unique
+    (challenge_id, invitee_email) index rejects users who were already invited.
+    Returns (invitee_email, success, message) for each invitee, in order.
+    """
+    if not invitee_emails:
+        return []
+    
     try:
-        # Check if invitation already exists
-        existing = challenge_invitations.find_one({
-            "challenge_id": challenge_id,
-            "invitee_email": invitee_email
-        })
-        
-        if existing:
-            return False, "Already invited"
-        
-        # Get inviter details
-        inviter = users.find_one({"email": inviter_email})
+        inviter = users.find_one({"email": inviter_email}, {"username": 1})
         inviter_username = inviter.get("username", inviter_email.split("@")[0]) if inviter else inviter_email
-        
-        challenge_invitations.insert_one({
+    except Exception as e:
+        return [(email, False, str(e)) for email in invitee_emails]
+    
+    # Each address is written once; repeats within the request count as already invited
+    unique_emails = list(dict.fromkeys(invitee_emails))
+    now = datetime.utcnow()
+    docs = [
+        {
             "challenge_id": challenge_id,
             "challenge_title": challenge_title,
             "inviter_email": inviter_email,
             "inviter_username": inviter_username,
-            "invitee_email": invitee_email,
+            "invitee_email": email,
             "status": "pending",
-            "created_at": datetime.utcnow()
-        })
-        
-        return True, "Invitation sent"
+            "created_at": now
+        }
+        for email in unique_emails
+    ]
+    
+    failed = {}
+    try:
+        challenge_invitations.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            message = "Already invited" if error.get("code") == 11000 else error.get("errmsg", "Write failed")
+            failed[unique_emails[error["index"]]] = message
     except Exception as e:
-        return False, str(e)
+        return [(email, False, str(e)) for email in invitee_emails]
+    
+    results = []
+    seen = set()
+    for email in invitee_emails:
+        message = "Already invited" if email in seen else failed.get(email)
+        seen.add(email)
+        results.append((email, message is None, message or "Invitation sent"))
+    
+    return results
 
 
 def get_challenge_invitations(user_email):
@@ -632,35 +1256,106 @@ def get_challenge_invitations(user_email):
 
 
 def accept_challenge_invitation(challenge_id, user_email):
-    """Accept a challenge invitation"""
+    """
+    Accept a challenge invitation. Safe to retry: accepting again (or after a
+    failure part way through) joins the user once and counts them once.
+    """
     try:
-        # Update invitation status
+        now = datetime.utcnow()
+        
+        # Mark the invitation accepted; an already accepted one keeps its accepted_at
         result = challenge_invitations.update_one(
-            {"challenge_id": challenge_id, "invitee_email": user_email, "status": "pending"},
-            {"$set": {"status": "accepted", "accepted_at": datetime.utcnow()}}
+            {"challenge_id": challenge_id, "invitee_email": user_email, "status": {"$in": ["pending", "accepted"]}},
+            {"$set": {"status": "accepted"}, "$min": {"accepted_at": now}}
         )
         
-        if result.modified_count == 0:
+        if result.matched_count == 0:
             return False, "Invitation not found"
         
-        # Add user to challenge participants
-        challenge_participants.insert_one({
-            "challenge_id": challenge_id,
-            "participant_email": user_email,
-            "joined_at": datetime.utcnow()
-        })
+        # Add user to challenge participants, unless a previous attempt already did
+        try:
+            joined = challenge_participants.update_one(
+                {"challenge_id": challenge_id, "participant_email": user_email},
+                {"$setOnInsert": {"joined_at": now}},
+                upsert=True
+            ).upserted_id is not None
+        except DuplicateKeyError:
+            joined = False  # A concurrent accept inserted it first
         
-        # Update challenge participants count
-        challenges.update_one(
-            {"id": challenge_id},
-            {"$inc": {"participants": 1}}
-        )
+        if joined:
+            # Update challenge participants count
+            challenge = challenges.find_one_and_update(
+                {"id": challenge_id},
+                {"$inc": {"participants": 1}},
+                projection=LEADERBOARD_CHALLENGE_FIELDS
+            )
+            increment_user_stats([user_email], challenges_joined=1)
+            if challenge:
+                add_to_leaderboard(challenge, [user_email])
         
         return True, "Challenge invitation accepted"
     except Exception as e:
         return False, str(e)
 
 
+def remove_duplicate_participants():
+    """
+    Delete repeated (challenge_id, participant_email) rows left by non-idempotent
+    accepts, keeping the earliest. Needed before the unique index can be built.
+    Returns the number of rows deleted.
+    """
+    duplicate_ids = []
+    for row in challenge_participants.aggregate([
+        {"$sort": {"joined_at": 1}},
+        {"$group": {
+            "_id": {"challenge_id": "$challenge_id", "participant_email": "$participant_email"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]):
+        duplicate_ids.extend(row["ids"][1:])
+    
+    if not duplicate_ids:
+        return 0
+    return challenge_participants.delete_many({"_id": {"$in": duplicate_ids}}).deleted_count
+
+
+def reconcile_challenge_participants(batch_size=1000):
+    """
+    Recompute every challenge's participants count (the creator plus each joined user)
+    from challenge_participants with one aggregation, and fix the ones that drifted.
+    Duplicate participant rows are removed first. Returns (duplicates removed, challenges fixed).
+    """
+    removed = remove_duplicate_participants()
+    
+    joined = {
+        row["_id"]: row["count"]
+        for row in challenge_participants.aggregate([
+            {"$group": {"_id": "$challenge_id", "count": {"$sum": 1}}}
+        ])
+    }
+    
+    fixed = 0
+    batch = []
+    for challenge in challenges.find({}, {"_id": 0, "id": 1, "participants": 1}):
+        count = 1 + joined.get(challenge["id"], 0)
+        if challenge.get("participants") == count:
+            continue
+        
+        batch.append(UpdateOne({"id": challenge["id"]}, {"$set": {"participants": count}}))
+        if len(batch) >= batch_size:
+            challenges.bulk_write(batch, ordered=False)
+            fixed += len(batch)
+            batch = []
+    
+    if batch:
+        challenges.bulk_write(batch, ordered=False)
+        fixed += len(batch)
+    
+    return removed, fixed
+
+
 def decline_challenge_invitation(challenge_id, user_email):
     """Decline a challenge invitation"""
     try:
@@ -675,3 +1370,198 @@ def decline_challenge_invitation(challenge_id, user_email):
         return True, "Challenge invitation declined"
     except Exception as e:
         return False, str(e)
+
+
+# Challenge Leaderboards
+# challenge_progress holds one document per (challenge, participant) with their
+# progress, kept up to date as workouts are logged, so a leaderboard is an indexed
+# read of its top entries however many people take part.
+LEADERBOARD_SIZE = 10
+MAX_LEADERBOARD_SIZE = 100
+
+LEADERBOARD_CHALLENGE_FIELDS = {"_id": 0, "id": 1, "creator": 1, "start_date": 1, "end_date": 1, "metric": 1}
+
+# What a workout adds to progress for each metric: (workout field, divisor).
+# Other metrics, and time-based challenges, count workouts, since workouts
+# don't record distances or weights.
+PROGRESS_METRICS = {
+    "minutes": ("duration", 1),
+    "hours": ("duration", 60),
+    "calories": ("calories", 1)
+}
+
+
+def workout_progress(workout, metric):
+    """How much one workout adds to progress in a challenge with the given metric"""
+    if metric not in PROGRESS_METRICS:
+        return 1
+    field, divisor = PROGRESS_METRICS[metric]
+    return (workout.get(field) or 0) / divisor
+
+
+def compute_challenge_progress(challenge, emails):
+    """
+    Progress of each of emails in challenge from their workouts in its date range, with one
+    aggregation. counted_workouts holds the ids of the workouts included.
+    """
+    if challenge.get("metric") in PROGRESS_METRICS:
+        field, divisor = PROGRESS_METRICS[challenge["metric"]]
+        amount = {"$divide": [{"$ifNull": [f"${field}", 0]}, divisor]}
+    else:
+        amount = 1
+    
+    progress = {email: {"progress": 0, "workouts": 0, "counted_workouts": []} for email in emails}
+    # Like record_workout_progress, count nothing for a challenge without dates
+    if not challenge.get("start_date") or not challenge.get("end_date"):
+        return progress
+    
+    for row in workouts.aggregate([
+        {"$match": {
+            "creator": {"$in": list(emails)},
+            "date": {"$gte": challenge["start_date"], "$lte": challenge["end_date"]}
+        }},
+        {"$group": {
+            "_id": "$creator",
+            "progress": {"$sum": amount},
+            "workouts": {"$sum": 1},
+            "counted_workouts": {"$push": "$id"}
+        }}
+    ]):
+        progress[row["_id"]] = {
+            "progress": row["progress"],
+            "workouts": row["workouts"],
+            "counted_workouts": row["counted_workouts"]
+        }
+    
+    return progress
+
+
+def add_to_leaderboard(challenge, emails, batch_size=1000, replace=False):
+    """
+    Put participants on a challenge's leaderboard, counting the workouts they already
+    logged within its dates. Existing entries are left alone, since record_workout_progress
+    keeps them up to date, unless replace is set (rebuild_leaderboards).
+    A new entry records the ids of the workouts it counted, so record_workout_progress
+    skips a workout that was saved before the entry but added to progress after it.
+    Errors are logged rather than raised; rebuild_leaderboards repairs missing entries.
+    """
+    try:
+        now = datetime.utcnow()
+        progress = compute_challenge_progress(challenge, emails)
+        write = "$set" if replace else "$setOnInsert"
+        
+        batch = []
+        for email, entry in progress.items():
+            batch.append(UpdateOne(
+                {"challenge_id": challenge["id"], "participant_email": email},
+                {write: {**entry, "updated_at": now}},
+                upsert=True
+            ))
+            if len(batch) >= batch_size:
+                challenge_progress.bulk_write(batch, ordered=False)
+                batch = []
+        
+        if batch:
+            challenge_progress.bulk_write(batch, ordered=False)
+    except Exception as e:
+        print(f"Error updating leaderboard: {e}")
+
+
+def record_workout_progress(workout_list):
+    """
+    Add newly logged workouts to their creators' progress in each challenge they take
+    part in whose start_date to end_date contains the workout date, with one bulk write.
+    Workouts an entry counted when it was created (see add_to_leaderboard) are skipped.
+    Errors are logged rather than raised, since rebuild_leaderboards can repair any drift.
+    """
+    by_creator = {}
+    for workout in workout_list:
+        if workout.get("date"):
+            by_creator.setdefault(workout.get("creator"), []).append(workout)
+    
+    try:
+        operations = []
+        now = datetime.utcnow()
+        
+        for creator, creator_workouts in by_creator.items():
+            challenge_ids = [
+                entry["challenge_id"]
+                for entry in challenge_progress.find({"participant_email": creator}, {"_id": 0, "challenge_id": 1})
+            ]
+            if not challenge_ids:
+                continue
+            
+            dates = [workout["date"] for workout in creator_workouts]
+            for challenge in challenges.find(
+                {"id": {"$in": challenge_ids}, "start_date": {"$lte": max(dates)}, "end_date": {"$gte": min(dates)}},
+                LEADERBOARD_CHALLENGE_FIELDS
+            ):
+                for workout in creator_workouts:
+                    if not challenge["start_date"] <= workout["date"] <= challenge["end_date"]:
+                        continue
+                    
+                    entry = {"challenge_id": challenge["id"], "participant_email": creator}
+                    if workout.get("id"):
+                        # Skip workouts the entry already counted when it was created
+                        entry["counted_workouts"] = {"$ne": workout["id"]}
+                    operations.append(UpdateOne(entry, {
+                        "$inc": {"progress": workout_progress(workout, challenge.get("metric")), "workouts": 1},
+                        "$set": {"updated_at": now}
+                    }))
+        
+        if operations:
+            challenge_progress.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"Error updating challenge progress: {e}")
+
+
+def get_leaderboard(challenge_id, limit=LEADERBOARD_SIZE):
+    """
+    Top `limit` participants of a challenge by progress (ties by email), with their
+    usernames. Reads `limit` entries from the (challenge_id, progress) index.
+    """
+    entries = list(
+        challenge_progress.find(
+            {"challenge_id": challenge_id},
+            {"_id": 0, "participant_email": 1, "progress": 1, "workouts": 1}
+        ).sort([("progress", -1), ("participant_email", 1)]).limit(limit)
+    )
+    
+    emails = [entry["participant_email"] for entry in entries]
+    usernames = {
+        user["email"]: user.get("username")
+        for user in users.find({"email": {"$in": emails}}, {"_id": 0, "email": 1, "username": 1})
+    }
+    
+    return [
+        {
+            "rank": rank,
+            "email": entry["participant_email"],
+            "username": usernames.get(entry["participant_email"]) or entry["participant_email"].split("@")[0],
+            "progress": entry["progress"],
+            "workouts": entry["workouts"]
+        }
+        for rank, entry in enumerate(entries, start=1)
+    ]
+
+
+def rebuild_leaderboards(challenge_ids=None):
+    """
+    Recompute leaderboard entries for the creator and participants of each challenge
+    (all challenges if challenge_ids is None), e.g. to backfill existing challenges.
+    Returns the number of challenges rebuilt.
+    """
+    query = {"id": {"$in": list(challenge_ids)}} if challenge_ids is not None else {}
+    
+    rebuilt = 0
+    for challenge in challenges.find(query, LEADERBOARD_CHALLENGE_FIELDS):
+        emails = {challenge["creator"]} if challenge.get("creator") else set()
+        emails.update(
+            row["participant_email"]
+            for row in challenge_participants.find({"challenge_id": challenge["id"]}, {"_id": 0, "participant_email": 1})
+        )
+        if emails:
+            add_to_leaderboard(challenge, emails, replace=True)
+        rebuilt += 1
+    
+    return rebuilt
@@ -0,0 +1,179 @@
+# backend/exerciseCatalog.py
+# Local exercise library covering every muscle in getExercises.BODY_PARTS,
+# so generate_exercises can answer without an OpenAI round trip.
+# Entries use the same fields as the OpenAI response.
+
+EXERCISES = [
+    # Arms
+    {"name": "Barbell Curl", "primary_muscle": "Biceps", "secondary_muscles": ["Forearms"], "equipment": "Barbell",
+     "instructions": ["Hold the bar with an underhand, shoulder-width grip", "Curl the bar to your shoulders keeping your elbows at your sides", "Lower slowly to full extension"]},
+    {"name": "Hammer Curl", "primary_muscle": "Biceps", "secondary_muscles": ["Forearms"], "equipment": "Dumbbells",
+     "instructions": ["Hold the dumbbells with palms facing each other", "Curl both dumbbells up without swinging", "Lower under control"]},
+    {"name": "Incline Dumbbell Curl", "primary_muscle": "Biceps", "secondary_muscles": [], "equipment": "Dumbbells, incline bench",
+     "instructions": ["Sit back on a 45 degree bench with arms hanging straight", "Curl the dumbbells up while keeping your upper arms still", "Lower until your arms are fully straight"]},
+    {"name": "Close-Grip Bench Press", "primary_muscle": "Triceps", "secondary_muscles": ["Middle Chest", "Front Delts"], "equipment": "Barbell, flat bench",
+     "instructions": ["Grip the bar slightly narrower than shoulder width", "Lower the bar to your lower chest with elbows tucked", "Press back up until your arms are locked out"]},
+    {"name": "Overhead Triceps Extension", "primary_muscle": "Triceps", "secondary_muscles": [], "equipment": "Dumbbell",
+     "instructions": ["Hold one dumbbell overhead with both hands", "Lower it behind your head by bending your elbows", "Extend your arms back to the top"]},
+    {"name": "Cable Triceps Pushdown", "primary_muscle": "Triceps", "secondary_muscles": [], "equipment": "Cable machine",
+     "instructions": ["Grip the bar or rope with elbows pinned to your sides", "Push down until your arms are straight", "Let the handle rise until your forearms pass parallel"]},
+    {"name": "Wrist Curl", "primary_muscle": "Forearms", "secondary_muscles": [], "equipment": "Dumbbells",
+     "instructions": ["Rest your forearms on a bench with palms up", "Curl the weight up using only your wrists", "Lower slowly to a full stretch"]},
+    {"name": "Reverse Curl", "primary_muscle": "Forearms", "secondary_muscles": ["Biceps"], "equipment": "Barbell",
+     "instructions": ["Hold the bar with an overhand grip", "Curl the bar up keeping your wrists straight", "Lower under control"]},
+    {"name": "Farmer's Carry", "primary_muscle": "Forearms", "secondary_muscles": ["Traps", "Obliques"], "equipment": "Dumbbells or kettlebells",
+     "instructions": ["Pick up a heavy weight in each hand", "Walk with a tall posture and tight grip", "Set the weights down under control"]},
+
+    # Legs
+    {"name": "Back Squat", "primary_muscle": "Quads", "secondary_muscles": ["Glutes", "Hamstrings", "Lower Back"], "equipment": "Barbell, squat rack",
+     "instructions": ["Rest the bar on your upper back with feet shoulder-width apart", "Sit down until your thighs are at least parallel", "Drive up through your whole foot"]},
+    {"name": "Leg Press", "primary_muscle": "Quads", "secondary_muscles": ["Glutes"], "equipment": "Leg press machine",
+     "instructions": ["Place your feet hip-width on the platform", "Lower the platform until your knees reach about 90 degrees", "Press back up without locking your knees"]},
+    {"name": "Leg Extension", "primary_muscle": "Quads", "secondary_muscles": [], "equipment": "Leg extension machine",
+     "instructions": ["Sit with the pad just above your ankles", "Extend your legs until straight", "Lower slowly"]},
+    {"name": "Romanian Deadlift", "primary_muscle": "Hamstrings", "secondary_muscles": ["Glutes", "Lower Back"], "equipment": "Barbell",
+     "instructions": ["Hold the bar at hip height with soft knees", "Push your hips back and lower the bar along your legs", "Stop at a hamstring stretch and drive your hips forward"]},
+    {"name": "Lying Leg Curl", "primary_muscle": "Hamstrings", "secondary_muscles": ["Calves"], "equipment": "Leg curl machine",
+     "instructions": ["Lie face down with the pad above your heels", "Curl your heels toward your glutes", "Lower under control"]},
+    {"name": "Nordic Hamstring Curl", "primary_muscle": "Hamstrings", "secondary_muscles": ["Glutes"], "equipment": "Bodyweight, anchor for feet",
+     "instructions": ["Kneel with your ankles anchored", "Lower your torso forward as slowly as possible", "Catch yourself with your hands and pull back up"]},
+    {"name": "Standing Calf Raise", "primary_muscle": "Calves", "secondary_muscles": [], "equipment": "Calf raise machine or dumbbells",
+     "instructions": ["Stand with the balls of your feet on a step", "Rise as high as possible onto your toes", "Lower your heels below the step for a stretch"]},
+    {"name": "Seated Calf Raise", "primary_muscle": "Calves", "secondary_muscles": [], "equipment": "Seated calf raise machine",
+     "instructions": ["Sit with the pad on your lower thighs", "Raise your heels as high as possible", "Lower slowly to a full stretch"]},
+    {"name": "Single-Leg Calf Raise", "primary_muscle": "Calves", "secondary_muscles": [], "equipment": "Bodyweight, step",
+     "instructions": ["Stand on one foot on the edge of a step", "Rise onto your toes while holding a rail for balance", "Lower slowly and switch legs after the set"]},
+    {"name": "Hip Thrust", "primary_muscle": "Glutes", "secondary_muscles": ["Hamstrings"], "equipment": "Barbell, bench",
+     "instructions": ["Sit with your upper back against a bench and the bar over your hips", "Drive your hips up until your body is straight from knees to shoulders", "Squeeze your glutes at the top and lower"]},
+    {"name": "Bulgarian Split Squat", "primary_muscle": "Glutes", "secondary_muscles": ["Quads", "Hamstrings"], "equipment": "Dumbbells, bench",
+     "instructions": ["Rest your back foot on a bench", "Lower until your front thigh is parallel to the floor", "Push through your front heel to stand"]},
+    {"name": "Glute Bridge", "primary_muscle": "Glutes", "secondary_muscles": ["Hamstrings"], "equipment": "Bodyweight",
+     "instructions": ["Lie on your back with knees bent and feet flat", "Lift your hips by squeezing your glutes", "Hold briefly and lower"]},
+    {"name": "Hip Abduction Machine", "primary_muscle": "Abductors", "secondary_muscles": ["Glutes"], "equipment": "Hip abduction machine",
+     "instructions": ["Sit with the pads against the outside of your knees", "Push your knees apart as far as possible", "Return slowly"]},
+    {"name": "Banded Lateral Walk", "primary_muscle": "Abductors", "secondary_muscles": ["Glutes"], "equipment": "Resistance band",
+     "instructions": ["Place a band around your legs above the knees", "Step sideways in a half squat keeping tension on the band", "Walk the same number of steps back"]},
+    {"name": "Side-Lying Leg Raise", "primary_muscle": "Abductors", "secondary_muscles": [], "equipment": "Bodyweight",
+     "instructions": ["Lie on your side with your legs straight", "Raise your top leg without rolling your hips back", "Lower slowly and switch sides"]},
+    {"name": "Hip Adduction Machine", "primary_muscle": "Adductors", "secondary_muscles": [], "equipment": "Hip adduction machine",
+     "instructions": ["Sit with the pads against the inside of your knees", "Squeeze your legs together", "Let them open slowly"]},
+    {"name": "Copenhagen Plank", "primary_muscle": "Adductors", "secondary_muscles": ["Obliques"], "equipment": "Bench",
+     "instructions": ["Lie on your side with your top foot on a bench", "Lift your hips so your body forms a straight line", "Hold, then switch sides"]},
+    {"name": "Sumo Squat", "primary_muscle": "Adductors", "secondary_muscles": ["Quads", "Glutes"], "equipment": "Dumbbell or kettlebell",
+     "instructions": ["Stand with a wide stance and toes turned out", "Hold the weight between your legs and squat down", "Drive up while pushing your knees out"]},
+
+    # Chest
+    {"name": "Incline Barbell Bench Press", "primary_muscle": "Upper Chest", "secondary_muscles": ["Front Delts", "Triceps"], "equipment": "Barbell, incline bench",
+     "instructions": ["Lie on a 30-45 degree incline bench", "Lower the bar to your upper chest", "Press up until your arms are straight"]},
+    {"name": "Incline Dumbbell Press", "primary_muscle": "Upper Chest", "secondary_muscles": ["Front Delts", "Triceps"], "equipment": "Dumbbells, incline bench",
+     "instructions": ["Start with the dumbbells at shoulder level on an incline bench", "Press them up and slightly together", "Lower until you feel a chest stretch"]},
+    {"name": "Low-to-High Cable Fly", "primary_muscle": "Upper Chest", "secondary_muscles": ["Front Delts"], "equipment": "Cable machine",
+     "instructions": ["Set the pulleys low and hold a handle in each hand", "Sweep your arms up and together to shoulder height", "Return slowly to the start"]},
+    {"name": "Flat Barbell Bench Press", "primary_muscle": "Middle Chest", "secondary_muscles": ["Triceps", "Front Delts"], "equipment": "Barbell, flat bench",
+     "instructions": ["Lie on the bench with your eyes under the bar", "Lower the bar to mid-chest", "Press up until your arms are straight"]},
+    {"name": "Push-Up", "primary_muscle": "Middle Chest", "secondary_muscles": ["Triceps", "Front Delts"], "equipment": "Bodyweight",
+     "instructions": ["Start in a plank with hands slightly wider than your shoulders", "Lower your chest to the floor keeping your body straight", "Push back up"]},
+    {"name": "Pec Deck Fly", "primary_muscle": "Middle Chest", "secondary_muscles": [], "equipment": "Pec deck machine",
+     "instructions": ["Sit with your arms on the pads at chest height", "Bring the pads together in front of you", "Open slowly until you feel a stretch"]},
+    {"name": "Chest Dip", "primary_muscle": "Lower Chest", "secondary_muscles": ["Triceps", "Front Delts"], "equipment": "Dip bars",
+     "instructions": ["Support yourself on the bars and lean your torso forward", "Lower until your upper arms are parallel to the floor", "Press back up"]},
+    {"name": "Decline Bench Press", "primary_muscle": "Lower Chest", "secondary_muscles": ["Triceps"], "equipment": "Barbell, decline bench",
+     "instructions": ["Lie on a decline bench with your feet secured", "Lower the bar to your lower chest", "Press up until your arms are straight"]},
+    {"name": "High-to-Low Cable Fly", "primary_muscle": "Lower Chest", "secondary_muscles": [], "equipment": "Cable machine",
+     "instructions": ["Set the pulleys high and hold a handle in each hand", "Pull your hands down and together in front of your hips", "Return slowly to the start"]},
+
+    # Back
+    {"name": "Pull-Up", "primary_muscle": "Lats", "secondary_muscles": ["Biceps", "Rhomboids"], "equipment": "Pull-up bar",
+     "instructions": ["Hang from the bar with an overhand grip", "Pull your chest toward the bar", "Lower to a full hang"]},
+    {"name": "Lat Pulldown", "primary_muscle": "Lats", "secondary_muscles": ["Biceps"], "equipment": "Cable machine",
+     "instructions": ["Grip the bar wider than your shoulders", "Pull it down to your upper chest while leaning back slightly", "Let it rise until your arms are straight"]},
+    {"name": "Single-Arm Dumbbell Row", "primary_muscle": "Lats", "secondary_muscles": ["Rhomboids", "Rear Delts"], "equipment": "Dumbbell, bench",
+     "instructions": ["Brace one hand and knee on a bench", "Row the dumbbell toward your hip", "Lower until your arm is straight"]},
+    {"name": "Barbell Shrug", "primary_muscle": "Traps", "secondary_muscles": ["Forearms"], "equipment": "Barbell",
+     "instructions": ["Hold the bar at arm's length in front of your thighs", "Raise your shoulders straight up toward your ears", "Pause and lower"]},
+    {"name": "Dumbbell Shrug", "primary_muscle": "Traps", "secondary_muscles": ["Forearms"], "equipment": "Dumbbells",
+     "instructions": ["Hold the dumbbells at your sides", "Shrug your shoulders up without rolling them", "Lower slowly"]},
+    {"name": "Face Pull", "primary_muscle": "Traps", "secondary_muscles": ["Rear Delts", "Rhomboids"], "equipment": "Cable machine, rope",
+     "instructions": ["Set a rope at face height", "Pull it toward your face with elbows high", "Return slowly"]},
+    {"name": "Back Extension", "primary_muscle": "Lower Back", "secondary_muscles": ["Glutes", "Hamstrings"], "equipment": "Back extension bench",
+     "instructions": ["Set the pad at your hips and cross your arms", "Lower your torso toward the floor", "Raise it until your body is straight"]},
+    {"name": "Conventional Deadlift", "primary_muscle": "Lower Back", "secondary_muscles": ["Glutes", "Hamstrings", "Traps"], "equipment": "Barbell",
+     "instructions": ["Stand with the bar over mid-foot and grip it outside your knees", "Brace and stand up pushing the floor away", "Lower the bar along your legs"]},
+    {"name": "Good Morning", "primary_muscle": "Lower Back", "secondary_muscles": ["Hamstrings"], "equipment": "Barbell",
+     "instructions": ["Rest the bar on your upper back with soft knees", "Hinge at the hips until your torso is nearly parallel", "Return to standing"]},
+    {"name": "Seated Cable Row", "primary_muscle": "Rhomboids", "secondary_muscles": ["Lats", "Biceps"], "equipment": "Cable machine",
+     "instructions": ["Sit tall with a close grip handle", "Row it to your stomach squeezing your shoulder blades", "Let your arms extend slowly"]},
+    {"name": "Chest-Supported Row", "primary_muscle": "Rhomboids", "secondary_muscles": ["Rear Delts", "Lats"], "equipment": "Dumbbells, incline bench",
+     "instructions": ["Lie face down on an incline bench", "Row the dumbbells up squeezing your shoulder blades together", "Lower until your arms are straight"]},
+    {"name": "Scapular Retraction Row", "primary_muscle": "Rhomboids", "secondary_muscles": ["Traps"], "equipment": "Cable machine",
+     "instructions": ["Hold the handle with straight arms", "Pull your shoulder blades back without bending your elbows", "Release slowly"]},
+
+    # Abs
+    {"name": "Crunch", "primary_muscle": "Upper Abs", "secondary_muscles": [], "equipment": "Bodyweight",
+     "instructions": ["Lie on your back with knees bent", "Curl your shoulders off the floor", "Lower slowly"]},
+    {"name": "Cable Crunch", "primary_muscle": "Upper Abs", "secondary_muscles": ["Obliques"], "equipment": "Cable machine, rope",
+     "instructions": ["Kneel facing the cable holding the rope by your head", "Crunch down by rounding your spine", "Return under control"]},
+    {"name": "Decline Sit-Up", "primary_muscle": "Upper Abs", "secondary_muscles": ["Lower Abs"], "equipment": "Decline bench",
+     "instructions": ["Secure your feet on a decline bench", "Sit up until your torso is upright", "Lower slowly"]},
+    {"name": "Hanging Leg Raise", "primary_muscle": "Lower Abs", "secondary_muscles": ["Obliques"], "equipment": "Pull-up bar",
+     "instructions": ["Hang from the bar with straight legs", "Raise your legs to hip height or higher without swinging", "Lower under control"]},
+    {"name": "Reverse Crunch", "primary_muscle": "Lower Abs", "secondary_muscles": [], "equipment": "Bodyweight",
+     "instructions": ["Lie on your back with knees bent at 90 degrees", "Curl your hips off the floor toward your chest", "Lower slowly"]},
+    {"name": "Dead Bug", "primary_muscle": "Lower Abs", "secondary_muscles": ["Upper Abs"], "equipment": "Bodyweight",
+     "instructions": ["Lie on your back with arms and knees raised", "Lower the opposite arm and leg while keeping your back flat", "Return and switch sides"]},
+    {"name": "Russian Twist", "primary_muscle": "Obliques", "secondary_muscles": ["Upper Abs"], "equipment": "Bodyweight or medicine ball",
+     "instructions": ["Sit leaning back with your feet off the floor", "Rotate your torso from side to side", "Keep your chest up throughout"]},
+    {"name": "Side Plank", "primary_muscle": "Obliques", "secondary_muscles": ["Abductors"], "equipment": "Bodyweight",
+     "instructions": ["Lie on your side propped on one forearm", "Lift your hips so your body is straight", "Hold, then switch sides"]},
+    {"name": "Cable Woodchop", "primary_muscle": "Obliques", "secondary_muscles": ["Front Delts"], "equipment": "Cable machine",
+     "instructions": ["Set the pulley high and hold the handle with both hands", "Pull it diagonally across your body to the opposite hip", "Return slowly"]},
+
+    # Shoulders
+    {"name": "Overhead Press", "primary_muscle": "Front Delts", "secondary_muscles": ["Triceps", "Side Delts"], "equipment": "Barbell",
+     "instructions": ["Hold the bar at shoulder height", "Press it overhead until your arms are straight", "Lower back to your shoulders"]},
+    {"name": "Front Raise", "primary_muscle": "Front Delts", "secondary_muscles": [], "equipment": "Dumbbells",
+     "instructions": ["Hold the dumbbells in front of your thighs", "Raise them forward to shoulder height", "Lower slowly"]},
+    {"name": "Arnold Press", "primary_muscle": "Front Delts", "secondary_muscles": ["Side Delts", "Triceps"], "equipment": "Dumbbells",
+     "instructions": ["Start with the dumbbells at chin height, palms facing you", "Rotate your palms outward as you press overhead", "Reverse the motion on the way down"]},
+    {"name": "Lateral Raise", "primary_muscle": "Side Delts", "secondary_muscles": ["Traps"], "equipment": "Dumbbells",
+     "instructions": ["Hold the dumbbells at your sides with a slight elbow bend", "Raise them out to shoulder height", "Lower slowly"]},
+    {"name": "Cable Lateral Raise", "primary_muscle": "Side Delts", "secondary_muscles": [], "equipment": "Cable machine",
+     "instructions": ["Stand side-on to a low pulley holding the handle", "Raise your arm out to shoulder height", "Return under control"]},
+    {"name": "Upright Row", "primary_muscle": "Side Delts", "secondary_muscles": ["Traps"], "equipment": "Barbell or EZ bar",
+     "instructions": ["Hold the bar with a shoulder-width grip", "Pull it up along your body to chest height leading with your elbows", "Lower slowly"]},
+    {"name": "Reverse Pec Deck", "primary_muscle": "Rear Delts", "secondary_muscles": ["Rhomboids"], "equipment": "Pec deck machine",
+     "instructions": ["Sit facing the machine holding the handles", "Open your arms back until they are in line with your body", "Return slowly"]},
+    {"name": "Bent-Over Reverse Fly", "primary_muscle": "Rear Delts", "secondary_muscles": ["Rhomboids", "Traps"], "equipment": "Dumbbells",
+     "instructions": ["Hinge forward with a flat back", "Raise the dumbbells out to the sides", "Lower under control"]},
+    {"name": "Rear Delt Cable Fly", "primary_muscle": "Rear Delts", "secondary_muscles": [], "equipment": "Cable machine",
+     "instructions": ["Cross the cables at shoulder height holding the opposite handles", "Pull your arms out and back", "Return slowly"]},
+]
+
+
+def _build_muscle_index(exercises):
+    """Inverted index of primary muscle -> exercises, in catalog order"""
+    index = {}
+    for exercise in exercises:
+        index.setdefault(exercise["primary_muscle"], []).append(exercise)
+    return index
+
+
+EXERCISES_BY_MUSCLE = _build_muscle_index(EXERCISES)
+
+
+def find_catalog_exercises(muscles):
+    """
+    Catalog exercises whose primary muscle is one of muscles, grouped in the order given.
+    Returns (exercises, missing) where missing lists the muscles with no catalog entry.
+    """
+    exercises = []
+    missing = []
+
+    for muscle in muscles:
+        matches = EXERCISES_BY_MUSCLE.get(muscle)
+        if matches:
+            exercises.extend(dict(exercise) for exercise in matches)
+        else:
+            missing.append(muscle)
+
+    return exercises, missing
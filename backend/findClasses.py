@@ -1,53 +1,59 @@
-from datetime import datetime
-from openai import OpenAI
+from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+from zoneinfo import ZoneInfo
+import csv
+import json
+import os
+import re
+import threading
+import time
+from cache import SingleFlight, MemoryCacheBackend, MongoCacheBackend
+from llm import openai_client
 
-client = OpenAI()
+client = openai_client
+
+# Concurrent off-campus searches for the same categories share one OpenAI call
+off_campus_requests = SingleFlight()
+
+# Off-campus results are cached per category for CLASS_CACHE_TTL seconds (default a week).
+# CLASS_CACHE_BACKEND is "memory" (per process, the default), "mongo" (the class_cache
+# collection, shared and kept across restarts) or "none".
+CLASS_CACHE_BACKEND = os.getenv("CLASS_CACHE_BACKEND", "memory")
+CLASS_CACHE_TTL = int(os.getenv("CLASS_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+
+def _make_class_cache_backend():
+    """Build the off-campus class cache for CLASS_CACHE_BACKEND, or None when caching is off"""
+    if CLASS_CACHE_BACKEND == "mongo":
+        from db import db
+        return MongoCacheBackend(db.class_cache)
+    if CLASS_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend()
+    return None
+
+
+class_cache_backend = _make_class_cache_backend()
 
 # Coordinates for searching off-campus classes
 BU_LAT = 42.3505
 BU_LON = -71.1054
 
-# Fall 2025 FitRec schedule (on-campus drop-in classes)
-# Needs to be updated each semester
-FITREC_SCHEDULE = {
-    "Monday": [
-        ("5:30–6:30p", "Vinyasa Yoga"),
-        ("5:45–6:30p", "Sunset Spin"),
-        ("6:00–7:00p", "Barre Pilates Fusion"),
-        ("6:30–7:30p", "Core Intensive Yoga")
-    ],
-    "Tuesday": [
-        ("9:30–10:30a", "Tai Chi"),
-        ("5:30–6:30p", "Zumba"),
-        ("6:00–7:00p", "Vinyasa Yoga"),
-        ("6:45–7:30p", "Pilates Mat")
-    ],
-    "Wednesday": [
-        ("5:30–6:30p", "Hatha Yoga"),
-        ("5:45–6:30p", "TRX Circuit"),
-        ("6:00–7:00p", "Barre Pilates Fusion"),
-        ("6:30–7:30p", "Deep Stretch Yoga")
-    ],
-    "Thursday": [
-        ("9:30–10:30a", "Tai Chi"),
-        ("12:00–1pm", "Zen Meditation"),
-        ("5:30–6:30p", "Yoga Pilates Fusion"),
-        ("5:45–6:30p", "Zumba"),
-        ("6:00–6:45p", "Total Body Conditioning")
-    ],
-    "Friday": [
-        ("4:00–4:45p", "Sunset Spin"),
-        ("5:00–5:45p", "Strength 45")
-    ],
-    "Saturday": [
-        ("10:30–11:30a", "Yoga Basics"),
-        ("11:00–11:45a", "Zumba")
-    ],
-    "Sunday": [
-        ("10:30–11:15a", "Spin the Decades"),
-        ("11:00–11:45a", "Total Body Dumbell")
-    ]
-}
+# FitRec schedule (on-campus drop-in classes) is read from FITREC_SCHEDULE_FILE, a JSON
+# file ({"semester": ..., "schedule": {day: [{"time", "name"}, ...]}}) or a CSV file with
+# day,time,name columns. Edit the file each semester; changes are picked up without a
+# restart (the file's mtime is checked at most every FITREC_RELOAD_INTERVAL seconds).
+FITREC_SCHEDULE_FILE = os.getenv(
+    "FITREC_SCHEDULE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fitrec_schedule.json")
+)
+FITREC_RELOAD_INTERVAL = float(os.getenv("FITREC_RELOAD_INTERVAL", "5"))
+
+# Schedule times are local to FitRec, whatever timezone the server runs in
+FITREC_TIMEZONE = ZoneInfo(os.getenv("FITREC_TIMEZONE", "America/New_York"))
+
+# Longest "starting soon" window, in minutes; longer ones are shortened to this
+MAX_STARTING_WITHIN = 24 * 60
 
 CATEGORIES = [
     "boxing", "cardio", "cycling", "dance", "martial arts",
@@ -72,30 +78,224 @@ def infer_category(class_name):
     return "cardio"
 
 
+# Schedule times look like "5:30–6:30p", "12:00–1pm" or "10:30–11:15a"; the start
+# takes the end's am/pm unless that would put it after the end
+TIME_RANGE = re.compile(
+    r"^\s*(\d{1,2})(?::(\d{2}))?\s*([ap])?m?\s*[–-]\s*(\d{1,2})(?::(\d{2}))?\s*([ap])m?\s*$",
+    re.IGNORECASE
+)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def _to_minutes(hour, minute, meridiem):
+    """Minutes since midnight for a 12-hour clock time"""
+    hour = int(hour) % 12 + (12 if meridiem.lower() == "p" else 0)
+    return hour * 60 + int(minute or 0)
+
+
+def parse_time_range(time_str):
+    """Parse a schedule time range into (start, end) minutes since midnight, or None"""
+    match = TIME_RANGE.match(time_str or "")
+    if not match:
+        return None
+
+    start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+    end = _to_minutes(end_hour, end_minute, end_meridiem)
+    start = _to_minutes(start_hour, start_minute, start_meridiem or end_meridiem)
+
+    if start_meridiem is None and start > end:
+        start = _to_minutes(start_hour, start_minute, "a")
+
+    if int(start_hour) > 12 or int(end_hour) > 12 or start > end:
+        return None
+    return start, end
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
 def standardize_time(time_str):
-    try:
-        parts = time_str.replace("–", "-").split("-")
-        start = datetime.strptime(parts[0].strip(), "%I:%M%p").strftime("%H:%M")
-        end = datetime.strptime(parts[1].strip(), "%I:%M%p").strftime("%H:%M")
-        return f"{start}-{end}"
-    except:
+    """Convert a schedule time range to 24-hour "HH:MM-HH:MM" (unparseable strings are returned as is)"""
+    times = parse_time_range(time_str)
+    if times is None:
         return time_str
+    return f"{_format_minutes(times[0])}-{_format_minutes(times[1])}"
 
 
-def format_fitrec_classes():
-    formatted = []
-    for day, class_list in FITREC_SCHEDULE.items():
+def compile_schedule(schedule):
+    """
+    Compile a day -> [(time, name)] schedule into read-only class records, indexed
+    by category and by day (each day sorted by start time). Records keep the
+    schedule's order in "position". "time" is the schedule's own string, for display;
+    "start"/"end" are its parsed 24-hour times (None when unparseable).
+    """
+    classes = []
+
+    for day, class_list in schedule.items():
         for time_str, name in class_list:
-            formatted.append({
+            times = parse_time_range(time_str)
+            classes.append(MappingProxyType({
                 "day": day,
                 "name": name,
                 "category": infer_category(name),
-                "time": standardize_time(time_str),
+                "time": time_str,
+                "start": _format_minutes(times[0]) if times else None,
+                "end": _format_minutes(times[1]) if times else None,
+                "start_minute": times[0] if times else None,
+                "end_minute": times[1] if times else None,
                 "location": "BU FitRec",
                 "lat": BU_LAT,
-                "lon": BU_LON
-            })
-    return formatted
+                "lon": BU_LON,
+                "position": len(classes)
+            }))
+
+    by_category = {}
+    for record in classes:
+        by_category.setdefault(record["category"], []).append(record)
+
+    by_day = {}
+    for day in schedule:
+        timed = sorted(
+            (record for record in classes if record["day"] == day and record["start_minute"] is not None),
+            key=lambda record: record["start_minute"]
+        )
+        by_day[day] = (tuple(timed), tuple(record["start_minute"] for record in timed))
+
+    return MappingProxyType({
+        "classes": tuple(classes),
+        "by_category": MappingProxyType({category: tuple(records) for category, records in by_category.items()}),
+        "by_day": MappingProxyType(by_day)
+    })
+
+
+def load_schedule(path):
+    """
+    Read a schedule file (.json or .csv) into {day: [(time, name), ...]}.
+    Raises ValueError for unknown days or missing fields.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [(row.get("day"), row.get("time"), row.get("name")) for row in csv.DictReader(f)]
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        days = data.get("schedule", data)
+        rows = [
+            (day, entry.get("time"), entry.get("name"))
+            for day, entries in days.items()
+            for entry in entries
+        ]
+
+    schedule = {}
+    for day, time_str, name in rows:
+        day = (day or "").strip().title()
+        if day not in DAYS:
+            raise ValueError(f"Unknown day in FitRec schedule: {day!r}")
+        if not time_str or not name:
+            raise ValueError(f"FitRec class on {day} is missing its time or name")
+        schedule.setdefault(day, []).append((time_str.strip(), name.strip()))
+
+    return schedule
+
+
+# The compiled schedule. Reloads build a new index and swap it in with one assignment,
+# so readers (which take the current index once per call) never see a partial schedule.
+FITREC_SCHEDULE = load_schedule(FITREC_SCHEDULE_FILE)
+_fitrec_index = compile_schedule(FITREC_SCHEDULE)
+_fitrec_mtime = os.stat(FITREC_SCHEDULE_FILE).st_mtime_ns
+_fitrec_checked_at = time.monotonic()
+_fitrec_reload_lock = threading.Lock()
+
+
+def reload_fitrec_schedule(force=False):
+    """Reload the schedule file if its mtime changed (or force). Returns True if reloaded."""
+    global FITREC_SCHEDULE, _fitrec_index, _fitrec_mtime
+
+    with _fitrec_reload_lock:
+        mtime = os.stat(FITREC_SCHEDULE_FILE).st_mtime_ns
+        if not force and mtime == _fitrec_mtime:
+            return False
+
+        schedule = load_schedule(FITREC_SCHEDULE_FILE)
+        index = compile_schedule(schedule)
+
+        FITREC_SCHEDULE = schedule
+        _fitrec_index = index
+        _fitrec_mtime = mtime
+
+    return True
+
+
+def get_fitrec_index():
+    """
+    The current compiled schedule, reloaded first if the file changed.
+    A file that fails to load is logged and the previous schedule kept.
+    """
+    global _fitrec_checked_at
+
+    now = time.monotonic()
+    if now - _fitrec_checked_at >= FITREC_RELOAD_INTERVAL:
+        _fitrec_checked_at = now
+        try:
+            if reload_fitrec_schedule():
+                print(f"Reloaded FitRec schedule from {FITREC_SCHEDULE_FILE}")
+        except Exception as e:
+            print(f"Error reloading FitRec schedule, keeping the current one: {e}")
+
+    return _fitrec_index
+
+
+def _class_response(record):
+    """A JSON-ready copy of a class record"""
+    return {key: value for key, value in record.items() if key != "position"}
+
+
+def format_fitrec_classes():
+    """All FitRec classes in schedule order"""
+    return [_class_response(record) for record in get_fitrec_index()["classes"]]
+
+
+def get_fitrec_classes(categories):
+    """FitRec classes in any of the categories, in schedule order"""
+    by_category = get_fitrec_index()["by_category"]
+    groups = [by_category.get(category, ()) for category in set(categories)]
+
+    if len(groups) == 1:
+        records = groups[0]
+    else:
+        records = sorted((record for group in groups for record in group), key=lambda record: record["position"])
+
+    return [_class_response(record) for record in records]
+
+
+def get_classes_starting_soon(minutes, categories=None, now=None):
+    """
+    FitRec classes starting within the next `minutes` minutes (at most MAX_STARTING_WITHIN)
+    of now in FITREC_TIMEZONE, soonest first, optionally limited to categories.
+    Windows may run past midnight.
+    """
+    now = now or datetime.now(FITREC_TIMEZONE)
+    index = get_fitrec_index()
+    window_start = now.hour * 60 + now.minute
+    window_end = window_start + min(minutes, MAX_STARTING_WITHIN)
+    results = []
+
+    # Check today, then the following day if the window reaches into it
+    day_offset = 0
+    while window_end > day_offset * 24 * 60:
+        day = DAYS[(now.weekday() + day_offset) % 7]
+        records, starts = index["by_day"].get(day, ((), ()))
+        low = bisect_left(starts, window_start - day_offset * 24 * 60)
+        high = bisect_right(starts, window_end - day_offset * 24 * 60)
+        results.extend(records[low:high])
+        day_offset += 1
+
+    if categories is not None:
+        results = [record for record in results if record["category"] in categories]
+
+    return [_class_response(record) for record in results]
 
 
 # OpenAI prompt for off campus classes
@@ -142,11 +342,114 @@ def search_off_campus_exercise(categories):
         return []
 
 
+# Per-category cache of off-campus results
+def get_cached_classes(categories):
+    """
+    {category: cached off-campus classes} for the categories with an entry newer than
+    CLASS_CACHE_TTL, read with one cache lookup
+    """
+    if class_cache_backend is None:
+        return {}
+
+    try:
+        entries = class_cache_backend.get_many(categories)
+    except Exception as e:
+        print(f"Error reading class cache: {e}")
+        return {}
+
+    cutoff = datetime.utcnow() - timedelta(seconds=CLASS_CACHE_TTL)
+    return {category: classes for category, (classes, stored_at) in entries.items() if stored_at > cutoff}
+
+
+def category_label(value):
+    """Category name for matching, ignoring case and separators ("Strength-Conditioning" -> "strength conditioning")"""
+    return " ".join(re.split(r"[\s_-]+", str(value).lower())).strip()
+
+
+def cache_classes(classes, categories):
+    """
+    Cache classes under each of the given categories, going by each class's category.
+    Results of a single-category search are all cached under that category. Categories
+    that no class was matched to are not cached, so the next search requests them alone.
+    """
+    if class_cache_backend is None:
+        return
+
+    if len(categories) == 1:
+        by_category = {categories[0]: list(classes)}
+    else:
+        labels = {category_label(category): category for category in categories}
+        by_category = {}
+        for item in classes:
+            category = labels.get(category_label(item.get("category", "")))
+            if category is not None:
+                by_category.setdefault(category, []).append(item)
+
+    now = datetime.utcnow()
+    for category, category_classes in by_category.items():
+        try:
+            class_cache_backend.set(category, category_classes, now)
+        except Exception as e:
+            print(f"Error writing class cache: {e}")
+
+
+def search_off_campus_classes(categories):
+    """
+    Off-campus classes for categories, assembled from the per-category cache.
+    Categories without a fresh entry are requested from OpenAI together in one call
+    (shared with concurrent identical requests) and cached per category.
+    """
+    categories = sorted(set(categories))
+    cached = get_cached_classes(categories)
+    results = []
+    missing = []
+
+    for category in categories:
+        if category in cached:
+            results.extend(cached[category])
+        else:
+            missing.append(category)
+
+    if missing:
+        def search():
+            classes = search_off_campus_exercise(missing)
+            # An empty list means the search failed, so there is nothing to cache
+            if classes:
+                cache_classes(classes, missing)
+            return classes
+
+        results.extend(off_campus_requests.do("|".join(missing), search))
+
+    return results
+
+
+def warm_class_cache(categories=None, force=False):
+    """
+    Fill the off-campus cache one category at a time (all CATEGORIES by default).
+    Fresh entries are skipped unless force is set. Returns the categories fetched.
+    """
+    categories = categories or CATEGORIES
+    cached = {} if force else get_cached_classes(categories)
+    fetched = []
+
+    for category in categories:
+        if category in cached:
+            continue
+
+        classes = search_off_campus_exercise([category])
+        if classes:
+            cache_classes(classes, [category])
+            fetched.append(category)
+
+    return fetched
+
+
 # Main function
-def find_classes(campus, categories=None):
+def find_classes(campus, categories=None, starting_within=None):
     """
     campus: "on" or "off"
     categories: list of selected class types
+    starting_within: (on campus only) only classes starting in the next N minutes
     """
 
     if categories is None or len(categories) == 0:
@@ -156,16 +459,21 @@ def find_classes(campus, categories=None):
 
     # On campus
     if campus == "on":
-        classes = format_fitrec_classes()
+        if starting_within is None:
+            return get_fitrec_classes(categories)
 
-        if categories:
-            classes = [c for c in classes if c["category"] in categories]
+        try:
+            starting_within = int(starting_within)
+        except (TypeError, ValueError):
+            starting_within = 0
+        if starting_within <= 0:
+            raise ValueError("starting_within must be a positive number of minutes.")
 
-        return classes
+        return get_classes_starting_soon(starting_within, categories)
 
     # Off campus
     elif campus == "off":
-        return search_off_campus_exercise(categories)
+        return search_off_campus_classes(categories)
 
     else:
         raise ValueError("You must select 'On Campus' or 'Off Campus'")
@@ -1,7 +1,21 @@
 import json
-from openai import OpenAI
+import os
+from cache import ResponseCache, MemoryCacheBackend, MongoCacheBackend, SingleFlight
+from llm import openai_client
+from exerciseCatalog import find_catalog_exercises
 
-client = OpenAI()
+client = openai_client
+
+# Where exercises come from: "openai" asks OpenAI for every selection, "catalog" serves
+# the local exercise catalog and only asks OpenAI for muscles the catalog doesn't cover.
+EXERCISE_SOURCE = os.getenv("EXERCISE_SOURCE", "openai")
+
+# Generated exercises are cached per (body parts, muscles) selection.
+# EXERCISE_CACHE_BACKEND is "memory" (per process), "mongo" (shared by all workers) or "none".
+EXERCISE_CACHE_BACKEND = os.getenv("EXERCISE_CACHE_BACKEND", "memory")
+EXERCISE_CACHE_SIZE = int(os.getenv("EXERCISE_CACHE_SIZE", "512"))
+EXERCISE_CACHE_TTL = int(os.getenv("EXERCISE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+EXERCISE_CACHE_STALE_TTL = int(os.getenv("EXERCISE_CACHE_STALE_TTL", str(24 * 60 * 60)))
 
 # Body parts and associated muscles
 BODY_PARTS = {
@@ -13,6 +27,26 @@ BODY_PARTS = {
     "Shoulders": ["Front Delts", "Side Delts", "Rear Delts"]
 }
 
+
+def _make_exercise_cache():
+    """Build the exercise cache for EXERCISE_CACHE_BACKEND, or None when caching is off"""
+    if EXERCISE_CACHE_BACKEND == "mongo":
+        from db import db
+        backend = MongoCacheBackend(db.exercise_cache)
+    elif EXERCISE_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(EXERCISE_CACHE_SIZE)
+    else:
+        return None
+
+    return ResponseCache(backend, EXERCISE_CACHE_TTL, EXERCISE_CACHE_STALE_TTL)
+
+
+exercise_cache = _make_exercise_cache()
+
+# Concurrent requests for the same selection share one OpenAI call
+exercise_requests = SingleFlight()
+
+
 # Exceptions
 class NoBodyPartsSelected(Exception):
     pass
@@ -34,14 +68,25 @@ def list_muscles_for_body_parts(selected_parts):
     return sorted(muscles)
 
 
-# Generates exercises using OpenAI
+def exercise_cache_key(body_parts, muscles):
+    """Cache key for a selection: sorted, de-duplicated body parts and muscles"""
+    return "|".join(sorted(set(body_parts))) + "/" + "|".join(sorted(set(muscles)))
+
+
+# Generates exercises using OpenAI or the local catalog
 def generate_exercises(body_parts, muscles):
     """
     Enforces:
         - At least one body part
         - At least one muscle
         - All muscles must belong to selected body parts
+    Exercises come from OpenAI or the local catalog (see EXERCISE_SOURCE),
+    and OpenAI results are cached per selection (see EXERCISE_CACHE_BACKEND).
     """
+    # Normalize: surrounding whitespace, duplicates and order don't change the result
+    body_parts = sorted({part.strip() for part in body_parts or []})
+    muscles = sorted({muscle.strip() for muscle in muscles or []})
+
     # Validation
     if not body_parts:
         raise NoBodyPartsSelected("At least one body part must be selected.")
@@ -61,6 +106,33 @@ def generate_exercises(body_parts, muscles):
             f"Allowed muscles are: {allowed_muscles}"
         )
 
+    if EXERCISE_SOURCE == "catalog":
+        exercises, missing = find_catalog_exercises(muscles)
+        if not missing:
+            return exercises
+
+        # Only ask OpenAI about the muscles the catalog has no exercises for
+        missing_parts = [part for part in body_parts if set(BODY_PARTS.get(part, [])) & set(missing)]
+        return exercises + _cached_request_exercises(missing_parts, missing)
+
+    return _cached_request_exercises(body_parts, muscles)
+
+
+def _cached_request_exercises(body_parts, muscles):
+    """_request_exercises through the exercise cache (when there is one) and single-flight"""
+    key = exercise_cache_key(body_parts, muscles)
+
+    def request():
+        return exercise_requests.do(key, lambda: _request_exercises(body_parts, muscles))
+
+    if exercise_cache is None:
+        return request()
+
+    return exercise_cache.get_or_compute(key, request)
+
+
+def _request_exercises(body_parts, muscles):
+    """Ask OpenAI for exercises targeting the given body parts and muscles"""
     # OpenAI prompt
     prompt = f"""
     Generate a JSON object with an "exercises" key containing a list of 
@@ -0,0 +1,113 @@
+# Import Workouts Module
+# Bulk import of workouts from other trackers as NDJSON (one JSON object per line)
+# or CSV (a header row with the log workout field names). Input is read one record
+# at a time and saved in batches, so memory use doesn't grow with the file size.
+
+import csv
+import json
+import os
+from logWorkout import parse_workout_data, build_workout
+from data_manager import add_workouts
+
+# Workouts saved per insert_many
+WORKOUT_IMPORT_BATCH_SIZE = int(os.getenv("WORKOUT_IMPORT_BATCH_SIZE", "1000"))
+
+# Rows with errors beyond this many are counted but not listed
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_FORMATS = ["ndjson", "csv"]
+
+
+def read_ndjson(lines):
+    """Yield (line number, record or None, error) for each non-blank NDJSON line"""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Each line must be a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def read_csv(lines):
+    """Yield (line number, record or None, error) for each CSV row after the header"""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        if None in record:
+            yield reader.line_num, None, "Row has more fields than the header"
+            continue
+        yield reader.line_num, record, None
+
+
+def read_records(lines, file_format):
+    """Read NDJSON or CSV lines as (line number, record or None, error)"""
+    if file_format == "ndjson":
+        return read_ndjson(lines)
+    if file_format == "csv":
+        return read_csv(lines)
+    raise ValueError(f"Format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+
+def normalize_record(record):
+    """Workout fields as the strings the log workout form sends (e.g. 30 -> "30")"""
+    return {
+        key: "" if value is None else str(value)
+        for key, value in record.items()
+    }
+
+
+def import_workouts(records, creator_email, batch_size=None):
+    """
+    Validate and save workouts from (line number, record or None, error) tuples,
+    as produced by read_records. Valid workouts are saved batch_size at a time.
+    Returns a summary with the number imported and failed, and the errors of the
+    first MAX_REPORTED_ERRORS failed rows. If the input stops decoding as UTF-8, the
+    rows read so far are still saved and stopped_at_line is the first line not read.
+    """
+    batch_size = batch_size or WORKOUT_IMPORT_BATCH_SIZE
+    summary = {"imported": 0, "failed": 0, "errors": []}
+
+    def report(line_number, errors):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_number, "errors": errors})
+
+    def save(batch):
+        failed = add_workouts([workout for _, workout in batch])
+        for index, (line_number, _) in enumerate(batch):
+            if index in failed:
+                report(line_number, [failed[index]])
+            else:
+                summary["imported"] += 1
+
+    batch = []
+    last_line = 0
+    try:
+        for line_number, record, error in records:
+            last_line = line_number
+            if error:
+                report(line_number, [error])
+                continue
+
+            values, errors = parse_workout_data(normalize_record(record))
+            if errors:
+                report(line_number, errors)
+                continue
+
+            batch.append((line_number, build_workout(values, creator_email)))
+            if len(batch) >= batch_size:
+                save(batch)
+                batch = []
+    except UnicodeDecodeError:
+        summary["stopped_at_line"] = last_line + 1
+
+    if batch:
+        save(batch)
+
+    summary["errors_truncated"] = summary["failed"] > len(summary["errors"])
+    return summary
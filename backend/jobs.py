@@ -0,0 +1,117 @@
+# backend/jobs.py
+# Background jobs for slow requests (OpenAI calls). Each kind of job runs on its
+# own bounded thread pool, so slow completions can't tie up the web server's
+# request threads, and clients poll for the result by job id.
+
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for
+from datetime import datetime, timedelta
+import threading
+import uuid
+
+
+class JobQueueFull(Exception):
+    """Raised when a kind of job already has its maximum number of unfinished jobs"""
+    pass
+
+
+class JobRunner:
+    """
+    Runs jobs in per-kind thread pools and keeps their results for result_ttl seconds.
+    limits maps each job kind to its number of worker threads; at most max_pending
+    jobs of a kind may be queued or running at once.
+    Jobs live in this process, so polls must reach the process that took the job.
+    """
+
+    def __init__(self, limits, max_pending=50, result_ttl=600):
+        self.limits = dict(limits)
+        self.max_pending = max_pending
+        self.result_ttl = timedelta(seconds=result_ttl)
+        self._executors = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, kind):
+        if kind not in self._executors:
+            self._executors[kind] = ThreadPoolExecutor(
+                max_workers=self.limits[kind], thread_name_prefix=f"job-{kind}"
+            )
+        return self._executors[kind]
+
+    def _purge(self):
+        """Forget finished jobs older than result_ttl (caller holds the lock)"""
+        cutoff = datetime.utcnow() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _run(self, job, fn, args):
+        job["status"] = "running"
+        try:
+            job["result"] = fn(*args)
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = datetime.utcnow()
+
+    def submit(self, kind, owner, fn, *args):
+        """Queue fn(*args) as a job of the given kind for owner. Returns the job id."""
+        if kind not in self.limits:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        with self._lock:
+            self._purge()
+            pending = sum(
+                1 for job in self._jobs.values()
+                if job["kind"] == kind and job["finished_at"] is None
+            )
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Too many {kind} jobs in progress, please try again shortly")
+
+            job = {
+                "id": str(uuid.uuid4()),
+                "kind": kind,
+                "owner": owner,
+                "status": "pending",
+                "created_at": datetime.utcnow(),
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job["id"]] = job
+            job["future"] = self._executor(kind).submit(self._run, job, fn, args)
+
+        return job["id"]
+
+    def get(self, job_id, owner, wait=0):
+        """
+        Return a job (without its future) if it exists and belongs to owner, else None.
+        wait > 0 long-polls: up to wait seconds are spent waiting for the job to finish.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is None or job["owner"] != owner:
+            return None
+
+        if wait > 0 and job["finished_at"] is None:
+            wait_for([job["future"]], timeout=wait)
+
+        return {key: value for key, value in job.items() if key != "future"}
+
+    def get_stats(self):
+        """Return the number of unfinished jobs per kind"""
+        with self._lock:
+            stats = {kind: 0 for kind in self.limits}
+            for job in self._jobs.values():
+                if job["finished_at"] is None:
+                    stats[job["kind"]] += 1
+            return stats
+
+    def shutdown(self, wait=True):
+        for executor in list(self._executors.values()):
+            executor.shutdown(wait=wait)
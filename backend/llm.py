@@ -0,0 +1,49 @@
+# backend/llm.py
+# One OpenAI client per process, created on first use. Importing the openai package
+# and building a client are slow and need OPENAI_API_KEY, so modules hold the lazy
+# `openai_client` proxy instead, and the app can start (e.g. for tests or maintenance
+# commands) without either. Every module shares the client's HTTP connection pool.
+
+import os
+import threading
+
+# Seconds to wait for a completion, and how many times the client retries failures
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the shared OpenAI client, creating it on the first call"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+    return _client
+
+
+def close_openai_client():
+    """Close the shared client's connections; the next use creates a new client"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class LazyOpenAIClient:
+    """Stands in for the OpenAI client and creates the shared one when first used"""
+
+    def __getattr__(self, name):
+        # Private and special attributes (e.g. _is_coroutine, __deepcopy__) are probed
+        # by tools like mock.patch and copy; answering them must not create the client
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(get_openai_client(), name)
+
+
+openai_client = LazyOpenAIClient()
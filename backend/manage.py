@@ -0,0 +1,141 @@
+# backend/manage.py
+# Maintenance commands. Run from the backend folder:
+#   python manage.py <command>
+
+from dotenv import load_dotenv
+load_dotenv()
+import argparse
+
+from auth import sweep_expired_sessions, migrate_session_times
+from findClasses import warm_class_cache, CATEGORIES
+from importWorkouts import import_workouts, read_records, IMPORT_FORMATS
+from db import ensure_indexes, reconcile_challenge_participants, backfill_user_search_keys, rebuild_user_stats, migrate_created_at_to_datetime, rebuild_timelines, rebuild_leaderboards
+
+
+def create_indexes(args):
+    """Create (or update) the MongoDB indexes; run once per deploy"""
+    ensure_indexes()
+    print("MongoDB indexes are up to date")
+
+
+def sweep_sessions(args):
+    """Delete expired sessions (for deployments without the TTL index)"""
+    removed = sweep_expired_sessions()
+    print(f"Removed {removed} expired sessions")
+
+
+def migrate_sessions(args):
+    """Convert session times stored in server-local time to UTC"""
+    converted = migrate_session_times()
+    print(f"Converted {converted} sessions to UTC")
+
+
+def backfill_search_keys(args):
+    """Add search_keys to users created before prefix search"""
+    updated = backfill_user_search_keys()
+    print(f"Added search keys to {updated} users")
+
+
+def rebuild_stats(args):
+    """Recompute materialized profile stats"""
+    written = rebuild_user_stats(args.email or None)
+    print(f"Rebuilt stats for {written} users")
+
+
+def migrate_created_at(args):
+    """Convert string created_at values on challenges and workouts to datetimes"""
+    converted, skipped = migrate_created_at_to_datetime()
+    print(f"Converted created_at on {converted} documents, skipped {skipped} invalid ones")
+
+
+def rebuild_friend_timelines(args):
+    """Fill friends timelines from recent posts (run when enabling FEED_TIMELINE)"""
+    rebuilt = rebuild_timelines(args.email or None)
+    print(f"Rebuilt timelines for {rebuilt} users")
+
+
+def warm_classes(args):
+    """Pre-fill the off-campus class cache"""
+    fetched = warm_class_cache(args.category or None, force=args.force)
+    print(f"Fetched off-campus classes for {len(fetched)} categories: {', '.join(fetched) or 'none'}")
+
+
+def reconcile_participants(args):
+    """Recompute challenge participant counts from challenge_participants"""
+    removed, fixed = reconcile_challenge_participants()
+    print(f"Removed {removed} duplicate participants, fixed participant counts on {fixed} challenges")
+
+
+def rebuild_challenge_leaderboards(args):
+    """Recompute leaderboard progress (backfill for existing challenges)"""
+    rebuilt = rebuild_leaderboards(args.challenge or None)
+    print(f"Rebuilt leaderboards for {rebuilt} challenges")
+
+
+def import_workout_file(args):
+    """Import workouts for one user from an NDJSON or CSV file"""
+    file_format = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    with open(args.file, encoding="utf-8", newline="") as f:
+        summary = import_workouts(read_records(f, file_format), args.email, batch_size=args.batch_size)
+    
+    for row in summary["errors"]:
+        print(f"Line {row['line']}: {'; '.join(row['errors'])}")
+    if summary["errors_truncated"]:
+        print(f"... {summary['failed'] - len(summary['errors'])} more rows with errors")
+    print(f"Imported {summary['imported']} workouts, {summary['failed']} rows failed")
+    if "stopped_at_line" in summary:
+        print(f"Stopped at line {summary['stopped_at_line']}: the file is not UTF-8 text from there on")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spotter maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    indexes_parser = subparsers.add_parser("ensure-indexes", help="Create or update the MongoDB indexes")
+    indexes_parser.set_defaults(func=create_indexes)
+    
+    sweep_parser = subparsers.add_parser("sweep-sessions", help="Delete expired sessions")
+    sweep_parser.set_defaults(func=sweep_sessions)
+    
+    sessions_parser = subparsers.add_parser("migrate-sessions", help="Store session times in UTC")
+    sessions_parser.set_defaults(func=migrate_sessions)
+    
+    search_keys_parser = subparsers.add_parser("backfill-search-keys", help="Add search keys to existing users")
+    search_keys_parser.set_defaults(func=backfill_search_keys)
+    
+    stats_parser = subparsers.add_parser("rebuild-user-stats", help="Recompute profile stats")
+    stats_parser.add_argument("--email", action="append", help="Only rebuild this user (repeatable)")
+    stats_parser.set_defaults(func=rebuild_stats)
+    
+    created_at_parser = subparsers.add_parser("migrate-created-at", help="Store created_at as datetimes")
+    created_at_parser.set_defaults(func=migrate_created_at)
+    
+    timelines_parser = subparsers.add_parser("rebuild-timelines", help="Fill friends feed timelines")
+    timelines_parser.add_argument("--email", action="append", help="Only rebuild this user's timeline (repeatable)")
+    timelines_parser.set_defaults(func=rebuild_friend_timelines)
+    
+    classes_parser = subparsers.add_parser("warm-class-cache", help="Pre-fill the off-campus class cache")
+    classes_parser.add_argument("--category", action="append", choices=CATEGORIES, help="Only this category (repeatable)")
+    classes_parser.add_argument("--force", action="store_true", help="Refetch categories that are still cached")
+    classes_parser.set_defaults(func=warm_classes)
+    
+    participants_parser = subparsers.add_parser("reconcile-participants", help="Recompute challenge participant counts")
+    participants_parser.set_defaults(func=reconcile_participants)
+    
+    leaderboards_parser = subparsers.add_parser("rebuild-leaderboards", help="Recompute challenge leaderboards")
+    leaderboards_parser.add_argument("--challenge", action="append", help="Only rebuild this challenge id (repeatable)")
+    leaderboards_parser.set_defaults(func=rebuild_challenge_leaderboards)
+    
+    import_parser = subparsers.add_parser("import-workouts", help="Import workouts from an NDJSON or CSV file")
+    import_parser.add_argument("file", help="File to import")
+    import_parser.add_argument("--email", required=True, help="User the workouts belong to")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format (default: from the file extension)")
+    import_parser.add_argument("--batch-size", type=int, help="Workouts per insert (default: WORKOUT_IMPORT_BATCH_SIZE)")
+    import_parser.set_defaults(func=import_workout_file)
+    
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
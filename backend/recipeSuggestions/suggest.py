@@ -1,11 +1,71 @@
 # backend/recipeSuggestions/suggest.py
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import json
-from openai import OpenAI
+import os
+import re
+from cache import PoolCache, MemoryCacheBackend, MongoCacheBackend
+from llm import openai_client
 
-# Uses OPENAI_API_KEY from environment (.env loaded in app.py)
-client = OpenAI()
+# Uses OPENAI_API_KEY from environment (.env loaded in app.py); created on first use
+client = openai_client
+
+# Generated recipes are pooled per canonical request (see recipe_cache_key): the first
+# RECIPE_POOL_SIZE requests for a key call OpenAI, later ones rotate through those recipes.
+# RECIPE_CACHE_BACKEND is "memory" (per process), "mongo" (shared by all workers) or "none".
+RECIPE_CACHE_BACKEND = os.getenv("RECIPE_CACHE_BACKEND", "memory")
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "1024"))
+RECIPE_CACHE_TTL = int(os.getenv("RECIPE_CACHE_TTL", str(7 * 24 * 60 * 60)))
+RECIPE_POOL_SIZE = int(os.getenv("RECIPE_POOL_SIZE", "3"))
+RECIPE_CALORIE_BUCKET = 100
+
+
+def _make_recipe_cache() -> Optional[PoolCache]:
+    """Build the recipe cache for RECIPE_CACHE_BACKEND, or None when caching is off"""
+    if RECIPE_CACHE_BACKEND == "mongo":
+        from db import db
+        backend = MongoCacheBackend(db.recipe_cache)
+    elif RECIPE_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(RECIPE_CACHE_SIZE)
+    else:
+        return None
+
+    return PoolCache(backend, RECIPE_CACHE_TTL, RECIPE_POOL_SIZE)
+
+
+recipe_cache = _make_recipe_cache()
+
+
+def normalize_ingredients(text: str) -> List[str]:
+    """Split a free-text ingredient list into sorted, lowercased, de-duplicated items"""
+    items = (re.sub(r"\s+", " ", item).strip().lower() for item in re.split(r"[,;\n]+", text or ""))
+    return sorted({item for item in items if item})
+
+
+def recipe_cache_key(
+    goal_text: str,
+    diet_text: str,
+    meal_type_text: str,
+    time_text: str,
+    per_meal_cal: Optional[int],
+    have_ingredients: str,
+    avoid_ingredients: str,
+) -> str:
+    """Canonical cache key: resolved choices, calories rounded to RECIPE_CALORIE_BUCKET and normalized ingredients"""
+    calorie_bucket = (
+        round(per_meal_cal / RECIPE_CALORIE_BUCKET) * RECIPE_CALORIE_BUCKET if per_meal_cal else None
+    )
+    return json.dumps([
+        goal_text, diet_text, meal_type_text, time_text, calorie_bucket,
+        normalize_ingredients(have_ingredients), normalize_ingredients(avoid_ingredients),
+    ])
+
+
+def get_recipe_cache_stats() -> Dict[str, Any]:
+    """Return recipe cache hit/miss counters and hit rate"""
+    if recipe_cache is None:
+        return {"hits": 0, "misses": 0, "hit_rate": 0.0}
+    return recipe_cache.get_stats()
 
 
 def generate_day_plan(
@@ -98,6 +158,35 @@ Return ONLY a single JSON object, no extra text, matching this structure exactly
 }}
     """.strip()
 
+    if recipe_cache is None:
+        recipe = _request_recipe(user_prompt)
+    else:
+        key = recipe_cache_key(
+            goal_text, diet_text, meal_type_text, time_text,
+            per_meal_cal, have_ingredients, avoid_ingredients,
+        )
+        recipe = recipe_cache.get_or_add(key, lambda: _request_recipe(user_prompt))
+
+    if recipe is None:
+        # Fallback if something weird happens
+        recipe = {
+            "name": "Fallback Meal",
+            "meal_type": meal_type_text if meal_type_text != "any meal type" else "meal",
+            "calories": per_meal_cal or 600,
+            "ingredients": [],
+            "instructions": "Recipe generation failed. Please try again.",
+        }
+
+    calories = int(recipe.get("calories", per_meal_cal or 600))
+
+    return {
+        "meals": [recipe],
+        "total_calories": calories,
+    }
+
+
+def _request_recipe(user_prompt: str) -> Optional[Dict[str, Any]]:
+    """Ask OpenAI for one recipe. Returns None if the response isn't valid JSON."""
     completion = client.chat.completions.create(
         model="gpt-4o-mini",
         response_format={"type": "json_object"},
@@ -115,21 +204,6 @@ Return ONLY a single JSON object, no extra text, matching this structure exactly
 
     raw_content = completion.choices[0].message.content
     try:
-        recipe = json.loads(raw_content)
+        return json.loads(raw_content)
     except json.JSONDecodeError:
-        # Fallback if something weird happens
-        recipe = {
-            "name": "Fallback Meal",
-            "meal_type": meal_type_text if meal_type_text != "any meal type" else "meal",
-            "calories": per_meal_cal or 600,
-            "ingredients": [],
-            "instructions": "Recipe generation failed. Please try again.",
-        }
-
-    calories = int(recipe.get("calories", per_meal_cal or 600))
-
-    return {
-        "meals": [recipe],
-        "total_calories": calories,
-    }
-
+        return None
@@ -0,0 +1,110 @@
+# backend/validation.py
+# Declarative payload schemas. A schema is a list of Fields and rule functions,
+# compiled once into a validator that reads each field of a payload one time and
+# returns the normalized values alongside the error messages.
+
+from datetime import datetime
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1024)
+def parse_date(value):
+    """Parse a YYYY-MM-DD date; raises ValueError. Repeated dates are parsed once."""
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def is_date(value):
+    try:
+        parse_date(value)
+        return True
+    except ValueError:
+        return False
+
+
+def one_of(choices, message):
+    """Check that fails when the value is not one of choices"""
+    choices = frozenset(choices)
+    return lambda value: value not in choices, message
+
+
+def longer_than(length, message):
+    return lambda value: len(value) > length, message
+
+
+def shorter_than(length, message):
+    return lambda value: len(value) < length, message
+
+
+class Field:
+    """
+    One payload field. Text fields are stripped and then normalized (e.g. str.lower);
+    other fields are used as sent. An empty value adds the required message (if any).
+    Otherwise parse converts the value, with parse_message on ValueError, and checks
+    are (fails(value), message) pairs where only the first failing one is reported.
+    Missing or invalid values are stored as default.
+    """
+
+    def __init__(self, name, required=None, normalize=None, parse=None, parse_message=None,
+                 checks=(), text=True, default=""):
+        self.name = name
+        self.required = required
+        self.normalize = normalize
+        self.parse = parse
+        self.parse_message = parse_message
+        self.checks = tuple(checks)
+        self.text = text
+        self.default = default
+
+    def compile(self):
+        """Return step(data, values, errors) with this field's settings bound as locals"""
+        name, required, normalize = self.name, self.required, self.normalize
+        parse, parse_message, checks = self.parse, self.parse_message, self.checks
+        text, default = self.text, self.default
+
+        def step(data, values, errors):
+            value = data.get(name, "")
+            if text:
+                value = value.strip()
+                if normalize is not None:
+                    value = normalize(value)
+            elif not str(value).strip():
+                value = ""
+
+            values[name] = default
+            if not value:
+                if required:
+                    errors.append(required)
+                return
+
+            if parse is not None:
+                try:
+                    value = parse(value)
+                except ValueError:
+                    errors.append(parse_message)
+                    return
+
+            for fails, message in checks:
+                if fails(value):
+                    errors.append(message)
+                    return
+
+            values[name] = value
+
+        return step
+
+
+def compile_schema(schema):
+    """
+    Compile a list of Fields and rule(data, values, errors) functions into
+    validate(data) -> (values, errors), running each step once, in order.
+    """
+    steps = tuple(step.compile() if isinstance(step, Field) else step for step in schema)
+
+    def validate(data):
+        values = {}
+        errors = []
+        for step in steps:
+            step(data, values, errors)
+        return values, errors
+
+    return validate
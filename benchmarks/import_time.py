@@ -0,0 +1,61 @@
+# benchmarks/import_time.py
+# Cold-start benchmark: how long a fresh interpreter takes to import the backend app.
+# Each run is a new process, so nothing is cached between runs.
+#
+#   python benchmarks/import_time.py [--runs 10] [--module app] [--top 15]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def run_import(module, importtime=False):
+    """Import module in a fresh interpreter; returns (seconds, stderr)"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - start)"
+    )
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_output, top):
+    """Parse -X importtime output into the top (cumulative microseconds, module) pairs"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the backend's import (cold-start) time")
+    parser.add_argument("--runs", type=int, default=10, help="Number of fresh interpreters to time")
+    parser.add_argument("--module", default="app", help="Module to import (default: app)")
+    parser.add_argument("--top", type=int, default=15, help="Show the N slowest imports (0 to skip)")
+    args = parser.parse_args(argv)
+
+    times = [run_import(args.module)[0] for _ in range(args.runs)]
+    print(f"import {args.module}: {args.runs} runs")
+    print(f"  min    {min(times) * 1000:8.1f} ms")
+    print(f"  median {statistics.median(times) * 1000:8.1f} ms")
+    print(f"  max    {max(times) * 1000:8.1f} ms")
+
+    if args.top:
+        _, output = run_import(args.module, importtime=True)
+        print("\nslowest imports (cumulative):")
+        for cumulative, name in slowest_imports(output, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
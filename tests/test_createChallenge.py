@@ -27,6 +27,25 @@ from backend.getExercises import (
     list_muscles_for_body_parts,
     generate_exercises
 )
+
+
+@pytest.fixture(autouse=True)
+def clear_response_caches(monkeypatch):
+    """OpenAI results are cached, so every test starts with empty (in-memory) caches"""
+    for name, cache_name in (
+        ("backend.getExercises", "exercise_cache"), ("getExercises", "exercise_cache"),
+        ("backend.recipeSuggestions.suggest", "recipe_cache"), ("recipeSuggestions.suggest", "recipe_cache")
+    ):
+        cache = getattr(sys.modules.get(name), cache_name, None)
+        if cache is not None:
+            cache.clear()
+    
+    from backend.cache import MemoryCacheBackend
+    for name in ("backend.findClasses", "findClasses"):
+        if name in sys.modules:
+            monkeypatch.setattr(sys.modules[name], "class_cache_backend", MemoryCacheBackend())
+    yield
+
 # ---------- VALIDATION TESTS ----------
 
 def test_validation_success():
@@ -402,10 +421,13 @@ def test_add_challenge(mock_mongo):
     mock_challenges, _ = mock_mongo
     mock_challenges.insert_one.return_value = True
     
-    challenge = {"id": "1", "name": "New Challenge", "privacy": "public"}
-    result = add_challenge(challenge)
+    challenge = {"id": "1", "name": "New Challenge", "privacy": "public", "creator": "a@bu.edu"}
+    with patch('backend.data_manager.increment_user_stats'), \
+         patch('backend.data_manager.add_to_leaderboard') as mock_leaderboard:
+        result = add_challenge(challenge)
     assert result is True
     mock_challenges.insert_one.assert_called_once_with(challenge)
+    mock_leaderboard.assert_called_once_with(challenge, ["a@bu.edu"])
 
 
 def test_get_challenge_by_id(mock_mongo):
@@ -438,9 +460,13 @@ def test_add_workout(mock_mongo):
     mock_workouts.insert_one.return_value = True
     
     workout = {"id": "w1", "name": "Workout New"}
-    result = add_workout(workout)
+    with patch('backend.data_manager.increment_user_stats'), \
+         patch('backend.data_manager.update_workout_streak'), \
+         patch('backend.data_manager.record_workout_progress') as mock_progress:
+        result = add_workout(workout)
     assert result is True
     mock_workouts.insert_one.assert_called_once_with(workout)
+    mock_progress.assert_called_once_with([workout])
 
 
 def test_get_all_activities(mock_mongo):
@@ -669,14 +695,12 @@ def test_search_off_campus_exercise(mock_client):
 # Test find_classes
 # -------------------------------
 
-@patch("backend.findClasses.format_fitrec_classes")
-def test_find_classes_on(mock_format):
-    mock_format.return_value = [
-        {"name":"Yoga","category":"yoga"},
-        {"name":"Spin","category":"cycling"}
-    ]
+def test_find_classes_on():
+    from backend.findClasses import compile_schedule
+    schedule = compile_schedule({"Monday": [("5:30–6:30p", "Yoga"), ("6:00–7:00p", "Spin")]})
     # Filter by category
-    classes = find_classes("on", ["yoga"])
+    with patch("backend.findClasses._fitrec_index", schedule):
+        classes = find_classes("on", ["yoga"])
     assert len(classes) == 1
     assert classes[0]["category"] == "yoga"
 
@@ -1124,7 +1148,7 @@ class TestLogWorkoutCoverage:
         """Test log_workout exception handling"""
         from backend.logWorkout import log_workout
         
-        with patch('backend.logWorkout.validate_workout_data', side_effect=Exception("Unexpected error")):
+        with patch('backend.logWorkout.parse_workout_data', side_effect=Exception("Unexpected error")):
             data = {
                 "workout_name": "Test",
                 "date": "2025-11-21",
@@ -1353,7 +1377,7 @@ class TestCreateChallengeCoverage:
         """Test create_challenge exception handling"""
         from backend.create_Challenge import create_challenge
         
-        with patch('backend.create_Challenge.validate_challenge_data', side_effect=Exception("Unexpected error")):
+        with patch('backend.create_Challenge.parse_challenge_data', side_effect=Exception("Unexpected error")):
             data = {
                 "title": "Test",
                 "goal": "Test goal",
@@ -1537,15 +1561,16 @@ def mock_db(monkeypatch):
     mock_client = mongomock.MongoClient()
     monkeypatch.setattr(mongo, "client", mock_client)
     monkeypatch.setattr(mongo, "db", mock_client["spotter-db"])
-    for col_name in ["users","sessions","friend_requests","friendships"]:
+    for col_name in ["users","sessions","friend_requests","friendships","user_stats","challenge_progress"]:
         monkeypatch.setattr(mongo, col_name, mock_client["spotter-db"][col_name])
+    monkeypatch.setattr(mongo.challenge_progress, "bulk_write", _apply_bulk(mongo.challenge_progress))
     yield
 
 def test_search_users_and_friendship():
     # Setup users
     mongo.users.insert_many([
-        {"email": "a@x.com", "username": "UserA"},
-        {"email": "b@x.com", "username": "UserB"}
+        {"email": "a@x.com", "username": "UserA", "search_keys": mongo.user_search_keys("a@x.com", "UserA")},
+        {"email": "b@x.com", "username": "UserB", "search_keys": mongo.user_search_keys("b@x.com", "UserB")}
     ])
     # Add friendship
     mongo.friendships.insert_one({"user1": "a@x.com", "user2": "b@x.com", "created_at": datetime.utcnow()})
@@ -2713,4 +2738,3232 @@ class TestDataManagerCompatibilityFunctions:
         """Test save_workouts"""
         from backend.data_manager import save_workouts
         result = save_workouts([])
-        assert result is True
\ No newline at end of file
+        assert result is True
+
+
+# ============================================
+# FEED INTERACTION HYDRATION TESTS
+# ============================================
+
+class CountingCollection:
+    """Wraps a mongomock collection and counts database round trips"""
+    
+    ROUND_TRIP_METHODS = {
+        "find", "find_one", "count_documents", "aggregate",
+        "insert_one", "insert_many", "update_one", "update_many",
+        "delete_one", "delete_many", "bulk_write"
+    }
+    
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+    
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self.ROUND_TRIP_METHODS:
+            return attr
+        
+        def counted(*args, **kwargs):
+            self._counter["round_trips"] += 1
+            return attr(*args, **kwargs)
+        
+        return counted
+
+
+@pytest.fixture
+def counted_interactions(monkeypatch):
+    """Mongomock likes/comments collections that count round trips"""
+    counter = {"round_trips": 0}
+    mock_client = mongomock.MongoClient()
+    mock_db = mock_client["spotter-db"]
+    monkeypatch.setattr(mongo, "likes", CountingCollection(mock_db["likes"], counter))
+    monkeypatch.setattr(mongo, "comments", CountingCollection(mock_db["comments"], counter))
+    yield mock_db, counter
+
+
+def _seed_feed_interactions(mock_db, post_count):
+    """Seed likes and comments for post_count workouts"""
+    post_refs = [(f"w{i}", "workout") for i in range(post_count)]
+    now = datetime.utcnow()
+    mock_db["likes"].insert_many([
+        {"user_email": f"u{j}@bu.edu", "post_id": post_id, "post_type": post_type, "created_at": now}
+        for i, (post_id, post_type) in enumerate(post_refs)
+        for j in range(i % 3)
+    ])
+    mock_db["comments"].insert_many([
+        {"user_email": "u0@bu.edu", "post_id": post_id, "post_type": post_type,
+         "comment_text": "Nice!", "created_at": now}
+        for i, (post_id, post_type) in enumerate(post_refs)
+        if i % 2 == 0
+    ])
+    return post_refs
+
+
+@pytest.fixture
+def app_globals():
+    """
+    Globals of the module that defined flask_app, authenticated as test@example.com.
+    Earlier tests re-import backend.app, so patching backend.app.* may not reach flask_app.
+    """
+    app_globals = flask_app.view_functions["index"].__globals__
+    with patch.dict(app_globals, {"validate_token": MagicMock(return_value=(True, "test@example.com"))}):
+        yield app_globals
+
+
+class TestPostInteractions:
+    """Test bulk like/comment hydration for the activity feed"""
+    
+    def test_matches_per_post_queries(self, counted_interactions):
+        """Bulk hydration returns the same values as the per-post helpers"""
+        mock_db, _ = counted_interactions
+        post_refs = _seed_feed_interactions(mock_db, 12)
+        
+        interactions = mongo.get_post_interactions(post_refs, "u1@bu.edu")
+        
+        for post_id, post_type in post_refs:
+            assert interactions[(post_id, post_type)] == {
+                "like_count": mongo.get_like_count(post_id, post_type),
+                "comment_count": mongo.get_comment_count(post_id, post_type),
+                "user_has_liked": mongo.has_user_liked("u1@bu.edu", post_id, post_type)
+            }
+    
+    def test_post_type_is_part_of_key(self, counted_interactions):
+        """A like on a workout does not count towards a challenge with the same id"""
+        mock_db, _ = counted_interactions
+        mock_db["likes"].insert_one({"user_email": "a@bu.edu", "post_id": "1", "post_type": "workout"})
+        
+        interactions = mongo.get_post_interactions([("1", "workout"), ("1", "challenge")], "a@bu.edu")
+        
+        assert interactions[("1", "workout")]["like_count"] == 1
+        assert interactions[("1", "workout")]["user_has_liked"] is True
+        assert interactions[("1", "challenge")]["like_count"] == 0
+        assert interactions[("1", "challenge")]["user_has_liked"] is False
+    
+    def test_empty_feed_makes_no_queries(self, counted_interactions):
+        """An empty feed does not touch the database"""
+        _, counter = counted_interactions
+        assert mongo.get_post_interactions([], "a@bu.edu") == {}
+        assert counter["round_trips"] == 0
+    
+    def test_round_trips_benchmark(self, counted_interactions):
+        """Round trips per 500-item feed: 3 per post before, constant after"""
+        mock_db, counter = counted_interactions
+        post_refs = _seed_feed_interactions(mock_db, 500)
+        
+        for post_id, post_type in post_refs:
+            mongo.get_like_count(post_id, post_type)
+            mongo.get_comment_count(post_id, post_type)
+            mongo.has_user_liked("u1@bu.edu", post_id, post_type)
+        before = counter["round_trips"]
+        
+        counter["round_trips"] = 0
+        mongo.get_post_interactions(post_refs, "u1@bu.edu")
+        after = counter["round_trips"]
+        
+        print(f"\nFeed of {len(post_refs)} posts: {before} round trips before, {after} after")
+        assert before == 3 * len(post_refs)
+        assert after == 3
+    
+    def test_activities_route_uses_bulk_hydration(self, client, app_globals):
+        """The feed route hydrates all activities with one bulk call"""
+        activities = [
+            {"id": "w1", "type": "workout", "workout_name": "Run"},
+            {"id": "c1", "title": "Plank"}
+        ]
+        interactions = {
+            ("w1", "workout"): {"like_count": 2, "comment_count": 1, "user_has_liked": True},
+            ("c1", "challenge"): {"like_count": 0, "comment_count": 0, "user_has_liked": False}
+        }
+        mock_hydrate = MagicMock(return_value=interactions)
+        with patch.dict(app_globals, {
+            "get_all_activities": MagicMock(return_value=activities),
+            "get_post_interactions": mock_hydrate
+        }):
+            res = client.get('/api/activities?type=all', headers={'Authorization': 'Bearer token'})
+        
+        assert res.status_code == 200
+        mock_hydrate.assert_called_once_with([("w1", "workout"), ("c1", "challenge")], "test@example.com")
+        data = res.get_json()
+        assert data["activities"][0]["like_count"] == 2
+        assert data["activities"][0]["user_has_liked"] is True
+        assert data["activities"][1]["comment_count"] == 0
+
+
+# ============================================
+# ACTIVITY FEED PAGINATION TESTS
+# ============================================
+
+@pytest.fixture
+def feed_collections(monkeypatch):
+    """Mongomock challenges/workouts collections for data_manager"""
+    import backend.data_manager as data_manager
+    
+    mock_db = mongomock.MongoClient()["spotter-db"]
+    monkeypatch.setattr(data_manager, "challenges", mock_db["challenges"])
+    monkeypatch.setattr(data_manager, "workouts", mock_db["workouts"])
+    
+    start = datetime(2025, 1, 1)
+    mock_db["challenges"].insert_many([
+        {"id": f"c{i}", "type": "challenge", "privacy": "public" if i % 2 else "private",
+         "creator": f"user{i % 3}@bu.edu", "created_at": start + timedelta(hours=3 * i)}
+        for i in range(20)
+    ])
+    mock_db["workouts"].insert_many([
+        {"id": f"w{i}", "type": "workout", "privacy": "public" if i % 3 else "private",
+         "creator": f"user{i % 3}@bu.edu", "created_at": start + timedelta(hours=2 * i, minutes=1)}
+        for i in range(30)
+    ])
+    yield data_manager
+
+
+def _walk_pages(fetch_page, limit):
+    """Follow the (before, before_id) cursor until a short page is returned"""
+    seen, before, before_id = [], None, None
+    while True:
+        page = fetch_page(before=before, limit=limit, before_id=before_id)
+        seen.extend(page)
+        if len(page) < limit:
+            return seen
+        before, before_id = page[-1]["created_at"], page[-1]["id"]
+
+
+class TestActivityFeedPagination:
+    """Test cursor-based pagination for the activity feed"""
+    
+    def test_all_activities_pages_match_full_feed(self, feed_collections):
+        """Walking every page gives the same order as the unpaginated feed"""
+        full = feed_collections.get_all_activities()
+        paged = _walk_pages(feed_collections.get_all_activities, limit=7)
+        assert [a["id"] for a in paged] == [a["id"] for a in full]
+    
+    def test_user_activities_pages_include_private(self, feed_collections):
+        """The 'mine' feed pages through public and private posts of one user"""
+        full = feed_collections.get_user_activities("user1@bu.edu")
+        paged = _walk_pages(
+            lambda **page: feed_collections.get_user_activities("user1@bu.edu", **page), limit=4
+        )
+        assert [a["id"] for a in paged] == [a["id"] for a in full]
+        assert {a["privacy"] for a in paged} == {"public", "private"}
+    
+    def test_friends_activities_pages_match_full_feed(self, feed_collections):
+        """The friends feed pages through public posts of the given users"""
+        emails = ["user0@bu.edu", "user2@bu.edu"]
+        full = feed_collections.get_friends_activities(emails)
+        paged = _walk_pages(
+            lambda **page: feed_collections.get_friends_activities(emails, **page), limit=5
+        )
+        assert [a["id"] for a in paged] == [a["id"] for a in full]
+        assert all(a["creator"] in emails and a["privacy"] == "public" for a in paged)
+    
+    def test_page_is_newest_first_and_bounded(self, feed_collections):
+        """A page holds at most limit items, newest first"""
+        page = feed_collections.get_all_activities(limit=5)
+        created = [a["created_at"] for a in page]
+        assert len(page) == 5
+        assert created == sorted(created, reverse=True)
+    
+    @patch('backend.data_manager.challenges')
+    @patch('backend.data_manager.workouts')
+    def test_page_limits_each_cursor(self, mock_workouts, mock_challenges):
+        """Each collection cursor is sorted by created_at and limited to the page size"""
+        from backend.data_manager import get_all_activities
+        
+        for mock_collection in (mock_challenges, mock_workouts):
+            mock_collection.find.return_value.sort.return_value.limit.return_value = iter([])
+        
+        get_all_activities(before="2025-01-02T00:00:00", limit=10)
+        
+        for mock_collection in (mock_challenges, mock_workouts):
+            query = mock_collection.find.call_args[0][0]
+            assert query["created_at"] == {"$lt": "2025-01-02T00:00:00"}
+            mock_collection.find.return_value.sort.assert_called_once_with([("created_at", -1), ("id", -1)])
+            mock_collection.find.return_value.sort.return_value.limit.assert_called_once_with(10)
+    
+    @patch('backend.data_manager.challenges')
+    @patch('backend.data_manager.workouts')
+    def test_page_cursor_includes_id(self, mock_workouts, mock_challenges):
+        """With before_id, posts created at the cursor time with a smaller id also match"""
+        from backend.data_manager import get_all_activities
+        
+        for mock_collection in (mock_challenges, mock_workouts):
+            mock_collection.find.return_value.sort.return_value.limit.return_value = iter([])
+        
+        before = datetime(2025, 1, 2)
+        get_all_activities(before=before, limit=10, before_id="w5")
+        
+        for mock_collection in (mock_challenges, mock_workouts):
+            assert mock_collection.find.call_args[0][0] == {"privacy": "public", "$or": [
+                {"created_at": {"$lt": before}},
+                {"created_at": before, "id": {"$lt": "w5"}}
+            ]}
+    
+    def test_pages_keep_posts_created_at_the_same_time(self, monkeypatch):
+        """Posts sharing one created_at are neither skipped nor repeated across pages"""
+        import backend.data_manager as data_manager
+        
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        monkeypatch.setattr(data_manager, "challenges", mock_db["challenges"])
+        monkeypatch.setattr(data_manager, "workouts", mock_db["workouts"])
+        created_at = datetime(2025, 1, 1, 12)
+        mock_db["workouts"].insert_many([
+            {"id": f"w{i:02d}", "type": "workout", "privacy": "public", "creator": "user1@bu.edu",
+             "created_at": created_at}
+            for i in range(50)
+        ])
+        
+        paged = _walk_pages(data_manager.get_all_activities, limit=20)
+        
+        assert [a["id"] for a in paged] == [f"w{i:02d}" for i in reversed(range(50))]
+    
+    def test_activities_route_pagination_params(self, client, app_globals):
+        """The feed route passes before/limit through and returns the next cursor"""
+        activities = [
+            {"id": "w2", "type": "workout", "created_at": datetime(2025, 1, 3)},
+            {"id": "w1", "type": "workout", "created_at": datetime(2025, 1, 2)}
+        ]
+        mock_get = MagicMock(return_value=activities)
+        with patch.dict(app_globals, {
+            "get_all_activities": mock_get,
+            "get_post_interactions": MagicMock(side_effect=lambda refs, email: {
+                ref: {"like_count": 0, "comment_count": 0, "user_has_liked": False} for ref in refs
+            })
+        }):
+            res = client.get('/api/activities?type=all&limit=2&before=2025-01-04',
+                             headers={'Authorization': 'Bearer token'})
+        
+        assert res.status_code == 200
+        mock_get.assert_called_once_with(before=datetime(2025, 1, 4), before_id=None, limit=2)
+        assert res.get_json()["next_before"] == {"before": "2025-01-02T00:00:00", "before_id": "w1"}
+    
+    def test_activities_route_passes_before_id(self, client, app_globals):
+        """The before_id half of the cursor is passed through with before"""
+        mock_get = MagicMock(return_value=[])
+        with patch.dict(app_globals, {"get_all_activities": mock_get}):
+            res = client.get('/api/activities?type=all&limit=2&before=2025-01-04T00:00:00&before_id=w9',
+                             headers={'Authorization': 'Bearer token'})
+        
+        assert res.status_code == 200
+        mock_get.assert_called_once_with(before=datetime(2025, 1, 4), before_id="w9", limit=2)
+    
+    def test_activities_route_last_page(self, client, app_globals):
+        """A short page has no next cursor and limit is capped"""
+        mock_get = MagicMock(return_value=[])
+        with patch.dict(app_globals, {"get_all_activities": mock_get}):
+            res = client.get('/api/activities?type=all&limit=100000',
+                             headers={'Authorization': 'Bearer token'})
+        
+        assert res.status_code == 200
+        assert res.get_json()["next_before"] is None
+        assert mock_get.call_args[1]["limit"] == app_globals["MAX_FEED_PAGE_SIZE"]
+    
+    def test_activities_route_invalid_limit(self, client, app_globals):
+        """A non-numeric limit is rejected"""
+        res = client.get('/api/activities?limit=abc', headers={'Authorization': 'Bearer token'})
+        assert res.status_code == 400
+        assert res.get_json()["success"] is False
+    
+    def test_activities_route_invalid_before(self, client, app_globals):
+        """A before cursor that is not an ISO timestamp is rejected"""
+        res = client.get('/api/activities?before=yesterday', headers={'Authorization': 'Bearer token'})
+        assert res.status_code == 400
+        assert res.get_json()["success"] is False
+
+
+# ============================================
+# SESSION TOKEN CACHE TESTS
+# ============================================
+
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    """Start every test with an empty session token cache"""
+    from backend.auth import clear_session_cache
+    clear_session_cache()
+    yield
+    clear_session_cache()
+
+
+class TestSessionTokenCache:
+    """Test the in-process cache in front of validate_token"""
+    
+    @patch('backend.auth.sessions')
+    def test_repeat_validation_hits_cache(self, mock_sessions):
+        """Only the first validation of a token queries the sessions collection"""
+        from backend.auth import validate_token, get_session_cache_stats
+        mock_sessions.find_one.return_value = {
+            "token": "tok", "email": "a@bu.edu", "expires_at": datetime.now() + timedelta(days=1)
+        }
+        
+        assert validate_token("tok") == (True, "a@bu.edu")
+        assert validate_token("tok") == (True, "a@bu.edu")
+        assert validate_token("tok") == (True, "a@bu.edu")
+        
+        mock_sessions.find_one.assert_called_once()
+        stats = get_session_cache_stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+    
+    @patch('backend.auth.sessions')
+    def test_logout_invalidates_cached_token(self, mock_sessions):
+        """A logged out token is looked up again and rejected"""
+        from backend.auth import validate_token, logout_user
+        mock_sessions.find_one.return_value = {
+            "token": "tok", "email": "a@bu.edu", "expires_at": datetime.now() + timedelta(days=1)
+        }
+        validate_token("tok")
+        
+        logout_user("tok")
+        mock_sessions.find_one.return_value = None
+        
+        assert validate_token("tok") == (False, None)
+        assert mock_sessions.find_one.call_count == 2
+    
+    @patch('backend.auth.sessions')
+    def test_invalid_tokens_are_not_cached(self, mock_sessions):
+        """Unknown tokens are not cached"""
+        from backend.auth import validate_token, get_session_cache_stats
+        mock_sessions.find_one.return_value = None
+        
+        validate_token("missing")
+        validate_token("missing")
+        
+        assert mock_sessions.find_one.call_count == 2
+        assert get_session_cache_stats()["size"] == 0
+    
+    def test_cache_honours_session_expiry(self):
+        """A cached entry is never served past the session's expires_at"""
+        from backend.auth import _cache_session, _get_cached_session
+        
+        _cache_session("old", "a@bu.edu", datetime.now() - timedelta(seconds=1))
+        _cache_session("new", "b@bu.edu", datetime.now() + timedelta(days=1))
+        
+        assert _get_cached_session("old") is None
+        assert _get_cached_session("new") == "b@bu.edu"
+    
+    def test_cache_ttl(self, monkeypatch):
+        """Entries expire after SESSION_CACHE_TTL even if the session is still valid"""
+        import backend.auth as auth
+        monkeypatch.setattr(auth, "SESSION_CACHE_TTL", timedelta(0))
+        
+        auth._cache_session("tok", "a@bu.edu", datetime.now() + timedelta(days=1))
+        
+        assert auth._get_cached_session("tok") is None
+    
+    def test_cache_is_bounded_lru(self, monkeypatch):
+        """The least recently used token is evicted when the cache is full"""
+        import backend.auth as auth
+        monkeypatch.setattr(auth, "SESSION_CACHE_SIZE", 2)
+        expiry = datetime.now() + timedelta(days=1)
+        
+        auth._cache_session("t1", "a@bu.edu", expiry)
+        auth._cache_session("t2", "b@bu.edu", expiry)
+        auth._get_cached_session("t1")
+        auth._cache_session("t3", "c@bu.edu", expiry)
+        
+        assert auth._get_cached_session("t2") is None
+        assert auth._get_cached_session("t1") == "a@bu.edu"
+        assert auth._get_cached_session("t3") == "c@bu.edu"
+
+
+# ============================================
+# SESSION EXPIRY TESTS
+# ============================================
+
+class TestSessionExpiry:
+    """Test the sessions TTL index and the expired session sweeper"""
+    
+    def test_ttl_index_created(self):
+        """A fresh sessions collection gets a TTL index on expires_at"""
+        mongo.ensure_session_ttl_index()
+        
+        index = mongo.sessions.index_information()["expires_at_1"]
+        assert index["expireAfterSeconds"] == 0
+    
+    def test_plain_index_converted_to_ttl(self, monkeypatch):
+        """An existing plain expires_at index is converted with collMod"""
+        mock_sessions = MagicMock()
+        mock_sessions.name = "sessions"
+        mock_sessions.index_information.return_value = {
+            "expires_at_1": {"key": [("expires_at", 1)], "v": 2}
+        }
+        mock_db = MagicMock()
+        monkeypatch.setattr(mongo, "sessions", mock_sessions)
+        monkeypatch.setattr(mongo, "db", mock_db)
+        
+        mongo.ensure_session_ttl_index()
+        
+        mock_db.command.assert_called_once_with(
+            "collMod", "sessions",
+            index={"keyPattern": {"expires_at": 1}, "expireAfterSeconds": 0}
+        )
+        mock_sessions.create_index.assert_not_called()
+    
+    def test_existing_ttl_index_left_alone(self, monkeypatch):
+        """Running the migration again is a no-op"""
+        mock_sessions = MagicMock()
+        mock_sessions.index_information.return_value = {
+            "expires_at_1": {"key": [("expires_at", 1)], "expireAfterSeconds": 0}
+        }
+        mock_db = MagicMock()
+        monkeypatch.setattr(mongo, "sessions", mock_sessions)
+        monkeypatch.setattr(mongo, "db", mock_db)
+        
+        mongo.ensure_session_ttl_index()
+        
+        mock_db.command.assert_not_called()
+        mock_sessions.create_index.assert_not_called()
+    
+    def test_sessions_use_utc_expiry(self):
+        """Session expiry is stored in UTC, which TTL indexes assume"""
+        with patch("backend.auth.sessions") as mock_sessions:
+            _create_session("a@bu.edu")
+        
+        inserted = mock_sessions.insert_one.call_args[0][0]
+        expected = datetime.utcnow() + timedelta(days=7)
+        assert abs((inserted["expires_at"] - expected).total_seconds()) < 5
+    
+    def test_legacy_session_expiry_read_as_local_time(self, monkeypatch):
+        """Sessions created before UTC expiry are compared in server-local time"""
+        import time
+        import backend.auth as auth
+        monkeypatch.setenv("TZ", "EST+5")
+        time.tzset()
+        try:
+            # Two hours from now in local time, three hours ago in UTC
+            expires_at = datetime.utcnow() - timedelta(hours=3)
+            with patch("backend.auth.sessions") as mock_sessions:
+                mock_sessions.find_one.return_value = {
+                    "token": "legacy", "email": "a@bu.edu", "expires_at": expires_at
+                }
+                assert auth.validate_token("legacy") == (True, "a@bu.edu")
+                
+                mock_sessions.find_one.return_value = {
+                    "token": "new", "email": "a@bu.edu", "expires_at": expires_at, "utc": True
+                }
+                assert auth.validate_token("new") == (False, None)
+        finally:
+            monkeypatch.delenv("TZ")
+            time.tzset()
+            auth._session_cache.clear()
+    
+    def test_migrate_session_times(self, monkeypatch):
+        """Legacy local-time sessions are converted to UTC and flagged"""
+        import time
+        import backend.auth as auth
+        monkeypatch.setenv("TZ", "EST+5")
+        time.tzset()
+        try:
+            mock_sessions = MagicMock()
+            mock_sessions.find.return_value = [{
+                "_id": 1,
+                "created_at": datetime(2024, 1, 1, 9, 0),
+                "expires_at": datetime(2024, 1, 8, 9, 0)
+            }]
+            mock_sessions.bulk_write.return_value.modified_count = 1
+            monkeypatch.setattr(auth, "sessions", mock_sessions)
+            
+            assert auth.migrate_session_times() == 1
+        finally:
+            monkeypatch.delenv("TZ")
+            time.tzset()
+        
+        assert mock_sessions.find.call_args[0][0] == {"utc": {"$ne": True}}
+        update = mock_sessions.bulk_write.call_args[0][0][0]
+        assert update._filter == {"_id": 1}
+        assert update._doc == {"$set": {
+            "utc": True,
+            "created_at": datetime(2024, 1, 1, 14, 0),
+            "expires_at": datetime(2024, 1, 8, 14, 0)
+        }}
+    
+    def test_migrate_sessions_command(self, capsys):
+        """manage.py migrate-sessions runs the session migration"""
+        from backend import manage
+        with patch('backend.manage.migrate_session_times', return_value=2) as mock_migrate:
+            manage.main(["migrate-sessions"])
+        
+        mock_migrate.assert_called_once()
+        assert "Converted 2 sessions to UTC" in capsys.readouterr().out
+    
+    def test_sweep_expired_sessions(self, monkeypatch):
+        """The sweeper deletes only expired sessions"""
+        import backend.auth as auth
+        monkeypatch.setattr(auth, "sessions", mongo.sessions)
+        now = datetime.utcnow()
+        mongo.sessions.insert_many([
+            {"token": "old", "email": "a@bu.edu", "expires_at": now - timedelta(hours=1)},
+            {"token": "new", "email": "a@bu.edu", "expires_at": now + timedelta(hours=1)}
+        ])
+        
+        assert auth.sweep_expired_sessions() == 1
+        assert [s["token"] for s in mongo.sessions.find()] == ["new"]
+    
+    def test_sweep_sessions_command(self, capsys):
+        """manage.py sweep-sessions runs the sweeper"""
+        from backend import manage
+        with patch('backend.manage.sweep_expired_sessions', return_value=3) as mock_sweep:
+            manage.main(["sweep-sessions"])
+        
+        mock_sweep.assert_called_once()
+        assert "Removed 3 expired sessions" in capsys.readouterr().out
+
+
+# ============================================
+# BULK USER LOOKUP TESTS
+# ============================================
+
+@pytest.fixture
+def counted_users(monkeypatch):
+    """Count round trips against the (mongomock) users collection"""
+    counter = {"round_trips": 0}
+    monkeypatch.setattr(mongo, "users", CountingCollection(mongo.users, counter))
+    yield counter
+
+
+def _seed_social_graph(friend_count):
+    """Create a@bu.edu with friend_count friends, pending requests and likes"""
+    now = datetime.utcnow()
+    others = [f"f{i}@bu.edu" for i in range(friend_count)]
+    mongo.users.insert_many(
+        [{"email": "a@bu.edu", "username": "A"}] +
+        [{"email": email, "username": f"F{i}", "bio": "hi"} for i, email in enumerate(others)]
+    )
+    mongo.friendships.insert_many([
+        {"user1": min("a@bu.edu", email), "user2": max("a@bu.edu", email),
+         "created_at": now - timedelta(minutes=i)}
+        for i, email in enumerate(others)
+    ])
+    mongo.friend_requests.insert_many([
+        {"from_user": email, "to_user": "a@bu.edu", "status": "pending",
+         "created_at": now - timedelta(minutes=i)}
+        for i, email in enumerate(others)
+    ])
+    mongo.likes.insert_many([
+        {"user_email": email, "post_id": "w1", "post_type": "workout", "created_at": now}
+        for email in others
+    ])
+
+
+class TestBulkUserLookups:
+    """Test that friend/request/like listings resolve users in one query"""
+    
+    @pytest.fixture(autouse=True)
+    def mock_likes(self, monkeypatch):
+        """Use the mongomock database for likes too"""
+        monkeypatch.setattr(mongo, "likes", mongo.db["likes"])
+    
+    @pytest.mark.parametrize("friend_count", [1, 10, 300])
+    def test_user_queries_constant(self, counted_users, friend_count):
+        """Each listing makes one users query regardless of its length"""
+        _seed_social_graph(friend_count)
+        
+        counted_users["round_trips"] = 0
+        friends = mongo.get_friends("a@bu.edu")
+        assert len(friends) == friend_count
+        assert counted_users["round_trips"] == 1
+        
+        counted_users["round_trips"] = 0
+        requests = mongo.get_friend_requests("a@bu.edu")
+        assert len(requests) == friend_count
+        assert counted_users["round_trips"] == 1
+        
+        counted_users["round_trips"] = 0
+        post_likes = mongo.get_likes_for_post("w1", "workout")
+        assert len(post_likes) == friend_count
+        assert counted_users["round_trips"] == 1
+    
+    def test_listings_keep_order_and_fields(self):
+        """Results keep their sort order and user details"""
+        _seed_social_graph(3)
+        
+        friends = mongo.get_friends("a@bu.edu")
+        assert [f["email"] for f in friends] == ["f0@bu.edu", "f1@bu.edu", "f2@bu.edu"]
+        assert friends[0]["username"] == "F0"
+        assert friends[0]["bio"] == "hi"
+        
+        requests = mongo.get_friend_requests("a@bu.edu")
+        assert [r["from_email"] for r in requests] == ["f0@bu.edu", "f1@bu.edu", "f2@bu.edu"]
+        assert requests[1]["from_username"] == "F1"
+    
+    def test_missing_users_are_skipped(self):
+        """Friendships pointing at deleted users are left out"""
+        mongo.users.insert_one({"email": "a@bu.edu"})
+        mongo.friendships.insert_one({"user1": "a@bu.edu", "user2": "gone@bu.edu", "created_at": datetime.utcnow()})
+        
+        assert mongo.get_friends("a@bu.edu") == []
+    
+    def test_get_users_by_email_projection(self):
+        """Only public fields are returned"""
+        mongo.users.insert_one({"email": "a@bu.edu", "username": "A", "password_hash": "secret"})
+        
+        found = mongo.get_users_by_email(["a@bu.edu", "a@bu.edu", "none@bu.edu"])
+        
+        assert found == {"a@bu.edu": {"email": "a@bu.edu", "username": "A"}}
+        assert mongo.get_users_by_email([]) == {}
+
+
+# ============================================
+# USER SEARCH TESTS
+# ============================================
+
+class TestUserSearch:
+    """Test prefix user search on normalized search keys"""
+    
+    def _add_user(self, email, username=None):
+        user = {"email": email, "search_keys": mongo.user_search_keys(email, username)}
+        if username:
+            user["username"] = username
+        mongo.users.insert_one(user)
+    
+    def test_search_keys(self):
+        """Keys are the lowercased email, username and username words"""
+        assert mongo.user_search_keys("Jane@BU.edu", "Jane Doe") == ["doe", "jane", "jane doe", "jane@bu.edu"]
+        assert mongo.user_search_keys("a@bu.edu") == ["a@bu.edu"]
+    
+    def test_prefix_search_is_case_insensitive(self):
+        """Matches email, username and username-word prefixes in any case"""
+        self._add_user("jdoe@bu.edu", "Jane Doe")
+        self._add_user("sam@bu.edu", "Sam Smith")
+        self._add_user("me@bu.edu")
+        
+        assert [u["email"] for u in mongo.search_users("JD", "me@bu.edu")] == ["jdoe@bu.edu"]
+        assert [u["email"] for u in mongo.search_users("doe", "me@bu.edu")] == ["jdoe@bu.edu"]
+        assert [u["email"] for u in mongo.search_users("sam s", "me@bu.edu")] == ["sam@bu.edu"]
+        assert mongo.search_users("me", "me@bu.edu") == []
+    
+    def test_regex_characters_are_escaped(self):
+        """User input is matched literally"""
+        self._add_user("a.b@bu.edu")
+        self._add_user("axb@bu.edu")
+        
+        assert [u["email"] for u in mongo.search_users("a.", "me@bu.edu")] == ["a.b@bu.edu"]
+        assert mongo.search_users(".*", "me@bu.edu") == []
+    
+    def test_query_is_anchored_and_indexable(self):
+        """The users query is an anchored regex on search_keys without the i option"""
+        with patch('backend.db.users') as mock_users:
+            mock_users.find.return_value.limit.return_value = []
+            mongo.search_users("Jane", "me@bu.edu")
+        
+        query = mock_users.find.call_args[0][0]
+        assert query["search_keys"] == {"$regex": "^jane"}
+    
+    def test_status_resolved_in_batch(self, monkeypatch):
+        """Friendship and pending status take one query each for all results"""
+        counter = {"round_trips": 0}
+        monkeypatch.setattr(mongo, "friendships", CountingCollection(mongo.friendships, counter))
+        monkeypatch.setattr(mongo, "friend_requests", CountingCollection(mongo.friend_requests, counter))
+        for i in range(20):
+            self._add_user(f"user{i}@bu.edu")
+        mongo.friendships._collection.insert_one({"user1": "me@bu.edu", "user2": "user3@bu.edu"})
+        mongo.friendships._collection.insert_one({"user1": "user12@bu.edu", "user2": "me@bu.edu"})
+        mongo.friend_requests._collection.insert_one(
+            {"from_user": "me@bu.edu", "to_user": "user5@bu.edu", "status": "pending"}
+        )
+        
+        results = {u["email"]: u for u in mongo.search_users("user", "me@bu.edu")}
+        
+        assert counter["round_trips"] == 2
+        assert len(results) == 20
+        assert {e for e, u in results.items() if u["is_friend"]} == {"user3@bu.edu", "user12@bu.edu"}
+        assert {e for e, u in results.items() if u["has_pending_request"]} == {"user5@bu.edu"}
+    
+    def test_backfill_writes_in_batches(self):
+        """Users without keys are backfilled with batched bulk writes"""
+        with patch('backend.db.users') as mock_users:
+            mock_users.find.return_value = [
+                {"_id": i, "email": f"u{i}@bu.edu", "username": f"User {i}"} for i in range(5)
+            ]
+            mock_users.bulk_write.side_effect = lambda ops, ordered: MagicMock(modified_count=len(ops))
+            
+            assert mongo.backfill_user_search_keys(batch_size=2) == 5
+        
+        assert mock_users.find.call_args[0][0] == {"search_keys": {"$exists": False}}
+        batches = [c[0][0] for c in mock_users.bulk_write.call_args_list]
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert batches[0][0]._doc == {"$set": {"search_keys": ["0", "u0@bu.edu", "user", "user 0"]}}
+    
+    def test_profile_update_refreshes_keys(self):
+        """Changing the username makes the user searchable by it"""
+        self._add_user("a@bu.edu")
+        
+        mongo.update_user_profile("a@bu.edu", {"username": "Alice"})
+        
+        assert [u["email"] for u in mongo.search_users("ali", "me@bu.edu")] == ["a@bu.edu"]
+    
+    @patch("backend.auth.users")
+    @patch("backend.auth._create_session", return_value="tok")
+    def test_register_sets_search_keys(self, mock_create_session, mock_users):
+        """New users are searchable right away"""
+        mock_users.find_one.return_value = None
+        register_user("New@bu.edu", "password123")
+        
+        inserted = mock_users.insert_one.call_args[0][0]
+        assert inserted["search_keys"] == ["new@bu.edu"]
+
+
+# ============================================
+# MATERIALIZED USER STATS TESTS
+# ============================================
+
+@pytest.fixture
+def stats_db(monkeypatch):
+    """Point every collection used by profile stats at mongomock"""
+    for col_name in ["challenges", "workouts", "challenge_participants", "challenge_invitations"]:
+        monkeypatch.setattr(mongo, col_name, mongo.db[col_name])
+    yield mongo.db
+
+
+def _seed_stats_sources():
+    """Two users with workouts, challenges, participations and a friendship"""
+    mongo.users.insert_many([{"email": "a@bu.edu"}, {"email": "b@bu.edu"}, {"email": "c@bu.edu"}])
+    mongo.workouts.insert_many([
+        {"creator": "a@bu.edu", "duration": 30, "calories": 200, "date": "2025-01-01"},
+        {"creator": "a@bu.edu", "duration": 45, "calories": None, "date": "2025-01-02"},
+        {"creator": "b@bu.edu", "duration": 10, "calories": 50, "date": "2025-01-02"}
+    ])
+    mongo.challenges.insert_many([{"id": "c1", "creator": "a@bu.edu"}, {"id": "c2", "creator": "b@bu.edu"}])
+    mongo.challenge_participants.insert_one({"challenge_id": "c2", "participant_email": "a@bu.edu"})
+    mongo.friendships.insert_one({"user1": "a@bu.edu", "user2": "b@bu.edu", "created_at": datetime.utcnow()})
+
+
+class TestMaterializedUserStats:
+    """Test the user_stats collection and its incremental maintenance"""
+    
+    def test_compute_user_stats(self, stats_db):
+        """Stats are computed from the source collections"""
+        _seed_stats_sources()
+        
+        stats = mongo.compute_user_stats(["a@bu.edu", "c@bu.edu"])
+        
+        assert stats["a@bu.edu"] == {
+            "challenges_created": 1, "challenges_joined": 1, "workouts_logged": 2,
+            "total_workout_minutes": 75, "total_calories_burned": 200, "friends_count": 1,
+            "streak_last_day": "2025-01-02", "streak_length": 2, "longest_streak": 2
+        }
+        assert stats["c@bu.edu"] == {
+            **{field: 0 for field in mongo.USER_STAT_FIELDS},
+            "streak_last_day": None, "streak_length": 0, "longest_streak": 0
+        }
+        assert "b@bu.edu" not in stats
+        assert mongo.compute_user_stats()["b@bu.edu"]["friends_count"] == 1
+    
+    def test_first_read_materializes_then_single_lookup(self, stats_db, monkeypatch):
+        """The first read stores the stats; later reads are one user_stats lookup"""
+        _seed_stats_sources()
+        mongo.get_user_stats("a@bu.edu")
+        assert mongo.user_stats.find_one({"_id": "a@bu.edu"})["workouts_logged"] == 2
+        
+        counter = {"round_trips": 0}
+        for col_name in ["challenges", "challenge_participants", "friendships"]:
+            monkeypatch.setattr(mongo, col_name, CountingCollection(getattr(mongo, col_name), counter))
+        stats = mongo.get_user_stats("a@bu.edu")
+        
+        assert counter["round_trips"] == 0
+        assert stats["challenges_joined"] == 1
+        assert stats["total_workout_minutes"] == 75
+    
+    def test_incremental_updates(self, stats_db):
+        """Writes keep materialized stats in sync with a full recompute"""
+        _seed_stats_sources()
+        mongo.users.insert_one({"email": "d@bu.edu"})
+        for email in ["a@bu.edu", "b@bu.edu", "d@bu.edu"]:
+            mongo.get_user_stats(email)
+        
+        mongo.friend_requests.insert_one({"from_user": "d@bu.edu", "to_user": "a@bu.edu", "status": "pending"})
+        mongo.accept_friend_request("d@bu.edu", "a@bu.edu")
+        mongo.remove_friend("a@bu.edu", "b@bu.edu")
+        mongo.challenge_invitations.insert_one({"challenge_id": "c1", "invitee_email": "d@bu.edu", "status": "pending"})
+        mongo.accept_challenge_invitation("c1", "d@bu.edu")
+        
+        for email in ["a@bu.edu", "b@bu.edu", "d@bu.edu"]:
+            stored = mongo.user_stats.find_one({"_id": email}, {"_id": 0, "updated_at": 0})
+            assert stored == mongo.compute_user_stats([email])[email]
+    
+    def test_add_workout_and_challenge_update_stats(self):
+        """data_manager writes apply stat increments for the creator"""
+        import backend.data_manager as data_manager
+        with patch.object(data_manager, "workouts"), \
+             patch.object(data_manager, "challenges"), \
+             patch.object(data_manager, "increment_user_stats") as mock_increment, \
+             patch.object(data_manager, "update_workout_streak") as mock_streak, \
+             patch.object(data_manager, "record_workout_progress") as mock_progress, \
+             patch.object(data_manager, "add_to_leaderboard") as mock_leaderboard:
+            workout = {"creator": "a@bu.edu", "date": "2025-01-01", "duration": 30, "calories": None}
+            data_manager.add_workout(workout)
+            data_manager.add_challenge({"creator": "a@bu.edu"})
+        
+        mock_streak.assert_called_once_with("a@bu.edu", "2025-01-01")
+        mock_progress.assert_called_once_with([workout])
+        mock_leaderboard.assert_called_once_with({"creator": "a@bu.edu"}, ["a@bu.edu"])
+        assert mock_increment.call_args_list[0] == ((["a@bu.edu"],), {
+            "workouts_logged": 1, "total_workout_minutes": 30, "total_calories_burned": 0
+        })
+        assert mock_increment.call_args_list[1] == ((["a@bu.edu"],), {"challenges_created": 1})
+    
+    def test_users_without_stats_are_not_incremented(self):
+        """Increments skip users whose stats have not been materialized"""
+        mongo.increment_user_stats(["new@bu.edu"], workouts_logged=1)
+        assert mongo.user_stats.count_documents({}) == 0
+    
+    def test_increment_errors_are_logged(self, monkeypatch, capsys):
+        """A failed stats update does not fail the write that triggered it"""
+        mock_stats = MagicMock()
+        mock_stats.update_many.side_effect = Exception("down")
+        monkeypatch.setattr(mongo, "user_stats", mock_stats)
+        
+        mongo.increment_user_stats(["a@bu.edu"], workouts_logged=1)
+        
+        assert "Error updating user stats" in capsys.readouterr().out
+    
+    def test_rebuild_user_stats(self, stats_db, monkeypatch):
+        """Rebuild writes one replacement per user in batches"""
+        _seed_stats_sources()
+        mock_stats = MagicMock()
+        monkeypatch.setattr(mongo, "user_stats", mock_stats)
+        
+        assert mongo.rebuild_user_stats(batch_size=2) == 3
+        
+        batches = [c[0][0] for c in mock_stats.bulk_write.call_args_list]
+        assert [len(batch) for batch in batches] == [2, 1]
+        replacements = {op._filter["_id"]: op._doc for batch in batches for op in batch}
+        assert replacements["b@bu.edu"]["workouts_logged"] == 1
+        assert replacements["c@bu.edu"]["friends_count"] == 0
+    
+    def test_rebuild_command(self, capsys):
+        """manage.py rebuild-user-stats passes --email through"""
+        from backend import manage
+        with patch('backend.manage.rebuild_user_stats', return_value=1) as mock_rebuild:
+            manage.main(["rebuild-user-stats", "--email", "a@bu.edu"])
+        
+        mock_rebuild.assert_called_once_with(["a@bu.edu"])
+        assert "Rebuilt stats for 1 users" in capsys.readouterr().out
+
+
+# ============================================
+# WORKOUT STREAK TESTS
+# ============================================
+
+def _days_ago(days):
+    return (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+
+
+class TestWorkoutStreaks:
+    """Test streak state maintained in user_stats"""
+    
+    def _log(self, email, date):
+        """Insert a workout and apply the incremental streak update, like add_workout"""
+        mongo.workouts.insert_one({"creator": email, "date": date, "duration": 10})
+        mongo.update_workout_streak(email, date)
+    
+    def _assert_matches_recompute(self, email):
+        stored = mongo.user_stats.find_one({"_id": email})
+        expected = mongo.compute_streak_state(mongo.workouts.distinct("date", {"creator": email}))
+        assert {k: stored[k] for k in expected} == expected
+    
+    def test_compute_streak_state(self):
+        """Runs of consecutive days are measured, duplicates ignored"""
+        state = mongo.compute_streak_state([
+            "2025-01-01", "2025-01-02", "2025-01-03", "2025-01-03",
+            "2025-01-10", datetime(2025, 1, 11, 8, 30)
+        ])
+        assert state == {"streak_last_day": "2025-01-11", "streak_length": 2, "longest_streak": 3}
+        assert mongo.compute_streak_state([]) == {"streak_last_day": None, "streak_length": 0, "longest_streak": 0}
+    
+    def test_current_streak_only_if_recent(self):
+        """The latest run is current only if it ended today or yesterday"""
+        assert mongo.get_current_streak({"streak_last_day": _days_ago(0), "streak_length": 4}) == 4
+        assert mongo.get_current_streak({"streak_last_day": _days_ago(1), "streak_length": 4}) == 4
+        assert mongo.get_current_streak({"streak_last_day": _days_ago(2), "streak_length": 4}) == 0
+        assert mongo.get_current_streak({"streak_last_day": None, "streak_length": 0}) == 0
+    
+    def test_streaks_longer_than_30_days(self, stats_db):
+        """Streaks are not capped at 30 days"""
+        mongo.workouts.insert_many([
+            {"creator": "a@bu.edu", "date": _days_ago(i), "duration": 10} for i in range(45)
+        ])
+        
+        stats = mongo.get_user_stats("a@bu.edu")
+        
+        assert stats["current_streak"] == 45
+        assert stats["longest_streak"] == 45
+    
+    def test_in_order_updates_use_no_workout_queries(self, stats_db, monkeypatch):
+        """Consecutive, repeated and gap days update the stored state directly"""
+        self._log("a@bu.edu", _days_ago(10))
+        mongo.get_user_stats("a@bu.edu")
+        counter = {"round_trips": 0}
+        monkeypatch.setattr(mongo, "workouts", CountingCollection(mongo.workouts, counter))
+        
+        for days_ago in [9, 8, 8, 7, 3, 2, 1, 0]:
+            mongo.workouts._collection.insert_one({"creator": "a@bu.edu", "date": _days_ago(days_ago)})
+            mongo.update_workout_streak("a@bu.edu", _days_ago(days_ago))
+        
+        assert counter["round_trips"] == 0
+        stats = mongo.get_user_stats("a@bu.edu")
+        assert stats["current_streak"] == 4
+        assert stats["longest_streak"] == 4
+    
+    def test_back_dated_workout_joins_runs(self, stats_db):
+        """A back-dated workout filling a gap merges the two runs"""
+        for days_ago in [5, 4, 2, 1, 0]:
+            self._log("a@bu.edu", _days_ago(days_ago))
+        mongo.get_user_stats("a@bu.edu")
+        assert mongo.get_user_stats("a@bu.edu")["current_streak"] == 3
+        
+        self._log("a@bu.edu", _days_ago(3))
+        
+        stats = mongo.get_user_stats("a@bu.edu")
+        assert stats["current_streak"] == 6
+        assert stats["longest_streak"] == 6
+        self._assert_matches_recompute("a@bu.edu")
+    
+    def test_back_dated_workouts_keep_state_correct(self, stats_db):
+        """Back-dated workouts inside or before the current run match a full recompute"""
+        for days_ago in [20, 2, 1, 0]:
+            self._log("a@bu.edu", _days_ago(days_ago))
+        mongo.get_user_stats("a@bu.edu")
+        
+        for days_ago in [1, 19, 21, 40, 3]:
+            self._log("a@bu.edu", _days_ago(days_ago))
+            self._assert_matches_recompute("a@bu.edu")
+        
+        stats = mongo.get_user_stats("a@bu.edu")
+        assert stats["current_streak"] == 4
+        assert stats["longest_streak"] == 4
+    
+    def test_users_without_stats_are_skipped(self, stats_db):
+        """The streak is computed in full on first read instead"""
+        mongo.update_workout_streak("new@bu.edu", _days_ago(0))
+        assert mongo.user_stats.count_documents({}) == 0
+    
+    def test_stats_without_streak_are_recomputed(self, stats_db):
+        """Stats stored before streak tracking get their streak on the next read"""
+        mongo.workouts.insert_one({"creator": "a@bu.edu", "date": _days_ago(0), "duration": 10})
+        mongo.user_stats.insert_one({"_id": "a@bu.edu", "workouts_logged": 1})
+        
+        assert mongo.get_user_stats("a@bu.edu")["current_streak"] == 1
+        assert mongo.user_stats.find_one({"_id": "a@bu.edu"})["streak_length"] == 1
+
+
+# ============================================
+# CREATED_AT DATETIME AND FEED INDEX TESTS
+# ============================================
+
+@pytest.fixture
+def real_mongo_feed(monkeypatch):
+    """
+    Feed collections on a real MongoDB (explain() needs a server) with the feed indexes.
+    Skipped when MONGO_URI does not point at a reachable server.
+    """
+    from pymongo import MongoClient
+    import backend.data_manager as data_manager
+    
+    try:
+        real_client = MongoClient(os.getenv("MONGO_URI"), serverSelectionTimeoutMS=500)
+        real_client.admin.command("ping")
+    except Exception:
+        pytest.skip("explain() tests need a reachable MongoDB at MONGO_URI")
+    
+    test_db = real_client["spotter-explain-test"]
+    start = datetime(2025, 1, 1)
+    for name in ("challenges", "workouts"):
+        collection = test_db[name]
+        collection.drop()
+        collection.create_index("id")
+        for keys in mongo.FEED_INDEXES:
+            collection.create_index(keys)
+        collection.insert_many([
+            {"id": f"{name}{i}", "creator": f"user{i % 5}@bu.edu",
+             "privacy": "public" if i % 2 else "private", "created_at": start + timedelta(minutes=i)}
+            for i in range(200)
+        ])
+    
+    # The timeline of user1, indexed as ensure_timeline_indexes does
+    monkeypatch.setattr(mongo, "db", test_db)
+    monkeypatch.setattr(mongo, "timelines", test_db["timelines"])
+    test_db["timelines"].drop()
+    mongo.ensure_timeline_indexes()
+    test_db["timelines"].insert_many([
+        {"owner": "user1@bu.edu", "post_id": f"workouts{i}", "post_type": "workout",
+         "creator": f"user{i % 5}@bu.edu", "created_at": start + timedelta(minutes=i)}
+        for i in range(200)
+    ])
+    
+    cursors = []
+    
+    class RecordingCollection:
+        """Records cursors returned by find so they can be explained"""
+        def __init__(self, collection):
+            self._collection = collection
+        
+        def find(self, *args, **kwargs):
+            cursor = self._collection.find(*args, **kwargs)
+            cursors.append(cursor)
+            return cursor
+    
+    monkeypatch.setattr(data_manager, "challenges", RecordingCollection(test_db["challenges"]))
+    monkeypatch.setattr(data_manager, "workouts", RecordingCollection(test_db["workouts"]))
+    monkeypatch.setattr(data_manager, "timelines", RecordingCollection(test_db["timelines"]))
+    yield data_manager, cursors
+    real_client.drop_database("spotter-explain-test")
+
+
+def _plan_stages(plan):
+    """All stage names in an explain() plan tree"""
+    if isinstance(plan, dict):
+        stages = [plan["stage"]] if "stage" in plan else []
+        for value in plan.values():
+            stages += _plan_stages(value)
+        return stages
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _plan_stages(item)]
+    return []
+
+
+class TestCreatedAtDatetimes:
+    """Test native created_at datetimes and the feed indexes"""
+    
+    @patch('backend.logWorkout.add_workout', return_value=True)
+    def test_log_workout_stores_datetime(self, mock_add):
+        """Workouts are stored with a datetime created_at"""
+        log_workout(valid_data, creator_email="a@bu.edu")
+        assert isinstance(mock_add.call_args[0][0]["created_at"], datetime)
+    
+    @patch('backend.create_Challenge.add_challenge', return_value=True)
+    def test_create_challenge_stores_datetime(self, mock_add):
+        """Challenges are stored with a datetime created_at"""
+        data = {
+            "challenge_type": "Time-Based", "category": "Cardio", "title": "Run",
+            "goal": "Run daily", "description": "Run every single day",
+            "start_date": (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d"),
+            "end_date": (datetime.now() + timedelta(days=8)).strftime("%Y-%m-%d"),
+            "privacy": "public"
+        }
+        create_challenge(data, creator_email="a@bu.edu")
+        assert isinstance(mock_add.call_args[0][0]["created_at"], datetime)
+    
+    def test_migrate_created_at(self, monkeypatch):
+        """String created_at values are converted to naive UTC datetimes in batches"""
+        from datetime import timezone
+        mock_challenges, mock_workouts = MagicMock(), MagicMock()
+        mock_challenges.find.return_value = [{"_id": 1, "created_at": "2025-01-01T12:00:00"}]
+        mock_workouts.find.return_value = [
+            {"_id": i, "created_at": f"2025-01-0{i}T08:30:00+00:00"} for i in range(2, 5)
+        ]
+        for mock_collection in (mock_challenges, mock_workouts):
+            mock_collection.bulk_write.side_effect = lambda ops, ordered: MagicMock(modified_count=len(ops))
+        monkeypatch.setattr(mongo, "challenges", mock_challenges)
+        monkeypatch.setattr(mongo, "workouts", mock_workouts)
+        
+        assert mongo.migrate_created_at_to_datetime(batch_size=2) == (4, 0)
+        
+        assert mock_workouts.find.call_args[0][0] == {"created_at": {"$type": "string"}}
+        local_noon = datetime(2025, 1, 1, 12).astimezone().astimezone(timezone.utc).replace(tzinfo=None)
+        assert mock_challenges.bulk_write.call_args[0][0][0]._doc == {"$set": {"created_at": local_noon}}
+        workout_batches = [c[0][0] for c in mock_workouts.bulk_write.call_args_list]
+        assert [len(batch) for batch in workout_batches] == [2, 1]
+        assert workout_batches[0][0]._doc == {"$set": {"created_at": datetime(2025, 1, 2, 8, 30)}}
+    
+    def test_migrate_created_at_skips_invalid(self, monkeypatch, capsys):
+        """A created_at that is not an ISO timestamp is counted and skipped, not raised"""
+        mock_challenges, mock_workouts = MagicMock(), MagicMock()
+        mock_challenges.find.return_value = []
+        mock_workouts.find.return_value = [
+            {"_id": 1, "created_at": "yesterday"},
+            {"_id": 2, "created_at": "2025-01-02T08:30:00+00:00"}
+        ]
+        mock_workouts.name = "workouts"
+        mock_workouts.bulk_write.side_effect = lambda ops, ordered: MagicMock(modified_count=len(ops))
+        monkeypatch.setattr(mongo, "challenges", mock_challenges)
+        monkeypatch.setattr(mongo, "workouts", mock_workouts)
+        
+        assert mongo.migrate_created_at_to_datetime() == (1, 1)
+        
+        assert [op._filter for op in mock_workouts.bulk_write.call_args[0][0]] == [{"_id": 2}]
+        assert "Skipping workouts 1" in capsys.readouterr().out
+    
+    def test_feeds_sort_mixed_created_at_types(self, monkeypatch):
+        """Feeds with unmigrated string created_at next to datetimes sort them together"""
+        import backend.data_manager as data_manager
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        monkeypatch.setattr(data_manager, "challenges", mock_db["challenges"])
+        monkeypatch.setattr(data_manager, "workouts", mock_db["workouts"])
+        monkeypatch.setattr(data_manager, "timelines", mock_db["timelines"])
+        monkeypatch.setattr(data_manager, "get_high_fanout_users", lambda emails: set())
+        old = datetime(2025, 1, 1, 12).astimezone().replace(tzinfo=None).isoformat()
+        mock_db["challenges"].insert_one(
+            {"id": "c1", "type": "challenge", "privacy": "public", "creator": "user1@bu.edu", "created_at": old}
+        )
+        mock_db["workouts"].insert_many([
+            {"id": "w1", "type": "workout", "privacy": "public", "creator": "user1@bu.edu",
+             "created_at": datetime(2025, 1, 2)},
+            {"id": "w0", "type": "workout", "privacy": "public", "creator": "user1@bu.edu",
+             "created_at": datetime(2024, 12, 31)}
+        ])
+        expected = ["w1", "c1", "w0"]
+        
+        assert [a["id"] for a in data_manager.get_all_activities()] == expected
+        assert [a["id"] for a in data_manager.get_user_activities("user1@bu.edu")] == expected
+        assert [a["id"] for a in data_manager.get_friends_activities(["user1@bu.edu"])] == expected
+        page = data_manager.get_timeline_activities("user1@bu.edu", ["user1@bu.edu"], limit=3)
+        assert sorted(a["id"] for a in page) == sorted(expected)
+    
+    def test_recent_activities_sort_mixed_created_at_types(self, monkeypatch):
+        """Profile activities sort string and datetime created_at values together"""
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        monkeypatch.setattr(mongo, "challenges", mock_db["challenges"])
+        monkeypatch.setattr(mongo, "workouts", mock_db["workouts"])
+        mock_db["challenges"].insert_one({
+            "title": "Old", "goal": "g", "creator": "user1@bu.edu", "created_at": "2025-01-01T12:00:00"
+        })
+        mock_db["workouts"].insert_one({
+            "workout_name": "New", "workout_type": "cardio", "duration": 30, "creator": "user1@bu.edu",
+            "created_at": datetime(2025, 1, 5)
+        })
+        
+        activities = mongo.get_user_recent_activities("user1@bu.edu")
+        
+        assert [a["type"] for a in activities] == ["workout", "challenge"]
+    
+    def test_feed_queries_sort_on_index(self, real_mongo_feed):
+        """
+        No data_manager query needs an in-memory SORT stage or a collection scan,
+        including every branch of the (created_at, id) cursor's $or and the timeline read
+        """
+        data_manager, cursors = real_mongo_feed
+        before = datetime(2025, 1, 1, 2)
+        
+        data_manager.load_challenges()
+        data_manager.load_workouts()
+        data_manager.get_public_challenges()
+        data_manager.get_challenges_by_creator("user1@bu.edu")
+        data_manager.get_workouts_by_creator("user1@bu.edu")
+        for before_id in (None, "workouts100"):
+            data_manager.get_all_activities(before=before, limit=20, before_id=before_id)
+            data_manager.get_user_activities("user1@bu.edu", before=before, limit=20, before_id=before_id)
+            data_manager.get_friends_activities(
+                ["user1@bu.edu", "user2@bu.edu"], before=before, limit=20, before_id=before_id
+            )
+        data_manager.get_timeline_activities(
+            "user1@bu.edu", ["user1@bu.edu"], before=before, limit=20, before_id="workouts100"
+        )
+        
+        # 5 listings, 2 cursors for each of 6 pages, then the timeline and its workouts
+        assert len(cursors) == 19
+        for cursor in cursors:
+            plan = cursor.clone().explain()["queryPlanner"]["winningPlan"]
+            stages = _plan_stages(plan)
+            assert "SORT" not in stages, plan
+            assert "COLLSCAN" not in stages, plan
+
+
+# ============================================
+# FRIENDS TIMELINE (FAN-OUT-ON-WRITE) TESTS
+# ============================================
+
+@pytest.fixture
+def timeline_db(monkeypatch):
+    """Mongomock posts and timelines shared by backend.db and data_manager, with FEED_TIMELINE on"""
+    import backend.data_manager as data_manager
+    
+    for name in ("challenges", "workouts", "timelines"):
+        monkeypatch.setattr(mongo, name, mongo.db[name])
+        monkeypatch.setattr(data_manager, name, mongo.db[name])
+    # data_manager imports the top-level db module, so point it at the patched functions
+    for name in ("fan_out_post", "get_high_fanout_users", "increment_user_stats", "update_workout_streak",
+                 "add_to_leaderboard", "record_workout_progress"):
+        monkeypatch.setattr(data_manager, name, getattr(mongo, name))
+    monkeypatch.setattr(mongo, "FEED_TIMELINE", True)
+    mongo.ensure_timeline_indexes()
+    
+    mongo.users.insert_many([{"email": f"user{i}@bu.edu"} for i in range(4)])
+    mongo.friendships.insert_many([
+        {"user1": "user0@bu.edu", "user2": "user1@bu.edu", "created_at": datetime.utcnow()},
+        {"user1": "user0@bu.edu", "user2": "user2@bu.edu", "created_at": datetime.utcnow()}
+    ])
+    yield data_manager
+
+
+def _post(post_type, i, creator, privacy="public", created_at=None):
+    """A minimal challenge or workout document"""
+    return {
+        "id": f"{post_type[0]}{i}", "type": post_type, "creator": creator, "privacy": privacy,
+        "created_at": created_at or datetime.utcnow() - timedelta(minutes=100 - i)
+    }
+
+
+class TestFriendsTimeline:
+    """Test the fan-out-on-write friends timeline"""
+    
+    def test_public_post_fans_out_to_friends(self, timeline_db):
+        """A public post reaches the creator and their friends only"""
+        timeline_db.add_workout(_post("workout", 1, "user0@bu.edu"))
+        timeline_db.add_challenge(_post("challenge", 2, "user1@bu.edu"))
+        
+        owners = {(e["owner"], e["post_id"]) for e in mongo.timelines.find()}
+        assert owners == {
+            ("user0@bu.edu", "w1"), ("user1@bu.edu", "w1"), ("user2@bu.edu", "w1"),
+            ("user0@bu.edu", "c2"), ("user1@bu.edu", "c2")
+        }
+    
+    def test_private_post_and_disabled_mode_do_not_fan_out(self, timeline_db, monkeypatch):
+        """Private posts, and every post when FEED_TIMELINE is off, stay out of timelines"""
+        timeline_db.add_workout(_post("workout", 1, "user0@bu.edu", privacy="private"))
+        monkeypatch.setattr(mongo, "FEED_TIMELINE", False)
+        timeline_db.add_workout(_post("workout", 2, "user0@bu.edu"))
+        assert mongo.timelines.count_documents({}) == 0
+    
+    def test_duplicate_push_is_ignored(self, timeline_db):
+        """Pushing the same post twice keeps one entry per owner"""
+        post = _post("workout", 1, "user0@bu.edu")
+        mongo.push_to_timelines(["user1@bu.edu"], [post])
+        mongo.push_to_timelines(["user1@bu.edu"], [post])
+        assert mongo.timelines.count_documents({"owner": "user1@bu.edu"}) == 1
+    
+    def test_timeline_pages_match_read_feed(self, timeline_db):
+        """Paging the timeline gives the same feed as fan-out-on-read, including older posts"""
+        # Posts from before the timeline existed are only reachable by the read fallback
+        mongo.workouts.insert_many([
+            _post("workout", i, f"user{i % 3}@bu.edu", created_at=datetime(2025, 1, 1) + timedelta(hours=i))
+            for i in range(100, 110)
+        ])
+        for i in range(30):
+            creator = f"user{i % 4}@bu.edu"
+            privacy = "private" if i % 5 == 0 else "public"
+            if i % 2:
+                timeline_db.add_workout(_post("workout", i, creator, privacy))
+            else:
+                timeline_db.add_challenge(_post("challenge", i, creator, privacy))
+        
+        emails = mongo.get_friends_and_self_emails("user0@bu.edu")
+        full = timeline_db.get_friends_activities(emails)
+        paged = _walk_pages(
+            lambda **page: timeline_db.get_timeline_activities("user0@bu.edu", emails, **page), limit=4
+        )
+        assert [a["id"] for a in paged] == [a["id"] for a in full]
+        assert "user3@bu.edu" not in {a["creator"] for a in paged}
+    
+    def test_full_page_reads_only_the_timeline(self, timeline_db, monkeypatch):
+        """A page the timeline can fill is one range read plus loading the referenced posts"""
+        for i in range(10):
+            timeline_db.add_workout(_post("workout", i, "user1@bu.edu"))
+        
+        counter = {"round_trips": 0}
+        for name in ("challenges", "workouts", "timelines"):
+            monkeypatch.setattr(timeline_db, name, CountingCollection(getattr(mongo, name), counter))
+        monkeypatch.setattr(timeline_db, "get_high_fanout_users", MagicMock(return_value=set()))
+        
+        page = timeline_db.get_timeline_activities("user0@bu.edu", ["user0@bu.edu", "user1@bu.edu"], limit=5)
+        assert [a["id"] for a in page] == ["w9", "w8", "w7", "w6", "w5"]
+        assert counter["round_trips"] == 2
+    
+    def test_high_fanout_creator_is_read_not_fanned_out(self, timeline_db, monkeypatch):
+        """Posts by users over the fan-out limit are merged in at read time"""
+        monkeypatch.setattr(mongo, "TIMELINE_FANOUT_LIMIT", 1)
+        mongo.user_stats.insert_one({"_id": "user0@bu.edu", "friends_count": 2})
+        
+        timeline_db.add_workout(_post("workout", 1, "user0@bu.edu"))
+        timeline_db.add_workout(_post("workout", 2, "user1@bu.edu"))
+        
+        assert mongo.timelines.count_documents({"owner": "user1@bu.edu", "post_id": "w1"}) == 0
+        page = timeline_db.get_timeline_activities("user1@bu.edu", ["user1@bu.edu", "user0@bu.edu"], limit=1)
+        assert [a["id"] for a in page] == ["w2"]
+        page = timeline_db.get_timeline_activities("user1@bu.edu", ["user1@bu.edu", "user0@bu.edu"], limit=5)
+        assert [a["id"] for a in page] == ["w2", "w1"]
+    
+    def test_friendship_changes_update_timelines(self, timeline_db):
+        """New friends get each other's recent posts; removed friends lose them"""
+        timeline_db.add_workout(_post("workout", 1, "user3@bu.edu"))
+        timeline_db.add_workout(_post("workout", 2, "user1@bu.edu"))
+        old = _post("workout", 3, "user3@bu.edu", created_at=datetime.utcnow() - timedelta(days=mongo.TIMELINE_DAYS + 1))
+        mongo.workouts.insert_one(old)
+        
+        mongo.send_friend_request("user1@bu.edu", "user3@bu.edu")
+        mongo.accept_friend_request("user1@bu.edu", "user3@bu.edu")
+        assert {e["post_id"] for e in mongo.timelines.find({"owner": "user1@bu.edu"})} == {"w1", "w2"}
+        assert {e["post_id"] for e in mongo.timelines.find({"owner": "user3@bu.edu"})} == {"w1", "w2"}
+        
+        mongo.remove_friend("user3@bu.edu", "user1@bu.edu")
+        assert {e["post_id"] for e in mongo.timelines.find({"owner": "user1@bu.edu"})} == {"w2"}
+        assert {e["post_id"] for e in mongo.timelines.find({"owner": "user3@bu.edu"})} == {"w1"}
+    
+    def test_failed_fan_out_is_retried(self, timeline_db, monkeypatch):
+        """A fan-out that fails once is retried and reaches every timeline"""
+        push = mongo.push_to_timelines
+        failures = iter([Exception("timeout")])
+        
+        def flaky_push(owners, posts):
+            for error in failures:
+                raise error
+            push(owners, posts)
+        
+        monkeypatch.setattr(mongo, "push_to_timelines", flaky_push)
+        monkeypatch.setattr(mongo, "TIMELINE_FANOUT_RETRY_DELAY", 0)
+        timeline_db.add_workout(_post("workout", 1, "user1@bu.edu"))
+        
+        assert {e["owner"] for e in mongo.timelines.find({"post_id": "w1"})} == {"user0@bu.edu", "user1@bu.edu"}
+    
+    def test_failed_fan_out_is_logged_and_rebuilt(self, timeline_db, monkeypatch, capsys):
+        """A fan-out that keeps failing is logged, and rebuild_timelines puts the post back"""
+        # An older post keeps the timeline from running out, so nothing falls back to reading
+        timeline_db.add_workout(_post("workout", 1, "user1@bu.edu"))
+        with patch.object(mongo, "push_to_timelines", side_effect=Exception("timeout")) as mock_push:
+            monkeypatch.setattr(mongo, "TIMELINE_FANOUT_RETRY_DELAY", 0)
+            timeline_db.add_workout(_post("workout", 2, "user1@bu.edu"))
+        
+        assert mock_push.call_count == mongo.TIMELINE_FANOUT_ATTEMPTS
+        assert "Error fanning out posts ['w2'] by user1@bu.edu" in capsys.readouterr().out
+        emails = ["user0@bu.edu", "user1@bu.edu"]
+        page = timeline_db.get_timeline_activities("user0@bu.edu", emails, limit=1)
+        assert [a["id"] for a in page] == ["w1"]
+        
+        mongo.rebuild_timelines(["user0@bu.edu"])
+        page = timeline_db.get_timeline_activities("user0@bu.edu", emails, limit=1)
+        assert [a["id"] for a in page] == ["w2"]
+    
+    def test_user_back_under_fanout_limit_is_pushed(self, timeline_db, monkeypatch):
+        """Posts made while over the limit reach friends' timelines once the user is back at it"""
+        monkeypatch.setattr(mongo, "TIMELINE_FANOUT_LIMIT", 2)
+        mongo.user_stats.insert_one({"_id": "user0@bu.edu", "friends_count": 3})
+        mongo.friendships.insert_one({"user1": "user0@bu.edu", "user2": "user3@bu.edu", "created_at": datetime.utcnow()})
+        timeline_db.add_workout(_post("workout", 1, "user0@bu.edu"))
+        assert mongo.timelines.count_documents({"owner": "user1@bu.edu"}) == 0
+        
+        mongo.remove_friend("user0@bu.edu", "user3@bu.edu")
+        
+        assert {e["owner"] for e in mongo.timelines.find({"post_id": "w1"})} == {
+            "user0@bu.edu", "user1@bu.edu", "user2@bu.edu"
+        }
+    
+    def test_rebuild_timelines(self, timeline_db):
+        """Rebuilding fills timelines from friends' recent public posts"""
+        mongo.workouts.insert_many([
+            _post("workout", 1, "user1@bu.edu"),
+            _post("workout", 2, "user2@bu.edu", privacy="private"),
+            _post("workout", 3, "user3@bu.edu")
+        ])
+        
+        assert mongo.rebuild_timelines(["user0@bu.edu", "user2@bu.edu"]) == 2
+        assert {e["post_id"] for e in mongo.timelines.find({"owner": "user0@bu.edu"})} == {"w1"}
+        assert mongo.timelines.count_documents({"owner": "user2@bu.edu"}) == 0
+    
+    def test_activities_route_uses_timeline(self, client, app_globals):
+        """With FEED_TIMELINE on, a paged friends feed is read from the timeline"""
+        mock_timeline = MagicMock(return_value=[])
+        with patch.dict(app_globals, {
+            "FEED_TIMELINE": True,
+            "get_timeline_activities": mock_timeline,
+            "get_friends_and_self_emails": MagicMock(return_value=["test@example.com"])
+        }):
+            res = client.get('/api/activities?type=friends&limit=5', headers={'Authorization': 'Bearer token'})
+        
+        assert res.status_code == 200
+        mock_timeline.assert_called_once_with(
+            "test@example.com", ["test@example.com"], before=None, before_id=None, limit=5
+        )
+
+
+# ============================================
+# EXERCISE RESPONSE CACHE TESTS
+# ============================================
+
+def _openai_exercises(mock_client, *names):
+    """Make the mocked OpenAI client return exercises with the given names"""
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps({"exercises": [{"name": name} for name in names]})
+    mock_client.chat.completions.create.return_value = mock_response
+
+
+class TestExerciseCache:
+    """Test caching of generated exercises"""
+    
+    @patch('backend.getExercises.client')
+    def test_repeat_selection_is_served_from_cache(self, mock_client):
+        """The same selection in any order or with duplicates calls OpenAI once"""
+        _openai_exercises(mock_client, "Bicep Curl")
+        
+        first = generate_exercises(["Arms", "Legs"], ["Biceps", "Quads"])
+        second = generate_exercises([" Legs", "Arms", "Arms"], ["Quads", "Biceps "])
+        
+        assert first == second == [{"name": "Bicep Curl"}]
+        assert mock_client.chat.completions.create.call_count == 1
+    
+    @patch('backend.getExercises.client')
+    def test_different_selection_misses(self, mock_client):
+        """Different muscles are cached separately; empty results are not cached"""
+        _openai_exercises(mock_client)
+        assert generate_exercises(["Arms"], ["Biceps"]) == []
+        _openai_exercises(mock_client, "Bicep Curl")
+        assert generate_exercises(["Arms"], ["Biceps"]) == [{"name": "Bicep Curl"}]
+        _openai_exercises(mock_client, "Dip")
+        assert generate_exercises(["Arms"], ["Triceps"]) == [{"name": "Dip"}]
+        assert mock_client.chat.completions.create.call_count == 3
+    
+    def test_cache_key_is_normalized(self):
+        """Keys ignore order and duplicates"""
+        from backend.getExercises import exercise_cache_key
+        assert exercise_cache_key(["Legs", "Arms"], ["Quads", "Biceps", "Quads"]) == "Arms|Legs/Biceps|Quads"
+    
+    def test_memory_backend_evicts_least_recently_used(self):
+        """The in-process backend holds at most max_size entries"""
+        from backend.cache import MemoryCacheBackend
+        backend = MemoryCacheBackend(max_size=2)
+        now = datetime.utcnow()
+        backend.set("a", 1, now)
+        backend.set("b", 2, now)
+        backend.get("a")
+        backend.set("c", 3, now)
+        
+        assert backend.get("b") is None
+        assert backend.get("a") == (1, now)
+        assert len(backend) == 2
+    
+    def test_expired_entry_is_recomputed(self):
+        """Entries past ttl + stale_ttl are a miss"""
+        from backend.cache import ResponseCache, MemoryCacheBackend
+        backend = MemoryCacheBackend()
+        cache = ResponseCache(backend, ttl=60, stale_ttl=60)
+        backend.set("key", "old", datetime.utcnow() - timedelta(seconds=121))
+        
+        assert cache.get_or_compute("key", lambda: "new") == "new"
+        assert cache.get_stats()["misses"] == 1
+        assert cache.get_or_compute("key", lambda: "newer") == "new"
+        assert cache.get_stats()["hits"] == 1
+    
+    def test_stale_entry_is_served_and_refreshed_once(self):
+        """A stale entry is returned at once while a single background refresh runs"""
+        import threading
+        import time
+        from backend.cache import ResponseCache, MemoryCacheBackend
+        backend = MemoryCacheBackend()
+        cache = ResponseCache(backend, ttl=60, stale_ttl=600)
+        backend.set("key", "old", datetime.utcnow() - timedelta(seconds=120))
+        
+        release = threading.Event()
+        compute = MagicMock(side_effect=lambda: release.wait(5) and "new")
+        
+        assert cache.get_or_compute("key", compute) == "old"
+        assert cache.get_or_compute("key", compute) == "old"
+        release.set()
+        for _ in range(100):
+            if cache.get_stats()["refreshes"]:
+                break
+            time.sleep(0.05)
+        
+        assert compute.call_count == 1
+        assert backend.get("key")[0] == "new"
+        assert cache.get_stats()["stale_hits"] == 2
+        assert cache.get_stats()["refreshes"] == 1
+    
+    def test_mongo_backend_round_trip(self):
+        """The shared backend stores entries by key, leaving the TTL index to ensure_indexes"""
+        from backend.cache import ResponseCache, MongoCacheBackend
+        collection = mongomock.MongoClient()["spotter-db"]["exercise_cache"]
+        cache = ResponseCache(MongoCacheBackend(collection), ttl=60)
+        compute = MagicMock(return_value=[{"name": "Squat"}])
+        
+        assert cache.get_or_compute("Legs/Quads", compute) == [{"name": "Squat"}]
+        assert cache.get_or_compute("Legs/Quads", compute) == [{"name": "Squat"}]
+        
+        assert compute.call_count == 1
+        assert collection.find_one({"_id": "Legs/Quads"})["value"] == [{"name": "Squat"}]
+        assert "stored_at_1" not in collection.index_information()
+    
+    def test_backend_errors_fall_back_to_compute(self):
+        """A failing backend does not fail the request"""
+        from backend.cache import ResponseCache
+        backend = MagicMock()
+        backend.get.side_effect = Exception("db down")
+        backend.set.side_effect = Exception("db down")
+        cache = ResponseCache(backend, ttl=60)
+        
+        assert cache.get_or_compute("key", lambda: "value") == "value"
+
+
+# ============================================
+# LOCAL EXERCISE CATALOG TESTS
+# ============================================
+
+class TestExerciseCatalog:
+    """Test the local exercise catalog and catalog mode of generate_exercises"""
+    
+    def test_catalog_covers_every_muscle(self):
+        """Every muscle in BODY_PARTS has catalog exercises in the OpenAI response format"""
+        from backend.exerciseCatalog import EXERCISES, EXERCISES_BY_MUSCLE
+        all_muscles = {muscle for muscles in BODY_PARTS.values() for muscle in muscles}
+        
+        assert set(EXERCISES_BY_MUSCLE) == all_muscles
+        for exercise in EXERCISES:
+            assert set(exercise) == {"name", "primary_muscle", "secondary_muscles", "equipment", "instructions"}
+            assert set(exercise["secondary_muscles"]) <= all_muscles
+            assert 2 <= len(exercise["instructions"]) <= 4
+    
+    def test_find_catalog_exercises(self):
+        """Exercises are grouped by muscle in the order given; unknown muscles are reported"""
+        from backend.exerciseCatalog import find_catalog_exercises
+        exercises, missing = find_catalog_exercises(["Triceps", "Biceps", "Neck"])
+        
+        primaries = [exercise["primary_muscle"] for exercise in exercises]
+        assert primaries == sorted(primaries, key=["Triceps", "Biceps"].index)
+        assert set(primaries) == {"Triceps", "Biceps"}
+        assert missing == ["Neck"]
+    
+    @patch('backend.getExercises.EXERCISE_SOURCE', 'catalog')
+    @patch('backend.getExercises.client')
+    def test_catalog_mode_skips_openai(self, mock_client):
+        """A fully covered selection is answered without calling OpenAI"""
+        exercises = generate_exercises(["Arms", "Legs"], ["Biceps", "Quads"])
+        
+        assert {exercise["primary_muscle"] for exercise in exercises} == {"Biceps", "Quads"}
+        mock_client.chat.completions.create.assert_not_called()
+    
+    @patch('backend.getExercises.EXERCISE_SOURCE', 'catalog')
+    @patch('backend.getExercises.client')
+    def test_catalog_mode_fills_gaps_from_openai(self, mock_client):
+        """Muscles missing from the catalog are requested from OpenAI, alone"""
+        import backend.getExercises as get_exercises
+        # getExercises imports the catalog as a top-level module
+        catalog = sys.modules[get_exercises.find_catalog_exercises.__module__]
+        _openai_exercises(mock_client, "Generated Triceps Move")
+        
+        with patch.dict(catalog.EXERCISES_BY_MUSCLE, {"Triceps": []}):
+            exercises = generate_exercises(["Arms", "Legs"], ["Biceps", "Triceps"])
+        
+        assert exercises[-1] == {"name": "Generated Triceps Move"}
+        assert {exercise.get("primary_muscle") for exercise in exercises[:-1]} == {"Biceps"}
+        prompt = mock_client.chat.completions.create.call_args[1]["messages"][0]["content"]
+        assert "Body parts: Arms\n" in prompt
+        assert "Muscles: Triceps\n" in prompt
+
+
+# ============================================
+# RECIPE CACHE TESTS
+# ============================================
+
+def _openai_recipe(mock_client, name, calories=500):
+    """Make the mocked OpenAI client return one recipe"""
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock()]
+    mock_response.choices[0].message.content = json.dumps({
+        "name": name, "meal_type": "lunch", "calories": calories,
+        "ingredients": ["rice"], "instructions": "Cook it."
+    })
+    mock_client.chat.completions.create.return_value = mock_response
+
+
+class TestRecipeCache:
+    """Test pooling of generated recipes per canonical request"""
+    
+    def _plan(self, **overrides):
+        params = dict(goal="bulking", diet="none", meal_type="lunch", calorie_target="600",
+                      cooking_time="quick", have_ingredients="rice, eggs", avoid_ingredients="")
+        params.update(overrides)
+        return generate_day_plan(**params)
+    
+    def test_cache_key_is_canonical(self):
+        """Equivalent requests share a key; different choices don't"""
+        from backend.recipeSuggestions.suggest import recipe_cache_key, normalize_ingredients
+        key = recipe_cache_key("bulking", "vegan", "lunch", "quick", 610, "Rice,  eggs", "nuts")
+        
+        assert normalize_ingredients(" Eggs;rice\nrice ,") == ["eggs", "rice"]
+        assert key == recipe_cache_key("bulking", "vegan", "lunch", "quick", 590, "eggs, RICE", "Nuts ")
+        assert key != recipe_cache_key("bulking", "vegan", "lunch", "quick", 700, "rice, eggs", "nuts")
+        assert key != recipe_cache_key("bulking", "vegan", "dinner", "quick", 600, "rice, eggs", "nuts")
+    
+    @patch('backend.recipeSuggestions.suggest.client')
+    def test_pool_fills_then_rotates(self, mock_client, monkeypatch):
+        """The first pool_size requests call OpenAI, later ones reuse those recipes"""
+        import backend.recipeSuggestions.suggest as suggest
+        monkeypatch.setattr(suggest.recipe_cache, "pool_size", 2)
+        
+        _openai_recipe(mock_client, "Egg Fried Rice")
+        first = self._plan()
+        _openai_recipe(mock_client, "Rice Bowl")
+        second = self._plan(have_ingredients="Eggs,rice", calorie_target="620")
+        served = {self._plan()["meals"][0]["name"] for _ in range(20)}
+        
+        assert first["meals"][0]["name"] == "Egg Fried Rice"
+        assert second["meals"][0]["name"] == "Rice Bowl"
+        assert served == {"Egg Fried Rice", "Rice Bowl"}
+        assert mock_client.chat.completions.create.call_count == 2
+        
+        stats = suggest.get_recipe_cache_stats()
+        assert stats["hits"] == 20
+        assert stats["misses"] == 2
+        assert stats["hit_rate"] == 20 / 22
+    
+    @patch('backend.recipeSuggestions.suggest.client')
+    def test_fallback_recipe_is_not_cached(self, mock_client):
+        """Invalid JSON from OpenAI gives the fallback meal without pooling it"""
+        import backend.recipeSuggestions.suggest as suggest
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = "not json"
+        mock_client.chat.completions.create.return_value = mock_response
+        
+        assert self._plan()["meals"][0]["name"] == "Fallback Meal"
+        _openai_recipe(mock_client, "Egg Fried Rice")
+        assert self._plan()["meals"][0]["name"] == "Egg Fried Rice"
+        assert suggest.get_recipe_cache_stats()["misses"] == 2
+    
+    def test_expired_pool_is_refilled(self):
+        """Pools expire ttl seconds after their first result"""
+        from backend.cache import PoolCache, MemoryCacheBackend
+        backend = MemoryCacheBackend()
+        cache = PoolCache(backend, ttl=60, pool_size=1)
+        backend.set("key", ["old"], datetime.utcnow() - timedelta(seconds=61))
+        
+        assert cache.get_or_add("key", lambda: "new") == "new"
+        assert cache.get_or_add("key", lambda: "newer") == "new"
+        assert backend.get("key")[0] == ["new"]
+    
+    def test_concurrent_misses_all_pooled(self):
+        """Results computed by concurrent misses are all added to the pool"""
+        import threading
+        from backend.cache import PoolCache, MemoryCacheBackend
+        backend = MemoryCacheBackend()
+        cache = PoolCache(backend, ttl=60, pool_size=5)
+        barrier = threading.Barrier(4)
+        
+        def compute(i):
+            barrier.wait()
+            return f"recipe{i}"
+        
+        threads = [
+            threading.Thread(target=cache.get_or_add, args=("key", lambda i=i: compute(i)))
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sorted(backend.get("key")[0]) == ["recipe0", "recipe1", "recipe2", "recipe3"]
+    
+    def test_mongo_backend_appends_atomically(self):
+        """The shared backend pushes onto the stored pool, capped, and restarts expired pools"""
+        from backend.cache import MongoCacheBackend
+        collection = mongomock.MongoClient()["spotter-db"]["recipe_cache"]
+        backend = MongoCacheBackend(collection)
+        now = datetime(2025, 1, 1, 12, 0)
+        
+        for value in ("a", "b", "c"):
+            backend.append("key", value, now, 2, now - timedelta(seconds=60))
+        assert backend.get("key") == (["a", "b"], now)
+        
+        later = now + timedelta(seconds=61)
+        backend.append("key", "d", later, 2, later - timedelta(seconds=60))
+        assert backend.get("key") == (["d"], later)
+
+
+# ============================================
+# BACKGROUND JOB TESTS
+# ============================================
+
+class TestBackgroundJobs:
+    """Test background jobs for the OpenAI-backed endpoints"""
+    
+    def test_runner_limits_concurrency_per_kind(self):
+        """No more than the configured number of jobs of a kind run at once"""
+        import threading
+        from backend.jobs import JobRunner
+        runner = JobRunner({"slow": 2, "other": 1})
+        running, peak, lock = [0], [0], threading.Lock()
+        release = threading.Event()
+        
+        def work(i):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+            return i * 2
+        
+        job_ids = [runner.submit("slow", "a@bu.edu", work, i) for i in range(5)]
+        other_id = runner.submit("other", "a@bu.edu", lambda: "fast")
+        assert runner.get(other_id, "a@bu.edu", wait=5)["result"] == "fast"
+        assert runner.get_stats()["slow"] == 5
+        
+        release.set()
+        results = [runner.get(job_id, "a@bu.edu", wait=5) for job_id in job_ids]
+        runner.shutdown()
+        
+        assert peak[0] == 2
+        assert [job["status"] for job in results] == ["done"] * 5
+        assert [job["result"] for job in results] == [0, 2, 4, 6, 8]
+    
+    def test_runner_records_failures_and_owner(self):
+        """Failed jobs keep their error; other users can't see a job"""
+        from backend.jobs import JobRunner
+        runner = JobRunner({"slow": 1})
+        
+        def fail():
+            raise RuntimeError("OpenAI timed out")
+        
+        job_id = runner.submit("slow", "a@bu.edu", fail)
+        job = runner.get(job_id, "a@bu.edu", wait=5)
+        
+        assert job["status"] == "failed"
+        assert job["error"] == "OpenAI timed out"
+        assert runner.get(job_id, "b@bu.edu") is None
+        assert runner.get("missing", "a@bu.edu") is None
+        runner.shutdown()
+    
+    def test_runner_bounds_pending_jobs(self):
+        """A kind with max_pending unfinished jobs rejects new ones"""
+        import threading
+        from backend.jobs import JobRunner, JobQueueFull
+        runner = JobRunner({"slow": 1}, max_pending=2)
+        release = threading.Event()
+        
+        runner.submit("slow", "a@bu.edu", release.wait, 5)
+        runner.submit("slow", "a@bu.edu", release.wait, 5)
+        with pytest.raises(JobQueueFull):
+            runner.submit("slow", "a@bu.edu", release.wait, 5)
+        
+        release.set()
+        runner.shutdown()
+    
+    def test_runner_forgets_old_results(self):
+        """Finished jobs are dropped after result_ttl"""
+        from backend.jobs import JobRunner
+        runner = JobRunner({"slow": 1}, result_ttl=60)
+        job_id = runner.submit("slow", "a@bu.edu", lambda: 1)
+        runner.get(job_id, "a@bu.edu", wait=5)
+        
+        runner._jobs[job_id]["finished_at"] -= timedelta(seconds=61)
+        runner.submit("slow", "a@bu.edu", lambda: 2)
+        
+        assert runner.get(job_id, "a@bu.edu") is None
+        runner.shutdown()
+    
+    def test_async_exercise_request_and_poll(self, client, app_globals):
+        """?async=1 returns a job id whose result matches the synchronous response"""
+        mock_generate = MagicMock(return_value=[{"name": "Bicep Curl"}])
+        with patch.dict(app_globals, {"generate_exercises": mock_generate}):
+            res = client.post('/api/generate_exercises?async=1',
+                              json={"bodyParts": ["Arms"], "muscles": ["Biceps"]},
+                              headers={'Authorization': 'Bearer token'})
+            assert res.status_code == 202
+            job_id = res.get_json()["job_id"]
+            assert res.get_json()["poll_url"] == f"/api/jobs/{job_id}"
+            
+            res = client.get(f'/api/jobs/{job_id}?wait=5', headers={'Authorization': 'Bearer token'})
+        
+        body = res.get_json()
+        assert res.status_code == 200
+        assert body["status"] == "done"
+        assert body["result"] == {"success": True, "exercises": [{"name": "Bicep Curl"}]}
+        assert body["result_status"] == 200
+        mock_generate.assert_called_once_with(["Arms"], ["Biceps"])
+    
+    def test_async_job_keeps_validation_errors(self, client, app_globals):
+        """A job for an invalid request reports the same 400 body"""
+        res = client.post('/api/generate_exercises?async=1', json={"bodyParts": [], "muscles": []},
+                          headers={'Authorization': 'Bearer token'})
+        job_id = res.get_json()["job_id"]
+        res = client.get(f'/api/jobs/{job_id}?wait=5', headers={'Authorization': 'Bearer token'})
+        
+        assert res.get_json()["result_status"] == 400
+        assert res.get_json()["result"]["errorType"] == "NoBodyPartsSelected"
+    
+    def test_async_find_classes_and_recipe(self, client, app_globals):
+        """Class searches and recipe plans can also run as jobs"""
+        with patch.dict(app_globals, {
+            "find_classes": MagicMock(return_value=[{"name": "Spin"}]),
+            "generate_day_plan": MagicMock(return_value={"meals": [], "total_calories": 0})
+        }):
+            classes_job = client.post('/find-classes?async=true', json={"campus": "off", "categories": ["cycling"]},
+                                      headers={'Authorization': 'Bearer token'}).get_json()["job_id"]
+            recipe_job = client.post('/api/recipe-plan?async=1', json={"goal": "bulking"},
+                                     headers={'Authorization': 'Bearer token'}).get_json()["job_id"]
+            classes = client.get(f'/api/jobs/{classes_job}?wait=5', headers={'Authorization': 'Bearer token'})
+            recipe = client.get(f'/api/jobs/{recipe_job}?wait=5', headers={'Authorization': 'Bearer token'})
+        
+        assert classes.get_json()["result"] == {"success": True, "classes": [{"name": "Spin"}]}
+        assert recipe.get_json()["result"] == {"meals": [], "total_calories": 0}
+    
+    def test_job_is_private_to_its_owner(self, client, app_globals):
+        """Another user polling the job id gets a 404"""
+        with patch.dict(app_globals, {"generate_exercises": MagicMock(return_value=[])}):
+            res = client.post('/api/generate_exercises?async=1', json={"bodyParts": ["Arms"], "muscles": ["Biceps"]},
+                              headers={'Authorization': 'Bearer token'})
+        job_id = res.get_json()["job_id"]
+        
+        with patch.dict(app_globals, {"validate_token": MagicMock(return_value=(True, "other@bu.edu"))}):
+            res = client.get(f'/api/jobs/{job_id}', headers={'Authorization': 'Bearer token'})
+        assert res.status_code == 404
+    
+    def test_full_queue_returns_503(self, client, app_globals):
+        """Submitting past the pending limit is rejected"""
+        # The app's own JobRunner, so it raises the JobQueueFull the route catches
+        runner = app_globals["JobRunner"]({"generate_exercises": 1}, max_pending=0)
+        with patch.dict(app_globals, {"llm_jobs": runner}):
+            res = client.post('/api/generate_exercises?async=1', json={"bodyParts": ["Arms"], "muscles": ["Biceps"]},
+                              headers={'Authorization': 'Bearer token'})
+        assert res.status_code == 503
+    
+    def test_invalid_wait(self, client, app_globals):
+        """A non-numeric wait is rejected"""
+        res = client.get('/api/jobs/abc?wait=soon', headers={'Authorization': 'Bearer token'})
+        assert res.status_code == 400
+
+
+# ============================================
+# SINGLE-FLIGHT REQUEST COALESCING TESTS
+# ============================================
+
+def _slow(value, started, release):
+    """A MagicMock side effect that signals it started and blocks until released"""
+    def call(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return call
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent identical OpenAI requests"""
+    
+    def _coalesce(self, flight, key, fn, count=8):
+        """Start one call, then count - 1 more with the same key while the first is in flight"""
+        import concurrent.futures
+        import threading
+        import time
+        started, release = threading.Event(), threading.Event()
+        mock_fn = MagicMock(side_effect=_slow(fn, started, release))
+        
+        def call():
+            return flight.do(key, mock_fn)
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=count) as pool:
+            first = pool.submit(call)
+            started.wait(5)
+            others = [pool.submit(call) for _ in range(count - 1)]
+            for _ in range(100):
+                if flight.get_stats()["coalesced"] >= count - 1:
+                    break
+                time.sleep(0.01)
+            release.set()
+            outcomes = []
+            for future in [first] + others:
+                try:
+                    outcomes.append(future.result(timeout=5))
+                except Exception as e:
+                    outcomes.append(e)
+        return mock_fn, outcomes
+    
+    def test_concurrent_calls_share_one_result(self):
+        """Callers arriving while a call is in flight get its result"""
+        from backend.cache import SingleFlight
+        flight = SingleFlight()
+        mock_fn, outcomes = self._coalesce(flight, "Arms/Biceps", ["curl"])
+        
+        assert mock_fn.call_count == 1
+        assert outcomes == [["curl"]] * 8
+        assert flight.get_stats() == {"calls": 1, "coalesced": 7}
+    
+    def test_errors_are_shared_and_not_remembered(self):
+        """Every waiter gets the exception; the next call runs again"""
+        from backend.cache import SingleFlight
+        flight = SingleFlight()
+        mock_fn, outcomes = self._coalesce(flight, "key", RuntimeError("rate limited"), count=3)
+        
+        assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+        assert flight.do("key", lambda: "ok") == "ok"
+        assert flight.get_stats()["calls"] == 2
+    
+    def test_finished_calls_are_not_shared(self):
+        """Only callers that overlap an in-flight call share it"""
+        from backend.cache import SingleFlight
+        flight = SingleFlight()
+        
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("a", lambda: 2) == 2
+        assert flight.do("b", lambda: 3) == 3
+        assert flight.get_stats() == {"calls": 3, "coalesced": 0}
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_find_classes_off_campus_coalesces(self, mock_search):
+        """Concurrent off-campus searches for the same categories (any order) make one call"""
+        import threading
+        import backend.findClasses as find_classes_module
+        started, release = threading.Event(), threading.Event()
+        mock_search.side_effect = _slow([{"name": "Studio"}], started, release)
+        before = find_classes_module.off_campus_requests.get_stats()
+        
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            first = pool.submit(find_classes, "off", ["yoga", "boxing"])
+            started.wait(5)
+            others = [pool.submit(find_classes, "off", ["Boxing", "yoga"]) for _ in range(3)]
+            for _ in range(100):
+                if find_classes_module.off_campus_requests.get_stats()["coalesced"] - before["coalesced"] >= 3:
+                    break
+                threading.Event().wait(0.01)
+            release.set()
+            results = [future.result(timeout=5) for future in [first] + others]
+        
+        assert results == [[{"name": "Studio"}]] * 4
+        assert mock_search.call_count == 1
+        assert find_classes_module.off_campus_requests.get_stats()["coalesced"] - before["coalesced"] == 3
+    
+    @patch('backend.getExercises._request_exercises')
+    def test_generate_exercises_coalesces_without_cache(self, mock_request, monkeypatch):
+        """Identical concurrent selections share one OpenAI call even with caching off"""
+        import threading
+        import backend.getExercises as get_exercises
+        monkeypatch.setattr(get_exercises, "exercise_cache", None)
+        started, release = threading.Event(), threading.Event()
+        mock_request.side_effect = _slow([{"name": "Curl"}], started, release)
+        coalesced_before = get_exercises.exercise_requests.get_stats()["coalesced"]
+        
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+            first = pool.submit(generate_exercises, ["Arms"], ["Biceps"])
+            started.wait(5)
+            others = [pool.submit(generate_exercises, ["Arms"], ["Biceps", "Biceps"]) for _ in range(2)]
+            for _ in range(100):
+                if get_exercises.exercise_requests.get_stats()["coalesced"] - coalesced_before >= 2:
+                    break
+                threading.Event().wait(0.01)
+            release.set()
+            results = [future.result(timeout=5) for future in [first] + others]
+        
+        assert results == [[{"name": "Curl"}]] * 3
+        assert mock_request.call_count == 1
+
+
+# ============================================
+# OFF-CAMPUS CLASS CACHE TESTS
+# ============================================
+
+class TestOffCampusClassCache:
+    """Test the per-category cache of off-campus class searches"""
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_results_are_cached_per_category(self, mock_search):
+        """A later search is assembled from cached categories without calling OpenAI"""
+        mock_search.return_value = [
+            {"name": "Flow Studio", "category": "Yoga"},
+            {"name": "Spin City", "category": "cycling"},
+            {"name": "Box Gym", "category": "boxing"}
+        ]
+        first = find_classes("off", ["yoga", "cycling"])
+        
+        mock_search.reset_mock()
+        assert {c["name"] for c in find_classes("off", ["cycling"])} == {"Spin City"}
+        assert {c["name"] for c in find_classes("off", ["Yoga", "cycling"])} == {"Flow Studio", "Spin City"}
+        mock_search.assert_not_called()
+        assert len(first) == 3
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_only_missing_categories_are_requested(self, mock_search):
+        """Cached categories are reused and one call fetches the rest"""
+        from backend.findClasses import cache_classes
+        cache_classes([{"name": "Flow Studio", "category": "yoga"}], ["yoga"])
+        mock_search.return_value = [{"name": "Dance Hall", "category": "dance"}]
+        
+        classes = find_classes("off", ["yoga", "dance", "boxing"])
+        
+        mock_search.assert_called_once_with(["boxing", "dance"])
+        assert {c["name"] for c in classes} == {"Flow Studio", "Dance Hall"}
+        mock_search.reset_mock()
+        mock_search.return_value = [{"name": "Box Gym", "category": "boxing"}]
+        assert find_classes("off", ["boxing"]) == [{"name": "Box Gym", "category": "boxing"}]
+        mock_search.assert_called_once_with(["boxing"])
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_unmatched_categories_are_not_cached_empty(self, mock_search):
+        """A category no class label matched is requested alone later, not served as []"""
+        mock_search.return_value = [
+            {"name": "Flow Studio", "category": "yoga"},
+            {"name": "Iron Works", "category": "Strength & Conditioning"}
+        ]
+        find_classes("off", ["yoga", "strength conditioning"])
+        
+        mock_search.reset_mock()
+        mock_search.return_value = [{"name": "Iron Works", "category": "Strength & Conditioning"}]
+        assert [c["name"] for c in find_classes("off", ["strength conditioning"])] == ["Iron Works"]
+        mock_search.assert_called_once_with(["strength conditioning"])
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_category_labels_match_loosely(self, mock_search):
+        """Labels differing only in case and separators are cached under the category"""
+        mock_search.return_value = [
+            {"name": "Flow Studio", "category": "Yoga "},
+            {"name": "Iron Works", "category": "Strength-Conditioning"}
+        ]
+        find_classes("off", ["yoga", "strength conditioning"])
+        
+        mock_search.reset_mock()
+        assert [c["name"] for c in find_classes("off", ["strength conditioning"])] == ["Iron Works"]
+        mock_search.assert_not_called()
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_mongo_cache_read_with_one_query(self, mock_search, monkeypatch):
+        """With the Mongo backend, a search reads all its categories with one find"""
+        import backend.findClasses as find_classes_module
+        from backend.cache import MongoCacheBackend
+        collection = mongomock.MongoClient()["spotter-db"].class_cache
+        monkeypatch.setattr(find_classes_module, "class_cache_backend", MongoCacheBackend(collection))
+        mock_search.return_value = [
+            {"name": "Flow Studio", "category": "yoga"},
+            {"name": "Spin City", "category": "cycling"}
+        ]
+        find_classes("off", ["yoga", "cycling"])
+        mock_search.reset_mock()
+        
+        with patch.object(collection, "find", wraps=collection.find) as find, \
+             patch.object(collection, "find_one", wraps=collection.find_one) as find_one:
+            classes = find_classes("off", ["yoga", "cycling"])
+        
+        assert {c["name"] for c in classes} == {"Flow Studio", "Spin City"}
+        find.assert_called_once_with({"_id": {"$in": ["cycling", "yoga"]}})
+        find_one.assert_not_called()
+        mock_search.assert_not_called()
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_expired_and_failed_searches(self, mock_search, monkeypatch):
+        """Entries past CLASS_CACHE_TTL are refetched; failed (empty) searches aren't cached"""
+        import backend.findClasses as find_classes_module
+        find_classes_module.class_cache_backend.set(
+            "yoga", [{"name": "Old Studio"}],
+            datetime.utcnow() - timedelta(seconds=find_classes_module.CLASS_CACHE_TTL + 1)
+        )
+        mock_search.return_value = []
+        
+        assert find_classes("off", ["yoga"]) == []
+        assert find_classes("off", ["yoga"]) == []
+        assert mock_search.call_count == 2
+    
+    @patch('backend.findClasses.search_off_campus_exercise')
+    def test_warm_class_cache(self, mock_search):
+        """Warming fetches each uncached category on its own"""
+        from backend.findClasses import warm_class_cache, cache_classes, CATEGORIES
+        cache_classes([{"name": "Flow Studio", "category": "yoga"}], ["yoga"])
+        mock_search.side_effect = lambda categories: [{"name": f"{categories[0]} place", "category": "Other"}]
+        
+        fetched = warm_class_cache()
+        
+        assert fetched == [category for category in CATEGORIES if category != "yoga"]
+        assert all(call[0][0] == [call[0][0][0]] for call in mock_search.call_args_list)
+        mock_search.reset_mock()
+        assert find_classes("off", ["boxing"]) == [{"name": "boxing place", "category": "Other"}]
+        mock_search.assert_not_called()
+        assert warm_class_cache(["yoga"], force=True) == ["yoga"]
+    
+    def test_warm_class_cache_command(self, capsys):
+        """manage.py warm-class-cache passes the categories through"""
+        import backend.manage as manage
+        with patch.object(manage, "warm_class_cache", return_value=["yoga"]) as mock_warm:
+            manage.main(["warm-class-cache", "--category", "yoga", "--force"])
+        mock_warm.assert_called_once_with(["yoga"], force=True)
+        assert "yoga" in capsys.readouterr().out
+
+
+# ============================================
+# COMPILED FITREC SCHEDULE TESTS
+# ============================================
+
+class TestFitRecSchedule:
+    """Test the precompiled FitRec schedule index"""
+    
+    def test_parse_time_range(self):
+        """Start times take the end's am/pm unless that puts them after the end"""
+        from backend.findClasses import parse_time_range, standardize_time
+        
+        assert parse_time_range("5:30–6:30p") == (17 * 60 + 30, 18 * 60 + 30)
+        assert parse_time_range("12:00–1pm") == (12 * 60, 13 * 60)
+        assert parse_time_range("11:30–12:30p") == (11 * 60 + 30, 12 * 60 + 30)
+        assert parse_time_range("10:30–11:15a") == (10 * 60 + 30, 11 * 60 + 15)
+        assert parse_time_range("9-10am") == (9 * 60, 10 * 60)
+        assert parse_time_range("noon") is None
+        assert standardize_time("6:00-6:45p") == "18:00-18:45"
+    
+    def test_index_matches_schedule(self):
+        """Every scheduled class is compiled once, with category and structured times"""
+        from backend.findClasses import FITREC_SCHEDULE, _fitrec_index, infer_category
+        classes = _fitrec_index["classes"]
+        
+        assert len(classes) == sum(len(day) for day in FITREC_SCHEDULE.values())
+        assert all(record["category"] == infer_category(record["name"]) for record in classes)
+        assert all(record["start_minute"] < record["end_minute"] for record in classes)
+        assert [record["time"] for record in classes] == [
+            time_str for day in FITREC_SCHEDULE.values() for time_str, _ in day
+        ]
+        for records, starts in _fitrec_index["by_day"].values():
+            assert list(starts) == sorted(starts)
+        with pytest.raises(TypeError):
+            classes[0]["name"] = "Changed"
+    
+    def test_on_campus_lookup_matches_filter(self):
+        """Category lookups give the same classes, in order, as filtering the whole schedule"""
+        from backend.findClasses import format_fitrec_classes
+        everything = format_fitrec_classes()
+        
+        for categories in (["yoga"], ["Cycling", "dance"], ["yoga", "pilates", "boxing"]):
+            expected = [c for c in everything if c["category"] in [x.lower() for x in categories]]
+            assert find_classes("on", categories) == expected
+        json.dumps(everything)
+    
+    def test_classes_starting_soon(self):
+        """Classes starting in the next N minutes, across midnight and by category"""
+        from backend.findClasses import get_classes_starting_soon
+        monday_evening = datetime(2025, 11, 17, 17, 40)
+        
+        soon = get_classes_starting_soon(30, now=monday_evening)
+        assert [(c["name"], c["start"]) for c in soon] == [("Sunset Spin", "17:45"), ("Barre Pilates Fusion", "18:00")]
+        
+        yoga = get_classes_starting_soon(60, categories=["yoga"], now=monday_evening)
+        assert [c["name"] for c in yoga] == ["Core Intensive Yoga"]
+        
+        late_saturday = datetime(2025, 11, 15, 23, 0)
+        assert [c["name"] for c in get_classes_starting_soon(12 * 60, now=late_saturday)] == [
+            "Spin the Decades", "Total Body Dumbell"
+        ]
+    
+    def test_classes_starting_soon_window_is_capped(self):
+        """A window longer than MAX_STARTING_WITHIN lists each class once, within a day"""
+        from backend.findClasses import get_classes_starting_soon, MAX_STARTING_WITHIN
+        monday_evening = datetime(2025, 11, 17, 17, 40)
+        
+        capped = get_classes_starting_soon(MAX_STARTING_WITHIN, now=monday_evening)
+        huge = get_classes_starting_soon(30 * 24 * 60, now=monday_evening)
+        
+        assert huge == capped
+        assert len({(c["day"], c["start"], c["name"]) for c in huge}) == len(huge)
+    
+    @patch('backend.findClasses.datetime')
+    def test_classes_starting_soon_uses_fitrec_timezone(self, mock_datetime):
+        """The current time is read in FITREC_TIMEZONE, not the server's timezone"""
+        import backend.findClasses as find_classes_module
+        mock_datetime.now.return_value = datetime(2025, 11, 17, 17, 40)
+        
+        find_classes_module.get_classes_starting_soon(30)
+        
+        mock_datetime.now.assert_called_once_with(find_classes_module.FITREC_TIMEZONE)
+        assert str(find_classes_module.FITREC_TIMEZONE) == "America/New_York"
+    
+    @patch('backend.findClasses.datetime')
+    def test_find_classes_starting_within(self, mock_datetime):
+        """find_classes passes starting_within through and rejects bad values"""
+        mock_datetime.now.return_value = datetime(2025, 11, 17, 17, 40)
+        
+        assert [c["name"] for c in find_classes("on", ["cycling"], starting_within="30")] == ["Sunset Spin"]
+        with pytest.raises(ValueError):
+            find_classes("on", ["cycling"], starting_within="soon")
+    
+    def test_find_classes_route_starting_within(self, client, app_globals):
+        """The route passes startingWithin to find_classes"""
+        mock_find = MagicMock(return_value=[])
+        with patch.dict(app_globals, {"find_classes": mock_find}):
+            res = client.post('/find-classes', json={"campus": "on", "categories": ["yoga"], "startingWithin": 45},
+                              headers={'Authorization': 'Bearer token'})
+        
+        assert res.status_code == 200
+        mock_find.assert_called_once_with("on", ["yoga"], starting_within=45)
+
+
+# ============================================
+# FITREC SCHEDULE FILE AND HOT RELOAD TESTS
+# ============================================
+
+@pytest.fixture
+def schedule_file(tmp_path, monkeypatch):
+    """A temporary schedule file loaded into findClasses, checked for changes on every read"""
+    import backend.findClasses as find_classes_module
+    path = tmp_path / "schedule.json"
+    
+    def write(classes, mtime_offset=0):
+        path.write_text(json.dumps({"semester": "Test", "schedule": classes}), encoding="utf-8")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset))
+    
+    write({"Monday": [{"time": "5:30–6:30p", "name": "Vinyasa Yoga"}]})
+    # monkeypatch restores the real schedule afterwards
+    for name in ("FITREC_SCHEDULE", "_fitrec_index", "_fitrec_mtime", "_fitrec_checked_at"):
+        monkeypatch.setattr(find_classes_module, name, getattr(find_classes_module, name))
+    monkeypatch.setattr(find_classes_module, "FITREC_SCHEDULE_FILE", str(path))
+    monkeypatch.setattr(find_classes_module, "FITREC_RELOAD_INTERVAL", 0)
+    find_classes_module.reload_fitrec_schedule(force=True)
+    yield find_classes_module, write
+
+
+class TestFitRecScheduleFile:
+    """Test loading the FitRec schedule from a file and hot reloading it"""
+    
+    def test_bundled_schedule_file(self):
+        """The shipped schedule file covers every day of the week"""
+        from backend.findClasses import load_schedule, FITREC_SCHEDULE_FILE, DAYS
+        schedule = load_schedule(FITREC_SCHEDULE_FILE)
+        assert set(schedule) == set(DAYS)
+        assert ("5:30–6:30p", "Vinyasa Yoga") in schedule["Monday"]
+    
+    def test_load_csv_schedule(self, tmp_path):
+        """CSV files with day,time,name columns load in file order"""
+        from backend.findClasses import load_schedule
+        path = tmp_path / "schedule.csv"
+        path.write_text("day,time,name\nmonday,5:30–6:30p,Vinyasa Yoga\nMonday,6:00–7:00p, Zumba\n", encoding="utf-8")
+        
+        assert load_schedule(str(path)) == {"Monday": [("5:30–6:30p", "Vinyasa Yoga"), ("6:00–7:00p", "Zumba")]}
+    
+    def test_invalid_schedule_is_rejected(self, tmp_path):
+        """Unknown days and missing fields raise ValueError"""
+        from backend.findClasses import load_schedule
+        path = tmp_path / "schedule.json"
+        path.write_text(json.dumps({"schedule": {"Funday": [{"time": "1-2p", "name": "Yoga"}]}}), encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_schedule(str(path))
+        path.write_text(json.dumps({"schedule": {"Monday": [{"name": "Yoga"}]}}), encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_schedule(str(path))
+    
+    def test_changed_file_is_reloaded(self, schedule_file):
+        """Editing the file changes search results without a restart"""
+        module, write = schedule_file
+        assert [c["name"] for c in find_classes("on", ["yoga"])] == ["Vinyasa Yoga"]
+        
+        write({"Tuesday": [{"time": "9:30–10:30a", "name": "Hatha Yoga"}, {"time": "5:30–6:30p", "name": "Zumba"}]},
+              mtime_offset=1_000_000_000)
+        
+        assert [c["name"] for c in find_classes("on", ["yoga"])] == ["Hatha Yoga"]
+        assert [c["day"] for c in find_classes("on", ["dance"])] == ["Tuesday"]
+        assert module.FITREC_SCHEDULE == {"Tuesday": [("9:30–10:30a", "Hatha Yoga"), ("5:30–6:30p", "Zumba")]}
+    
+    def test_unchanged_file_is_not_reloaded(self, schedule_file):
+        """Reads only rebuild the index when the mtime changes"""
+        module, _ = schedule_file
+        index = module.get_fitrec_index()
+        assert module.reload_fitrec_schedule() is False
+        assert module.get_fitrec_index() is index
+    
+    def test_broken_file_keeps_current_schedule(self, schedule_file):
+        """A file that fails to load leaves the last good schedule in place"""
+        module, _ = schedule_file
+        path = module.FITREC_SCHEDULE_FILE
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+        
+        assert [c["name"] for c in find_classes("on", ["yoga"])] == ["Vinyasa Yoga"]
+    
+    def test_readers_never_see_a_partial_schedule(self, schedule_file):
+        """Concurrent reads during reloads always see one whole version of the schedule"""
+        import threading
+        module, write = schedule_file
+        versions = [
+            {day: [{"time": "5:30–6:30p", "name": f"{version} Yoga {day}"}] for day in module.DAYS}
+            for version in ("Old", "New")
+        ]
+        stop = threading.Event()
+        seen = []
+        
+        def read():
+            while not stop.is_set():
+                seen.append({c["name"].split()[0] for c in module.format_fitrec_classes()})
+        
+        reader = threading.Thread(target=read)
+        reader.start()
+        for i in range(30):
+            write(versions[i % 2], mtime_offset=(i + 1) * 1_000_000_000)
+            module.get_fitrec_index()
+        stop.set()
+        reader.join(timeout=10)
+        
+        assert seen
+        assert all(len(names) == 1 for names in seen)
+
+
+# ============================================
+# LAZY OPENAI CLIENT TESTS
+# ============================================
+
+class TestLazyOpenAIClient:
+    """Test that the OpenAI client is shared and only created when first used"""
+    
+    def test_backend_imports_without_openai(self):
+        """Importing the app neither imports openai nor needs an API key"""
+        import subprocess
+        backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+        env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+        env["PYTHONPATH"] = backend_dir
+        code = "import sys, findClasses, getExercises, recipeSuggestions.suggest; print('openai' in sys.modules)"
+        
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=60)
+        
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip().splitlines()[-1] == "False"
+    
+    def test_client_created_once_and_shared(self, monkeypatch):
+        """The first use builds one client that every module then shares"""
+        import backend.llm as llm
+        monkeypatch.setattr(llm, "_client", None)
+        with patch("openai.OpenAI") as mock_openai:
+            first = llm.get_openai_client()
+            second = llm.get_openai_client()
+        
+        mock_openai.assert_called_once_with(timeout=llm.OPENAI_TIMEOUT, max_retries=llm.OPENAI_MAX_RETRIES)
+        assert first is second is mock_openai.return_value
+    
+    def test_proxy_delegates_to_shared_client(self, monkeypatch):
+        """Attribute access on the lazy proxy goes to the shared client"""
+        import backend.llm as llm
+        shared = MagicMock()
+        monkeypatch.setattr(llm, "_client", shared)
+        
+        llm.openai_client.chat.completions.create(model="gpt-4o-mini")
+        
+        shared.chat.completions.create.assert_called_once_with(model="gpt-4o-mini")
+    
+    def test_close_resets_client(self, monkeypatch):
+        """Closing the client makes the next use create a new one"""
+        import backend.llm as llm
+        shared = MagicMock()
+        monkeypatch.setattr(llm, "_client", shared)
+        
+        llm.close_openai_client()
+        
+        shared.close.assert_called_once()
+        assert llm._client is None
+    
+    def test_patching_proxy_does_not_create_client(self, monkeypatch):
+        """mock.patch probes the proxy it replaces without building the client"""
+        import backend.llm as llm
+        monkeypatch.setattr(llm, "_client", None)
+        with patch("openai.OpenAI") as mock_openai:
+            with patch.object(llm, "openai_client") as mock_client:
+                assert llm.openai_client is mock_client
+        
+        mock_openai.assert_not_called()
+        assert llm._client is None
+
+
+# ============================================
+# DEFERRED INDEX CREATION AND CLIENT SETTINGS TESTS
+# ============================================
+
+class TestEnsureIndexes:
+    """Test explicit index creation and the lazily connected MongoClient"""
+    
+    @pytest.fixture
+    def index_db(self, monkeypatch):
+        """Point every indexed collection at a fresh mongomock database"""
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        monkeypatch.setattr(mongo, "db", mock_db)
+        for name in ("users", "sessions", "challenges", "workouts", "friend_requests", "friendships",
+                     "likes", "comments", "challenge_invitations", "challenge_participants",
+                     "challenge_progress", "timelines"):
+            monkeypatch.setattr(mongo, name, mock_db[name])
+        return mock_db
+    
+    def test_creates_indexes(self, index_db):
+        """Uniqueness and feed indexes exist after ensure_indexes"""
+        mongo.ensure_indexes()
+        
+        assert index_db.users.index_information()["email_1"]["unique"] is True
+        assert index_db.sessions.index_information()["expires_at_1"]["expireAfterSeconds"] == 0
+        assert "created_at_-1_id_-1" in index_db.workouts.index_information()
+        assert index_db.challenge_invitations.index_information()["challenge_id_1_invitee_email_1"]["unique"] is True
+        assert "owner_1_created_at_-1_post_id_-1" in index_db.timelines.index_information()
+        assert index_db.challenge_participants.index_information()["challenge_id_1_participant_email_1"]["unique"] is True
+        assert "challenge_id_1_progress_-1_participant_email_1" in index_db.challenge_progress.index_information()
+    
+    def test_creates_cache_ttl_indexes(self, index_db, monkeypatch):
+        """The mongo caches' TTL indexes are created up front with each cache's lifetime"""
+        monkeypatch.setattr(sys.modules["getExercises"], "EXERCISE_CACHE_TTL", 100)
+        monkeypatch.setattr(sys.modules["getExercises"], "EXERCISE_CACHE_STALE_TTL", 20)
+        monkeypatch.setattr(sys.modules["recipeSuggestions.suggest"], "RECIPE_CACHE_TTL", 300)
+        monkeypatch.setattr(sys.modules["findClasses"], "CLASS_CACHE_TTL", 400)
+        
+        mongo.ensure_indexes()
+        
+        assert index_db.exercise_cache.index_information()["stored_at_1"]["expireAfterSeconds"] == 120
+        assert index_db.recipe_cache.index_information()["stored_at_1"]["expireAfterSeconds"] == 300
+        assert index_db.class_cache.index_information()["stored_at_1"]["expireAfterSeconds"] == 400
+    
+    def test_changed_cache_ttl_updated_in_place(self, index_db, monkeypatch):
+        """A changed cache TTL is applied to the existing index with collMod"""
+        mock_db = MagicMock()
+        mock_db.recipe_cache.name = "recipe_cache"
+        mock_db.recipe_cache.index_information.return_value = {
+            "stored_at_1": {"key": [("stored_at", 1)], "expireAfterSeconds": 60}
+        }
+        monkeypatch.setattr(mongo, "db", mock_db)
+        monkeypatch.setattr(sys.modules["recipeSuggestions.suggest"], "RECIPE_CACHE_TTL", 300)
+        
+        mongo.ensure_cache_indexes()
+        
+        mock_db.command.assert_any_call(
+            "collMod", "recipe_cache",
+            index={"keyPattern": {"stored_at": 1}, "expireAfterSeconds": 300}
+        )
+        mock_db.recipe_cache.create_index.assert_not_called()
+    
+    def test_migrates_created_at(self, index_db, monkeypatch):
+        """ensure_indexes converts string created_at values so feed cursors match them"""
+        mock_migrate = MagicMock(return_value=(0, 0))
+        monkeypatch.setattr(mongo, "migrate_created_at_to_datetime", mock_migrate)
+        
+        mongo.ensure_indexes()
+        
+        mock_migrate.assert_called_once_with()
+    
+    def test_invalid_created_at_does_not_stop_indexes(self, index_db, capsys):
+        """A malformed created_at is reported while every index is still built"""
+        index_db.workouts.insert_one({"id": "w1", "created_at": "not a date"})
+        
+        mongo.ensure_indexes()
+        
+        assert "1 documents have a created_at" in capsys.readouterr().out
+        assert "owner_1_created_at_-1_post_id_-1" in index_db.timelines.index_information()
+    
+    def test_idempotent(self, index_db):
+        """Running ensure_indexes again changes nothing"""
+        mongo.ensure_indexes()
+        before = {name: index_db[name].index_information() for name in index_db.list_collection_names()}
+        
+        mongo.ensure_indexes()
+        
+        assert {name: index_db[name].index_information() for name in index_db.list_collection_names()} == before
+    
+    def test_import_does_not_connect(self):
+        """The client is created without connecting; importing db issues no queries"""
+        import subprocess
+        backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+        env = dict(os.environ, PYTHONPATH=backend_dir, MONGO_URI="mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=5000")
+        code = "import time; start = time.perf_counter(); import db; print(time.perf_counter() - start)"
+        
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=60)
+        
+        assert result.returncode == 0, result.stderr
+        assert float(result.stdout.strip().splitlines()[-1]) < 5
+    
+    def test_client_options_from_env(self):
+        """Only the MONGO_* settings that are set become client options"""
+        env = {"MONGO_MAX_POOL_SIZE": "20", "MONGO_SERVER_SELECTION_TIMEOUT_MS": "3000", "MONGO_MIN_POOL_SIZE": ""}
+        
+        assert mongo.mongo_client_options(env) == {"maxPoolSize": 20, "serverSelectionTimeoutMS": 3000}
+        assert mongo.mongo_client_options({}) == {}
+    
+    def test_manage_command(self):
+        """python manage.py ensure-indexes runs ensure_indexes"""
+        import backend.manage as manage
+        with patch.object(manage, "ensure_indexes") as mock_ensure:
+            manage.main(["ensure-indexes"])
+        mock_ensure.assert_called_once_with()
+
+
+# ============================================
+# BULK CHALLENGE INVITATION TESTS
+# ============================================
+
+class TestBulkChallengeInvitations:
+    """Test inviting many users to a challenge in one write"""
+    
+    @pytest.fixture
+    def invitations(self, monkeypatch):
+        """Indexed mongomock invitations collection, with the inviter as a user"""
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        monkeypatch.setattr(mongo, "challenge_invitations", mock_db.challenge_invitations)
+        mongo.challenge_invitations.create_index([("challenge_id", 1), ("invitee_email", 1)], unique=True)
+        mongo.users.insert_one({"email": "coach@bu.edu", "username": "Coach"})
+        return mock_db.challenge_invitations
+    
+    def test_invites_everyone(self, invitations):
+        """Every new invitee gets a pending invitation naming the inviter"""
+        emails = [f"student{i}@bu.edu" for i in range(200)]
+        
+        results = mongo.send_challenge_invitations("c1", "Floor Challenge", "coach@bu.edu", emails)
+        
+        assert results == [(email, True, "Invitation sent") for email in emails]
+        assert invitations.count_documents({"challenge_id": "c1", "status": "pending"}) == 200
+        assert invitations.find_one({"invitee_email": "student7@bu.edu"})["inviter_username"] == "Coach"
+    
+    def test_one_read_and_one_write(self, invitations):
+        """The inviter is looked up once and all invitations go in one insert_many"""
+        emails = [f"student{i}@bu.edu" for i in range(50)]
+        with patch.object(mongo.users, "find_one", wraps=mongo.users.find_one) as find_one, \
+             patch.object(invitations, "insert_many", wraps=invitations.insert_many) as insert_many, \
+             patch.object(invitations, "insert_one") as insert_one:
+            mongo.send_challenge_invitations("c1", "Floor Challenge", "coach@bu.edu", emails)
+        
+        find_one.assert_called_once()
+        insert_many.assert_called_once()
+        assert insert_many.call_args.kwargs["ordered"] is False
+        insert_one.assert_not_called()
+    
+    def test_already_invited_reported_per_invitee(self, invitations):
+        """Existing and repeated invitees fail without stopping the others"""
+        mongo.send_challenge_invitations("c1", "Floor Challenge", "coach@bu.edu", ["b@bu.edu"])
+        
+        results = mongo.send_challenge_invitations(
+            "c1", "Floor Challenge", "coach@bu.edu", ["a@bu.edu", "b@bu.edu", "c@bu.edu", "a@bu.edu"]
+        )
+        
+        assert results == [
+            ("a@bu.edu", True, "Invitation sent"),
+            ("b@bu.edu", False, "Already invited"),
+            ("c@bu.edu", True, "Invitation sent"),
+            ("a@bu.edu", False, "Already invited")
+        ]
+        assert invitations.count_documents({"challenge_id": "c1"}) == 3
+    
+    def test_database_error_fails_every_invitee(self, invitations):
+        """A failed write is reported for each invitee instead of raising"""
+        with patch.object(invitations, "insert_many", side_effect=Exception("db down")):
+            results = mongo.send_challenge_invitations("c1", "T", "coach@bu.edu", ["a@bu.edu", "b@bu.edu"])
+        
+        assert results == [("a@bu.edu", False, "db down"), ("b@bu.edu", False, "db down")]
+    
+    def test_single_invitation_uses_bulk_path(self, invitations):
+        """send_challenge_invitation keeps its (success, message) result"""
+        assert mongo.send_challenge_invitation("c1", "T", "coach@bu.edu", "a@bu.edu") == (True, "Invitation sent")
+        assert mongo.send_challenge_invitation("c1", "T", "coach@bu.edu", "a@bu.edu") == (False, "Already invited")
+    
+    def test_create_challenge_sends_one_batch(self):
+        """create_challenge invites all friends with one bulk call and reports each"""
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        next_week = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+        data = {
+            "challenge_type": "Time-Based",
+            "category": "Cardio",
+            "title": "Test",
+            "goal": "Test goal",
+            "start_date": tomorrow,
+            "end_date": next_week,
+            "description": "Valid description",
+            "privacy": "public",
+            "invited_friends": [" a@bu.edu", "", "b@bu.edu"]
+        }
+        with patch("backend.create_Challenge.add_challenge", return_value=True), \
+             patch("backend.create_Challenge.send_challenge_invitations") as mock_send:
+            mock_send.return_value = [("a@bu.edu", True, "Invitation sent"), ("b@bu.edu", False, "Already invited")]
+            success, response, status = create_challenge(data, creator_email="test@bu.edu")
+        
+        assert status == 201
+        assert mock_send.call_count == 1
+        assert mock_send.call_args.args[2:] == ("test@bu.edu", ["a@bu.edu", "b@bu.edu"])
+        assert response["invitations"] == [
+            {"friend": " a@bu.edu", "success": True, "message": "Invitation sent"},
+            {"friend": "b@bu.edu", "success": False, "message": "Already invited"}
+        ]
+
+
+# ============================================
+# BULK WORKOUT IMPORT TESTS
+# ============================================
+
+IMPORT_WORKOUT = {
+    "workout_name": "Morning Run",
+    "date": "2025-01-15",
+    "duration": 30,
+    "workout_type": "cardio",
+    "intensity": "medium",
+    "notes": "Imported from another tracker",
+    "privacy": "private",
+    "calories": 250
+}
+
+
+def _ndjson_records(count, bad_lines=()):
+    """Generate NDJSON lines, replacing the given line numbers with invalid workouts"""
+    for line_number in range(1, count + 1):
+        workout = dict(IMPORT_WORKOUT, duration=0) if line_number in bad_lines else IMPORT_WORKOUT
+        yield json.dumps(workout) + "\n"
+
+
+class TestWorkoutImport:
+    """Test streaming NDJSON/CSV workout imports saved in batches"""
+    
+    def test_read_ndjson(self):
+        """Blank lines are skipped and malformed lines become row errors"""
+        from backend.importWorkouts import read_records
+        lines = ['{"workout_name": "Run"}\n', "\n", "{not json\n", "[1, 2]\n"]
+        
+        rows = list(read_records(lines, "ndjson"))
+        
+        assert rows[0] == (1, {"workout_name": "Run"}, None)
+        assert [(line, record) for line, record, _ in rows[1:]] == [(3, None), (4, None)]
+        assert rows[1][2].startswith("Invalid JSON")
+        assert rows[2][2] == "Each line must be a JSON object"
+    
+    def test_read_csv(self):
+        """CSV rows are keyed by the header and numbered by file line"""
+        from backend.importWorkouts import read_records
+        lines = ["workout_name,duration\n", "Run,30\n", "Lift,45,extra\n"]
+        
+        rows = list(read_records(lines, "csv"))
+        
+        assert rows[0] == (2, {"workout_name": "Run", "duration": "30"}, None)
+        assert rows[1] == (3, None, "Row has more fields than the header")
+    
+    def test_unknown_format(self):
+        """Only NDJSON and CSV are accepted"""
+        from backend.importWorkouts import read_records
+        with pytest.raises(ValueError):
+            read_records([], "xml")
+    
+    def test_imports_in_batches(self):
+        """Valid rows are saved batch_size at a time; invalid rows are reported by line"""
+        from backend.importWorkouts import import_workouts, read_records
+        batch_sizes = []
+        
+        def fake_add_workouts(batch):
+            batch_sizes.append(len(batch))
+            return {}
+        
+        with patch("backend.importWorkouts.add_workouts", side_effect=fake_add_workouts):
+            summary = import_workouts(
+                read_records(_ndjson_records(2501, bad_lines={7}), "ndjson"), "a@bu.edu", batch_size=1000
+            )
+        
+        assert batch_sizes == [1000, 1000, 500]
+        assert summary["imported"] == 2500
+        assert summary["failed"] == 1
+        assert summary["errors"] == [{"line": 7, "errors": ["Duration must be greater than 0"]}]
+        assert summary["errors_truncated"] is False
+    
+    def test_workouts_belong_to_importer(self):
+        """Imported workouts are built like logged ones, owned by the importing user"""
+        from backend.importWorkouts import import_workouts, read_records
+        with patch("backend.importWorkouts.add_workouts", return_value={}) as mock_add:
+            import_workouts(read_records(_ndjson_records(1), "ndjson"), "a@bu.edu")
+        
+        workout = mock_add.call_args.args[0][0]
+        assert workout["creator"] == "a@bu.edu"
+        assert workout["duration"] == 30
+        assert workout["calories"] == 250
+        assert workout["type"] == "workout"
+    
+    def test_reported_errors_are_capped(self):
+        """Failures beyond MAX_REPORTED_ERRORS are counted but not listed"""
+        from backend.importWorkouts import import_workouts, read_records, MAX_REPORTED_ERRORS
+        count = MAX_REPORTED_ERRORS + 50
+        with patch("backend.importWorkouts.add_workouts", return_value={}):
+            summary = import_workouts(
+                read_records(_ndjson_records(count, bad_lines=set(range(1, count + 1))), "ndjson"), "a@bu.edu"
+            )
+        
+        assert summary["failed"] == count
+        assert len(summary["errors"]) == MAX_REPORTED_ERRORS
+        assert summary["errors_truncated"] is True
+    
+    def test_failed_writes_reported_per_row(self):
+        """Workouts add_workouts could not save are reported with their line"""
+        from backend.importWorkouts import import_workouts, read_records
+        with patch("backend.importWorkouts.add_workouts", return_value={1: "write failed"}):
+            summary = import_workouts(read_records(_ndjson_records(3), "ndjson"), "a@bu.edu")
+        
+        assert summary["imported"] == 2
+        assert summary["errors"] == [{"line": 2, "errors": ["write failed"]}]
+    
+    def test_add_workouts_one_insert_per_batch(self, monkeypatch):
+        """A batch is one insert_many, with stats and streak updated once per creator"""
+        import backend.data_manager as data_manager
+        from backend.logWorkout import build_workout, parse_workout_data
+        workouts_collection = mongomock.MongoClient()["spotter-db"].workouts
+        monkeypatch.setattr(data_manager, "workouts", workouts_collection)
+        values, _ = parse_workout_data(dict(IMPORT_WORKOUT, duration="30", calories="100"))
+        batch = [build_workout(values, "a@bu.edu") for _ in range(3)]
+        
+        with patch.object(data_manager, "increment_user_stats") as mock_stats, \
+             patch.object(data_manager, "recompute_workout_streak") as mock_streak, \
+             patch.object(data_manager, "record_workout_progress") as mock_progress, \
+             patch.object(data_manager, "fan_out_posts") as mock_fan_out:
+            failed = data_manager.add_workouts(batch)
+        
+        assert failed == {}
+        mock_progress.assert_called_once_with(batch)
+        assert workouts_collection.count_documents({"creator": "a@bu.edu"}) == 3
+        mock_stats.assert_called_once_with(
+            ["a@bu.edu"], workouts_logged=3, total_workout_minutes=90, total_calories_burned=300
+        )
+        mock_streak.assert_called_once_with("a@bu.edu")
+        mock_fan_out.assert_called_once_with(batch)
+    
+    def test_add_workouts_partial_failure(self, monkeypatch):
+        """Rows rejected by insert_many are returned by index and skipped in stats"""
+        import backend.data_manager as data_manager
+        from pymongo.errors import BulkWriteError
+        mock_workouts = MagicMock()
+        mock_workouts.insert_many.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 1, "code": 2, "errmsg": "bad document"}]}
+        )
+        monkeypatch.setattr(data_manager, "workouts", mock_workouts)
+        batch = [{"creator": "a@bu.edu", "duration": 10}, {"creator": "a@bu.edu", "duration": 20}]
+        
+        with patch.object(data_manager, "increment_user_stats") as mock_stats, \
+             patch.object(data_manager, "recompute_workout_streak"), \
+             patch.object(data_manager, "record_workout_progress") as mock_progress, \
+             patch.object(data_manager, "fan_out_posts"):
+            failed = data_manager.add_workouts(batch)
+        
+        assert failed == {1: "bad document"}
+        mock_progress.assert_called_once_with([batch[0]])
+        assert mock_stats.call_args.kwargs["total_workout_minutes"] == 10
+    
+    def test_bulk_endpoint_csv(self, client, app_globals):
+        """POST /api/workouts/bulk streams a CSV body and returns the summary"""
+        import_module = sys.modules[app_globals["import_workouts"].__module__]
+        body = "workout_name,date,duration,workout_type,intensity,notes,privacy\n"
+        body += "Run,2025-01-15,30,cardio,low,Easy run today,public\n"
+        body += "Swim,2025-01-16,abc,cardio,low,Pool session,public\n"
+        
+        with patch.object(import_module, "add_workouts", return_value={}) as mock_add:
+            res = client.post(
+                "/api/workouts/bulk", data=body, content_type="text/csv",
+                headers={"Authorization": "Bearer fake-token"}
+            )
+        
+        assert res.status_code == 200
+        data = res.get_json()
+        assert data["imported"] == 1
+        assert data["errors"] == [{"line": 3, "errors": ["Duration must be a valid number"]}]
+        assert mock_add.call_args.args[0][0]["creator"] == "test@example.com"
+    
+    def test_undecodable_input_keeps_rows_read(self):
+        """Rows before a UTF-8 error are saved and the first unread line is reported"""
+        from backend.importWorkouts import import_workouts, read_records
+        
+        def lines():
+            yield from _ndjson_records(3)
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+        
+        with patch("backend.importWorkouts.add_workouts", return_value={}) as mock_add:
+            summary = import_workouts(read_records(lines(), "ndjson"), "a@bu.edu", batch_size=2)
+        
+        assert summary["imported"] == 3
+        assert summary["stopped_at_line"] == 4
+        assert [len(call.args[0]) for call in mock_add.call_args_list] == [2, 1]
+    
+    def test_bulk_endpoint_reports_partial_import_on_decode_error(self, client, app_globals):
+        """A body that stops being UTF-8 is a 400 that still reports the rows saved"""
+        import_module = sys.modules[app_globals["import_workouts"].__module__]
+        body = "".join(_ndjson_records(100)).encode("utf-8") + b"\xff\xfe\n"
+        
+        with patch.object(import_module, "add_workouts", return_value={}):
+            res = client.post(
+                "/api/workouts/bulk", data=body, content_type="application/x-ndjson",
+                headers={"Authorization": "Bearer fake-token"}
+            )
+        
+        assert res.status_code == 400
+        data = res.get_json()
+        assert data["success"] is False
+        assert data["imported"] > 0
+        assert data["stopped_at_line"] == data["imported"] + 1
+        assert f"line {data['stopped_at_line']}" in data["error"]
+    
+    def test_bulk_endpoint_rejects_unknown_format(self, client, app_globals):
+        """An unsupported ?format= is a 400"""
+        res = client.post(
+            "/api/workouts/bulk?format=xml", data="<workouts/>",
+            headers={"Authorization": "Bearer fake-token"}
+        )
+        assert res.status_code == 400
+    
+    def test_manage_import_command(self, tmp_path, capsys):
+        """manage.py import-workouts imports a file for the given user"""
+        import backend.manage as manage
+        path = tmp_path / "workouts.ndjson"
+        path.write_text("".join(_ndjson_records(5, bad_lines={2})), encoding="utf-8")
+        import_module = sys.modules[manage.import_workouts.__module__]
+        
+        with patch.object(import_module, "add_workouts", return_value={}) as mock_add:
+            manage.main(["import-workouts", str(path), "--email", "a@bu.edu", "--batch-size", "2"])
+        
+        assert [len(call.args[0]) for call in mock_add.call_args_list] == [2, 2]
+        output = capsys.readouterr().out
+        assert "Line 2: Duration must be greater than 0" in output
+        assert "Imported 4 workouts, 1 rows failed" in output
+
+
+# ============================================
+# COMPILED VALIDATOR TESTS
+# ============================================
+
+class TestCompiledValidators:
+    """Test the schema-compiled validators and the normalized values they return"""
+    
+    def test_challenge_values_normalized(self):
+        """Fields are stripped and case-normalized once, alongside the errors"""
+        from backend.create_Challenge import parse_challenge_data
+        start = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        end = (datetime.now() + timedelta(days=11)).strftime("%Y-%m-%d")
+        
+        values, errors = parse_challenge_data({
+            "challenge_type": " achievement-based ",
+            "category": "CARDIO",
+            "title": " 5K ",
+            "goal": "Run",
+            "start_date": start,
+            "end_date": end,
+            "description": "Run a 5K every week",
+            "privacy": " Public",
+            "target_value": "20",
+            "metric": " Miles "
+        })
+        
+        assert errors == []
+        assert values["challenge_type"] == "Achievement-Based"
+        assert values["category"] == "Cardio"
+        assert values["title"] == "5K"
+        assert values["privacy"] == "public"
+        assert values["metric"] == "miles"
+        assert values["target_value"] == 20.0
+        assert values["duration_days"] == 10
+    
+    def test_workout_values_parsed(self):
+        """Numbers are parsed once; missing optional calories become None"""
+        from backend.logWorkout import parse_workout_data
+        data = {
+            "workout_name": " Run ",
+            "date": "2025-01-15",
+            "duration": " 45 ",
+            "workout_type": "cardio",
+            "intensity": "low",
+            "notes": "Easy run today",
+            "privacy": "public"
+        }
+        
+        values, errors = parse_workout_data(data)
+        
+        assert errors == []
+        assert values["workout_name"] == "Run"
+        assert values["duration"] == 45
+        assert values["calories"] is None
+    
+    def test_dates_parsed_once(self):
+        """Challenge dates are parsed once per distinct date, including for the Classes check"""
+        from backend.create_Challenge import parse_challenge_data
+        import backend.create_Challenge as create_challenge_module
+        start = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        end = (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d")
+        data = {
+            "challenge_type": "Achievement-Based", "category": "Classes", "title": "T", "goal": "G",
+            "start_date": start, "end_date": end, "description": "Many classes this week",
+            "privacy": "public", "target_value": "100", "metric": "classes"
+        }
+        validation = sys.modules[create_challenge_module.parse_date.__module__]
+        
+        with patch.object(validation, "datetime", wraps=datetime) as mock_datetime:
+            validation.parse_date.cache_clear()
+            _, errors = parse_challenge_data(data)
+            parse_challenge_data(data)
+        
+        assert mock_datetime.strptime.call_count == 2
+        assert errors == ["Class target seems unrealistic (100.0 classes in 4 days = 25.0 classes/day). Maximum recommended: 8 classes."]
+    
+    def test_schema_runs_steps_in_order(self):
+        """Fields and rules run in schema order; only the first failing check is reported"""
+        from backend.validation import Field, compile_schema, longer_than, shorter_than
+        
+        def rule(data, values, errors):
+            errors.append(f"rule saw {values['name']!r}")
+        
+        validate = compile_schema([
+            Field("name", required="Name is required", checks=[
+                shorter_than(3, "Too short"),
+                longer_than(1, "Too long")
+            ]),
+            rule,
+            Field("count", text=False, default=None, parse=int, parse_message="Not a number")
+        ])
+        
+        assert validate({"name": " ab ", "count": "x"}) == ({"name": "", "count": None}, ["Too short", "rule saw ''", "Not a number"])
+        assert validate({}) == ({"name": "", "count": None}, ["Name is required", "rule saw ''"])
+
+
+# ============================================
+# IDEMPOTENT CHALLENGE ACCEPTANCE TESTS
+# ============================================
+
+class TestIdempotentChallengeAcceptance:
+    """Test retry-safe invitation acceptance and participant count reconciliation"""
+    
+    @pytest.fixture
+    def challenge_db(self, monkeypatch):
+        """Fresh mongomock challenge collections with the unique participant index"""
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        for name in ("challenges", "workouts", "challenge_participants", "challenge_invitations", "user_stats"):
+            monkeypatch.setattr(mongo, name, mock_db[name])
+        mock_db.challenge_participants.create_index([("challenge_id", 1), ("participant_email", 1)], unique=True)
+        mock_db.challenges.insert_one({"id": "c1", "creator": "a@bu.edu", "participants": 1})
+        mock_db.challenge_invitations.insert_one({"challenge_id": "c1", "invitee_email": "b@bu.edu", "status": "pending"})
+        return mock_db
+    
+    def test_accept_joins_once(self, challenge_db):
+        """Accepting adds the participant and counts them"""
+        assert mongo.accept_challenge_invitation("c1", "b@bu.edu") == (True, "Challenge invitation accepted")
+        
+        assert challenge_db.challenges.find_one({"id": "c1"})["participants"] == 2
+        assert challenge_db.challenge_participants.count_documents({"challenge_id": "c1"}) == 1
+        assert challenge_db.challenge_invitations.find_one({"invitee_email": "b@bu.edu"})["status"] == "accepted"
+    
+    def test_retry_does_not_double_count(self, challenge_db):
+        """Accepting again succeeds without another participant or count"""
+        mongo.accept_challenge_invitation("c1", "b@bu.edu")
+        accepted_at = challenge_db.challenge_invitations.find_one({"invitee_email": "b@bu.edu"})["accepted_at"]
+        
+        assert mongo.accept_challenge_invitation("c1", "b@bu.edu") == (True, "Challenge invitation accepted")
+        
+        assert challenge_db.challenges.find_one({"id": "c1"})["participants"] == 2
+        assert challenge_db.challenge_participants.count_documents({"challenge_id": "c1"}) == 1
+        assert challenge_db.challenge_invitations.find_one({"invitee_email": "b@bu.edu"})["accepted_at"] == accepted_at
+    
+    def test_retry_after_partial_failure_completes(self, challenge_db):
+        """If joining failed after the invitation was accepted, a retry finishes the join"""
+        with patch.object(mongo.challenge_participants, "update_one", side_effect=Exception("network error")):
+            assert mongo.accept_challenge_invitation("c1", "b@bu.edu") == (False, "network error")
+        
+        assert mongo.accept_challenge_invitation("c1", "b@bu.edu")[0] is True
+        assert challenge_db.challenges.find_one({"id": "c1"})["participants"] == 2
+    
+    def test_concurrent_insert_is_not_counted(self, challenge_db):
+        """A duplicate key from a concurrent accept counts as already joined"""
+        from pymongo.errors import DuplicateKeyError
+        with patch.object(mongo.challenge_participants, "update_one", side_effect=DuplicateKeyError("dup")):
+            assert mongo.accept_challenge_invitation("c1", "b@bu.edu")[0] is True
+        
+        assert challenge_db.challenges.find_one({"id": "c1"})["participants"] == 1
+    
+    def test_missing_or_declined_invitation(self, challenge_db):
+        """Only pending or accepted invitations can be accepted"""
+        challenge_db.challenge_invitations.update_one({"invitee_email": "b@bu.edu"}, {"$set": {"status": "declined"}})
+        
+        assert mongo.accept_challenge_invitation("c1", "b@bu.edu") == (False, "Invitation not found")
+        assert mongo.accept_challenge_invitation("c1", "z@bu.edu") == (False, "Invitation not found")
+    
+    def test_reconcile_fixes_drifted_counts(self, challenge_db):
+        """Counts are recomputed as the creator plus each distinct participant"""
+        challenge_db.challenges.insert_many([
+            {"id": "c2", "creator": "a@bu.edu", "participants": 7},
+            {"id": "c3", "creator": "a@bu.edu", "participants": 1}
+        ])
+        challenge_db.challenge_participants.drop_indexes()
+        challenge_db.challenge_participants.insert_many([
+            {"challenge_id": "c1", "participant_email": "b@bu.edu", "joined_at": datetime(2025, 1, 1)},
+            {"challenge_id": "c1", "participant_email": "b@bu.edu", "joined_at": datetime(2025, 1, 2)},
+            {"challenge_id": "c2", "participant_email": "b@bu.edu", "joined_at": datetime(2025, 1, 1)},
+            {"challenge_id": "c2", "participant_email": "c@bu.edu", "joined_at": datetime(2025, 1, 1)}
+        ])
+        
+        # mongomock's bulk_write doesn't accept UpdateOne, so apply the operations one by one
+        def apply_updates(operations, ordered=True):
+            for operation in operations:
+                challenge_db.challenges.update_one(operation._filter, operation._doc)
+        
+        with patch.object(challenge_db.challenges, "bulk_write", side_effect=apply_updates):
+            assert mongo.reconcile_challenge_participants() == (1, 2)
+            assert mongo.reconcile_challenge_participants() == (0, 0)
+        
+        counts = {c["id"]: c["participants"] for c in challenge_db.challenges.find()}
+        assert counts == {"c1": 2, "c2": 3, "c3": 1}
+        kept = challenge_db.challenge_participants.find_one({"challenge_id": "c1"})
+        assert kept["joined_at"] == datetime(2025, 1, 1)
+        assert challenge_db.challenge_participants.count_documents({}) == 3
+    
+    def test_unique_index_built_over_duplicate_joins(self, challenge_db, capsys):
+        """ensure_participant_index removes repeated joins first, so the index can be built"""
+        challenge_db.challenge_participants.drop_indexes()
+        challenge_db.challenge_participants.insert_many([
+            {"challenge_id": "c1", "participant_email": "b@bu.edu", "joined_at": datetime(2025, 1, 1)},
+            {"challenge_id": "c1", "participant_email": "b@bu.edu", "joined_at": datetime(2025, 1, 2)}
+        ])
+        
+        with patch.object(mongo, "reconcile_challenge_participants", wraps=mongo.reconcile_challenge_participants) as reconcile, \
+             patch.object(challenge_db.challenges, "bulk_write"):
+            mongo.ensure_participant_index()
+            mongo.ensure_participant_index()
+        
+        index = challenge_db.challenge_participants.index_information()["challenge_id_1_participant_email_1"]
+        assert index["unique"] is True
+        assert challenge_db.challenge_participants.count_documents({}) == 1
+        reconcile.assert_called_once()
+        assert "rebuild-user-stats" in capsys.readouterr().out
+
+
+# ============================================
+# CHALLENGE LEADERBOARD TESTS
+# ============================================
+
+def _apply_bulk(collection):
+    """bulk_write replacement applying UpdateOne operations one at a time (mongomock can't)"""
+    def bulk_write(operations, ordered=True):
+        for operation in operations:
+            collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+    return bulk_write
+
+
+class TestChallengeLeaderboards:
+    """Test incremental challenge progress and the top-K leaderboard"""
+    
+    @pytest.fixture
+    def leaderboard_db(self, monkeypatch):
+        """mongomock collections for challenges, workouts and progress"""
+        mock_db = mongomock.MongoClient()["spotter-db"]
+        for name in ("challenges", "workouts", "challenge_participants", "challenge_invitations",
+                     "challenge_progress", "user_stats"):
+            monkeypatch.setattr(mongo, name, mock_db[name])
+        monkeypatch.setattr(mock_db.challenge_progress, "bulk_write", _apply_bulk(mock_db.challenge_progress))
+        mock_db.challenges.insert_one({
+            "id": "c1", "creator": "a@bu.edu", "participants": 1,
+            "start_date": "2025-03-01", "end_date": "2025-03-31", "metric": "minutes", "target_value": 60.0
+        })
+        return mock_db
+    
+    def _log(self, creator, date, duration=30, calories=None):
+        workout = {"creator": creator, "date": date, "duration": duration, "calories": calories}
+        mongo.workouts.insert_one(dict(workout))
+        mongo.record_workout_progress([workout])
+    
+    def test_workout_progress_by_metric(self):
+        """Minutes, hours and calories are measured; other metrics count workouts"""
+        workout = {"duration": 90, "calories": None}
+        assert mongo.workout_progress(workout, "minutes") == 90
+        assert mongo.workout_progress(workout, "hours") == 1.5
+        assert mongo.workout_progress(workout, "calories") == 0
+        assert mongo.workout_progress(workout, "miles") == 1
+        assert mongo.workout_progress(workout, None) == 1
+    
+    def test_progress_counts_workouts_within_dates(self, leaderboard_db):
+        """Only workouts dated within the challenge add to progress"""
+        mongo.add_to_leaderboard(leaderboard_db.challenges.find_one({"id": "c1"}), ["a@bu.edu"])
+        self._log("a@bu.edu", "2025-03-05", 30)
+        self._log("a@bu.edu", "2025-03-31", 45)
+        self._log("a@bu.edu", "2025-04-01", 60)
+        self._log("z@bu.edu", "2025-03-05", 60)
+        
+        entry = leaderboard_db.challenge_progress.find_one({"challenge_id": "c1", "participant_email": "a@bu.edu"})
+        assert (entry["progress"], entry["workouts"]) == (75, 2)
+        assert leaderboard_db.challenge_progress.count_documents({"participant_email": "z@bu.edu"}) == 0
+    
+    def test_joining_counts_earlier_workouts(self, leaderboard_db):
+        """Accepting an invitation adds the user with the workouts they already logged"""
+        mongo.workouts.insert_many([
+            {"creator": "b@bu.edu", "date": "2025-03-02", "duration": 20},
+            {"creator": "b@bu.edu", "date": "2025-02-02", "duration": 20}
+        ])
+        leaderboard_db.challenge_invitations.insert_one({"challenge_id": "c1", "invitee_email": "b@bu.edu", "status": "pending"})
+        
+        assert mongo.accept_challenge_invitation("c1", "b@bu.edu")[0] is True
+        
+        entry = leaderboard_db.challenge_progress.find_one({"challenge_id": "c1", "participant_email": "b@bu.edu"})
+        assert (entry["progress"], entry["workouts"]) == (20, 1)
+    
+    def test_workout_saved_during_join_is_counted_once(self, leaderboard_db):
+        """A workout counted when the entry is created isn't added again by its progress update"""
+        workout = {"id": "w1", "creator": "b@bu.edu", "date": "2025-03-02", "duration": 20}
+        mongo.workouts.insert_one(dict(workout))
+        challenge = leaderboard_db.challenges.find_one({"id": "c1"})
+        
+        mongo.add_to_leaderboard(challenge, ["b@bu.edu"])
+        mongo.record_workout_progress([workout])
+        later = {"id": "w2", "creator": "b@bu.edu", "date": "2025-03-03", "duration": 10}
+        mongo.workouts.insert_one(dict(later))
+        mongo.record_workout_progress([later])
+        
+        entry = leaderboard_db.challenge_progress.find_one({"challenge_id": "c1", "participant_email": "b@bu.edu"})
+        assert (entry["progress"], entry["workouts"]) == (30, 2)
+    
+    def test_existing_entries_are_not_recomputed(self, leaderboard_db):
+        """Adding a participant again keeps their entry; rebuilding recomputes it"""
+        challenge = leaderboard_db.challenges.find_one({"id": "c1"})
+        leaderboard_db.challenge_progress.insert_one(
+            {"challenge_id": "c1", "participant_email": "a@bu.edu", "progress": 99, "workouts": 3}
+        )
+        
+        mongo.add_to_leaderboard(challenge, ["a@bu.edu"])
+        assert leaderboard_db.challenge_progress.find_one({"participant_email": "a@bu.edu"})["progress"] == 99
+        
+        mongo.rebuild_leaderboards(["c1"])
+        assert leaderboard_db.challenge_progress.find_one({"participant_email": "a@bu.edu"})["progress"] == 0
+    
+    def test_incremental_matches_rebuild(self, leaderboard_db):
+        """Incremental updates agree with recomputing from workouts"""
+        mongo.add_to_leaderboard(leaderboard_db.challenges.find_one({"id": "c1"}), ["a@bu.edu", "b@bu.edu"])
+        for day, (creator, duration) in enumerate([("a@bu.edu", 30), ("b@bu.edu", 50), ("a@bu.edu", 25)], start=1):
+            self._log(creator, f"2025-03-0{day}", duration)
+        incremental = {
+            entry["participant_email"]: (entry["progress"], entry["workouts"])
+            for entry in leaderboard_db.challenge_progress.find()
+        }
+        
+        assert mongo.rebuild_leaderboards() == 1
+        
+        rebuilt = {
+            entry["participant_email"]: (entry["progress"], entry["workouts"])
+            for entry in leaderboard_db.challenge_progress.find()
+        }
+        assert incremental == rebuilt == {"a@bu.edu": (55, 2), "b@bu.edu": (50, 1)}
+    
+    def test_leaderboard_is_top_k(self, leaderboard_db):
+        """The leaderboard reads only the top K entries, ranked by progress then email"""
+        leaderboard_db.challenge_progress.insert_many([
+            {"challenge_id": "c1", "participant_email": f"user{i:04d}@bu.edu", "progress": i % 500, "workouts": 1}
+            for i in range(2000)
+        ])
+        mongo.users.insert_one({"email": "user0499@bu.edu", "username": "Top"})
+        
+        with patch.object(leaderboard_db.challenge_progress, "find", wraps=leaderboard_db.challenge_progress.find) as find:
+            leaderboard = mongo.get_leaderboard("c1", limit=5)
+        
+        assert [entry["email"] for entry in leaderboard] == [
+            "user0499@bu.edu", "user0999@bu.edu", "user1499@bu.edu", "user1999@bu.edu", "user0498@bu.edu"
+        ]
+        assert [entry["rank"] for entry in leaderboard] == [1, 2, 3, 4, 5]
+        assert leaderboard[0]["username"] == "Top"
+        assert leaderboard[1]["username"] == "user0999"
+        find.assert_called_once()
+    
+    def test_leaderboard_endpoint(self, client, app_globals):
+        """GET /api/challenges/<id>/leaderboard returns the top entries and goal completion"""
+        challenge = {"id": "c1", "metric": "minutes", "target_value": 60.0}
+        entries = [
+            {"rank": 1, "email": "a@bu.edu", "username": "a", "progress": 75, "workouts": 2},
+            {"rank": 2, "email": "b@bu.edu", "username": "b", "progress": 20, "workouts": 1}
+        ]
+        mock_leaderboard = MagicMock(return_value=entries)
+        
+        with patch.dict(app_globals, {
+            "get_challenge_by_id": MagicMock(return_value=challenge),
+            "get_leaderboard": mock_leaderboard
+        }):
+            res = client.get("/api/challenges/c1/leaderboard?limit=500", headers={"Authorization": "Bearer fake-token"})
+        
+        assert res.status_code == 200
+        data = res.get_json()
+        assert mock_leaderboard.call_args.args == ("c1", 100)
+        assert [entry["completed"] for entry in data["leaderboard"]] == [True, False]
+        assert data["metric"] == "minutes"
+    
+    def test_leaderboard_endpoint_errors(self, client, app_globals):
+        """Unknown challenges are 404 and a non-numeric limit is 400"""
+        with patch.dict(app_globals, {"get_challenge_by_id": MagicMock(return_value=None)}):
+            res = client.get("/api/challenges/nope/leaderboard", headers={"Authorization": "Bearer fake-token"})
+            assert res.status_code == 404
+            res = client.get("/api/challenges/nope/leaderboard?limit=x", headers={"Authorization": "Bearer fake-token"})
+            assert res.status_code == 400
+    
+    def test_achievement_goal_stored(self):
+        """Achievement-based challenges keep their target and metric"""
+        start = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        end = (datetime.now() + timedelta(days=20)).strftime("%Y-%m-%d")
+        data = {
+            "challenge_type": "Achievement-Based", "category": "Cardio", "title": "Minutes", "goal": "Move",
+            "start_date": start, "end_date": end, "description": "Work out for 600 minutes",
+            "privacy": "public", "target_value": "600", "metric": "Minutes"
+        }
+        with patch("backend.create_Challenge.add_challenge", return_value=True) as mock_add, \
+             patch("backend.create_Challenge.send_challenge_invitations", return_value=[]):
+            create_challenge(data, creator_email="a@bu.edu")
+        
+        challenge = mock_add.call_args.args[0]
+        assert (challenge["target_value"], challenge["metric"]) == (600.0, "minutes")
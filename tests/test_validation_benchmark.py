@@ -0,0 +1,73 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from backend.create_Challenge import parse_challenge_data
+from backend.logWorkout import parse_workout_data
+
+
+# ============================================
+# VALIDATION THROUGHPUT BENCHMARK
+# ============================================
+# Run with `python -m pytest tests/test_validation_benchmark.py -s` to see the numbers.
+# The floors are far below normal throughput and only catch large regressions.
+
+ITERATIONS = 20000
+
+
+def _challenge_payload():
+    start = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    end = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+    return {
+        "challenge_type": "Achievement-Based",
+        "category": "Classes",
+        "title": "Spin Month",
+        "goal": "Take 20 spin classes",
+        "start_date": start,
+        "end_date": end,
+        "description": "Twenty spin classes before the end of the month",
+        "privacy": "public",
+        "target_value": "20",
+        "metric": "classes"
+    }
+
+
+WORKOUT_PAYLOAD = {
+    "workout_name": "Morning Run",
+    "date": "2025-01-15",
+    "duration": "30",
+    "workout_type": "cardio",
+    "intensity": "medium",
+    "notes": "Easy pace along the river",
+    "privacy": "public",
+    "calories": "250"
+}
+
+
+def _throughput(validate, payload):
+    """Best validations per second over three runs of ITERATIONS"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            validate(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return ITERATIONS / best
+
+
+class TestValidationThroughput:
+    """Micro-benchmark of the compiled challenge and workout validators"""
+
+    @pytest.mark.parametrize("name, validate, payload, floor", [
+        ("challenge", parse_challenge_data, _challenge_payload(), 5000),
+        ("workout", parse_workout_data, WORKOUT_PAYLOAD, 5000)
+    ])
+    def test_throughput(self, name, validate, payload, floor):
+        """Valid payloads validate without errors, well above the throughput floor"""
+        _, errors = validate(payload)
+        assert errors == []
+
+        per_second = _throughput(validate, payload)
+        print(f"\n{name} validation: {per_second:,.0f}/s")
+
+        assert per_second > floor